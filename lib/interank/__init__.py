@@ -1,3 +1,13 @@
+import importlib
+
 from . import wikidata
 from . import linuxdata
-from . import models
+
+
+def __getattr__(name):
+    # The models import TensorFlow, which is slow and heavy: they are only
+    # imported when they are used (e.g., `interank.models.BasicModel`).
+    if name == "models":
+        return importlib.import_module(".models", __name__)
+    raise AttributeError("module {!r} has no attribute {!r}".format(
+            __name__, name))
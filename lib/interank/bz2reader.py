@@ -0,0 +1,260 @@
+"""Streaming reader for (possibly bz2-compressed) MediaWiki XML dumps.
+
+A bz2 file is a sequence of streams, and each stream is a sequence of blocks
+that are compressed independently of each other. Blocks are not aligned on
+byte boundaries, but each of them starts with a 48-bit magic number.
+`ParallelBZ2Reader` locates the blocks, turns each of them into a standalone
+bz2 stream and decompresses them in a pool of worker processes. The
+decompressed bytes are handed out in order, so that the reader can be given
+directly to an XML parser, and the decompressed dump never touches the disk.
+"""
+import bz2
+import collections
+import io
+import multiprocessing as mp
+
+
+BLOCK_MAGIC = 0x314159265359
+EOS_MAGIC = 0x177245385090
+MAGIC_MASK = (1 << 48) - 1
+
+# Size of the chunks read from the compressed file.
+READ_SIZE = 1 << 22
+
+
+def open_dump(path, processes=None):
+    """Open a (possibly bz2-compressed) XML dump as a binary stream.
+
+    Files whose name ends in `.bz2` are decompressed on the fly, using
+    `processes` worker processes if it is larger than 1.
+    """
+    if not path.endswith(".bz2"):
+        return open(path, "rb")
+    if processes is None or processes <= 1:
+        return bz2.open(path, "rb")
+    return io.BufferedReader(ParallelBZ2Reader(path, processes),
+            buffer_size=READ_SIZE)
+
+
+def _find_magic(buf, magic, lo, hi):
+    """Bit offsets of `magic` in `buf`, starting in bytes `lo` to `hi`."""
+    found = list()
+    for shift in range(8):
+        if shift == 0:
+            pattern, skip = magic.to_bytes(6, "big"), 0
+        else:
+            # The magic spans 7 bytes, the 5 inner ones are fully known.
+            pattern, skip = (magic << (8 - shift)).to_bytes(7, "big")[1:6], 1
+        i = buf.find(pattern, lo + skip)
+        while i != -1 and i - skip < hi:
+            start = i - skip
+            if shift == 0:
+                found.append(8 * start)
+            elif start + 7 <= len(buf):
+                value = int.from_bytes(buf[start:start+7], "big")
+                if (value >> (8 - shift)) & MAGIC_MASK == magic:
+                    found.append(8 * start + shift)
+            i = buf.find(pattern, i + 1)
+    return found
+
+
+def _segments(f, start=0):
+    """Split a bz2 file into segments delimited by magic numbers.
+
+    The file is read from bit offset `start`, which must be the beginning of
+    a block (or 0).
+
+    Yields tuples `(is_block, data, first_byte, start_bit, end_bit)`, where
+    `data` contains the bytes of the file starting at offset `first_byte` and
+    the segment spans bits `start_bit` to `end_bit` (absolute offsets). The
+    magic numbers can also occur by chance inside a block, the resulting
+    spurious segments are dealt with by `ParallelBZ2Reader`.
+    """
+    buf = b""
+    base = start // 8  # Absolute offset of `buf[0]`.
+    scanned = base  # Absolute offset of the first byte not yet scanned.
+    f.seek(base)
+    prev = None  # (is_block, bit offset) of the last boundary.
+    while True:
+        chunk = f.read(READ_SIZE)
+        buf += chunk
+        # A magic number spans at most 7 bytes.
+        hi = len(buf) if not chunk else len(buf) - 6
+        lo = scanned - base
+        bounds = sorted(
+                [(pos, True) for pos in _find_magic(buf, BLOCK_MAGIC, lo, hi)]
+                + [(pos, False) for pos in _find_magic(buf, EOS_MAGIC, lo, hi)])
+        for pos, is_block in bounds:
+            if prev is not None:
+                yield _segment(buf, base, prev, 8 * base + pos)
+            prev = (is_block, 8 * base + pos)
+        scanned = base + max(hi, lo)
+        if not chunk:
+            break
+        # Keep the bytes of the pending segment and the unscanned ones.
+        keep = scanned if prev is None else min(scanned, prev[1] // 8)
+        buf = buf[keep - base:]
+        base = keep
+    if prev is not None:
+        yield _segment(buf, base, prev, 8 * (base + len(buf)))
+
+
+def _segment(buf, base, prev, end):
+    is_block, start = prev
+    first = start // 8
+    data = buf[first - base:(end + 7) // 8 - base]
+    return (is_block, data, first, start, end)
+
+
+def _merge(seg1, seg2):
+    """Merge two consecutive segments."""
+    _, data1, first1, start, _ = seg1
+    _, data2, first2, _, end = seg2
+    return (True, data1[:first2 - first1] + data2, first1, start, end)
+
+
+def _decompress_block(data, start, end):
+    """Decompress the bz2 block that spans bits `start` to `end` of `data`."""
+    size = end - start
+    block = ((int.from_bytes(data, "big") >> (8 * len(data) - end))
+             & ((1 << size) - 1))
+    # The block CRC follows the magic. In a single-block stream, the stream
+    # CRC is equal to the block CRC.
+    crc = (block >> (size - 80)) & 0xffffffff
+    stream = (((block << 48) | EOS_MAGIC) << 32) | crc
+    size += 80
+    pad = -size % 8
+    stream = b"BZh9" + (stream << pad).to_bytes((size + pad) // 8, "big")
+    decompressor = bz2.BZ2Decompressor()
+    out = decompressor.decompress(stream)
+    if not decompressor.eof:
+        raise OSError("truncated bz2 block")
+    return out
+
+
+def _decompress_segment(segment):
+    _, data, first, start, end = segment
+    return _decompress_block(data, start - 8 * first, end - 8 * first)
+
+
+class ParallelBZ2Reader(io.RawIOBase):
+
+    """Decompress a bz2 file using a pool of worker processes.
+
+    At most `window` blocks are being decompressed (or waiting to be read) at
+    any time, which bounds the memory usage to a few MB per process. If
+    `processes` is `None`, the blocks are decompressed in the calling
+    process.
+
+    Decompression starts at bit offset `start`, which must be the beginning
+    of a block (or 0). If `record_blocks` is true, the pairs `(bit offset,
+    decompressed offset)` of the blocks that were read are collected in
+    `blocks`, where the decompressed offset is relative to `start`.
+    """
+
+    # Maximum number of segments merged when recovering from a spurious magic
+    # number inside a block.
+    MAX_MERGE = 16
+
+    def __init__(self, path, processes, window=None, start=0,
+            record_blocks=False):
+        self._file = open(path, "rb")
+        self._segments = _segments(self._file, start)
+        if processes is None:
+            self._pool = None
+            self._window = 1
+        else:
+            self._pool = mp.Pool(processes)
+            self._window = window if window is not None else 4 * processes
+        self._pending = collections.deque()
+        self._buffer = b""
+        self._pos = 0
+        self._offset = 0
+        self.blocks = list() if record_blocks else None
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._pos >= len(self._buffer):
+            data = self._next_block()
+            if data is None:
+                return 0
+            self._buffer, self._pos = data, 0
+        n = min(len(b), len(self._buffer) - self._pos)
+        b[:n] = self._buffer[self._pos:self._pos+n]
+        self._pos += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            if self._pool is not None:
+                # Readers are often closed before the end of the file (e.g.,
+                # by `DumpIndex.open_range`), and terminating the pool while
+                # blocks are being decompressed can hang. The pending blocks
+                # (at most `window`) are waited for instead.
+                for _, res in self._pending:
+                    if res is not None:
+                        res.wait()
+                self._pending.clear()
+                self._pool.close()
+                self._pool.join()
+            self._file.close()
+        super().close()
+
+    def _fill(self):
+        """Submit segments until the window is full."""
+        while len(self._pending) < self._window:
+            segment = next(self._segments, None)
+            if segment is None:
+                break
+            if not segment[0]:
+                res = None
+            elif self._pool is None:
+                res = _Deferred(segment)
+            else:
+                res = self._pool.apply_async(_decompress_segment, (segment,))
+            self._pending.append((segment, res))
+
+    def _next_block(self):
+        """Return the next decompressed block, or `None` at the end."""
+        while True:
+            self._fill()
+            if not self._pending:
+                return None
+            segment, res = self._pending.popleft()
+            if res is None:
+                # End-of-stream marker, followed by the next stream header.
+                continue
+            try:
+                data = res.get()
+            except (OSError, ValueError):
+                data = self._recover(segment)
+            if self.blocks is not None:
+                self.blocks.append((segment[3], self._offset))
+            self._offset += len(data)
+            return data
+
+    def _recover(self, segment):
+        """Decompress a block that was split by a spurious magic number."""
+        for _ in range(self.MAX_MERGE):
+            self._fill()
+            if not self._pending:
+                break
+            segment = _merge(segment, self._pending.popleft()[0])
+            try:
+                return _decompress_segment(segment)
+            except (OSError, ValueError):
+                pass
+        raise OSError("invalid bz2 data at bit {}".format(segment[3]))
+
+
+class _Deferred:
+
+    """Stands for the result of a decompression in the calling process."""
+
+    def __init__(self, segment):
+        self._segment = segment
+
+    def get(self):
+        return _decompress_segment(self._segment)
@@ -0,0 +1,342 @@
+"""Pluggable consumers of the pages of a MediaWiki dump.
+
+A consumer receives the pages of the namespaces it is interested in, one
+revision at a time, and produces one of the outputs of the processing
+scripts. `process_dump` reads a dump once and feeds any number of consumers,
+so that several outputs can be computed in a single pass.
+"""
+import array
+import csv
+import heapq
+import itertools
+import os
+import re
+import tempfile
+
+import numpy as np
+
+from .dump import is_disambiguation, iter_pages
+
+
+class Consumer:
+
+    """Base class of the consumers.
+
+    `namespaces` is the set of namespaces of the pages that the consumer
+    needs (`None` for all pages), and `text` tells whether it needs the texts
+    of the revisions.
+    """
+
+    namespaces = None
+    text = False
+
+    def start_page(self, page):
+        """Called before the revisions of a page."""
+
+    def add_revision(self, rev):
+        """Called for each revision of the current page, in order."""
+
+    def end_page(self, page):
+        """Called after the last revision of a page."""
+
+    def close(self):
+        """Called at the end of the dump."""
+
+
+class UserStats(Consumer):
+
+    """Statistics about the contributors to articles.
+
+    Writes one line per user: `key#name#first edit#last edit#number of
+    edits#number of articles`, where the timestamps are UNIX timestamps.
+    Users are written in the order in which they first appear, with the
+    latest name seen for them.
+
+    Contributors are interned into consecutive integer IDs, and their
+    statistics are kept in NumPy arrays that are updated once per page. The
+    memory usage grows with the number of users; if `max_users` is given,
+    the statistics are instead spilled to a run sorted by user key (in
+    `tmp_dir`) whenever more than `max_users` users are held, and the runs
+    are merged at the end (see `merge_user_lines`). Users are then written
+    in the order of their keys.
+    """
+
+    namespaces = {0}
+
+    # Initial number of users for which the arrays are allocated.
+    INITIAL_SIZE = 1 << 16
+
+    def __init__(self, out, max_users=None, tmp_dir=None):
+        self._out = out
+        self._max_users = max_users
+        self._tmp_dir = tmp_dir
+        self._runs = list()
+        self._reset()
+
+    def _reset(self):
+        self._ids = dict()
+        self._names = list()
+        self._first = np.zeros(self.INITIAL_SIZE, dtype=np.int64)
+        self._last = np.zeros(self.INITIAL_SIZE, dtype=np.int64)
+        self._edits = np.zeros(self.INITIAL_SIZE, dtype=np.int64)
+        self._articles = np.zeros(self.INITIAL_SIZE, dtype=np.int64)
+        # IDs of the contributors and timestamps of the current page.
+        self._page_ids = array.array("q")
+        self._page_ts = array.array("q")
+
+    def start_page(self, page):
+        del self._page_ids[:]
+        del self._page_ts[:]
+
+    def add_revision(self, rev):
+        contr_id = rev.contributor
+        # Ignore deleted users.
+        if contr_id is None:
+            return
+        idx = self._ids.get(contr_id)
+        if idx is None:
+            idx = len(self._names)
+            self._ids[contr_id] = idx
+            self._names.append(rev.username)
+        else:
+            self._names[idx] = rev.username
+        self._page_ids.append(idx)
+        self._page_ts.append(rev.timestamp)
+
+    def end_page(self, page):
+        if len(self._page_ids) == 0:
+            return
+        n_users = len(self._names)
+        if n_users > len(self._first):
+            self._grow(n_users)
+        ids = np.frombuffer(self._page_ids, dtype=np.int64)
+        ts = np.frombuffer(self._page_ts, dtype=np.int64)
+        editors, first_idx, counts = np.unique(
+                ids, return_index=True, return_counts=True)
+        new = self._edits[editors] == 0
+        # Initialize the users that appear for the first time.
+        self._first[editors[new]] = ts[first_idx[new]]
+        self._last[editors[new]] = ts[first_idx[new]]
+        np.minimum.at(self._first, ids, ts)
+        np.maximum.at(self._last, ids, ts)
+        self._edits[editors] += counts
+        self._articles[editors] += 1
+        # Release the views before the buffers are resized.
+        del ids, ts
+        if self._max_users is not None and n_users > self._max_users:
+            self._spill()
+
+    def _lines(self, keys, order):
+        for idx in order:
+            yield "{}#{}#{}#{}#{}#{}\n".format(keys[idx], self._names[idx],
+                    self._first[idx], self._last[idx], self._edits[idx],
+                    self._articles[idx])
+
+    def _spill(self):
+        """Write the users held in memory to a run sorted by key."""
+        keys = list(self._ids)
+        fd, path = tempfile.mkstemp(dir=self._tmp_dir, suffix=".run")
+        self._runs.append(path)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.writelines(self._lines(keys, sorted(range(len(keys)),
+                    key=keys.__getitem__)))
+        self._reset()
+
+    def close(self):
+        if not self._runs:
+            self._out.writelines(
+                    self._lines(list(self._ids), range(len(self._names))))
+            return
+        if self._names:
+            self._spill()
+        handles = [open(path, encoding="utf-8") for path in self._runs]
+        try:
+            self._out.writelines(merge_user_lines(handles))
+        finally:
+            for handle in handles:
+                handle.close()
+            for path in self._runs:
+                os.remove(path)
+            self._runs = list()
+
+    def _grow(self, size):
+        """Enlarge the arrays to hold at least `size` users."""
+        new_size = len(self._first)
+        while new_size < size:
+            new_size *= 2
+        for name in ("_first", "_last", "_edits", "_articles"):
+            old = getattr(self, name)
+            arr = np.zeros(new_size, dtype=old.dtype)
+            arr[:len(old)] = old
+            setattr(self, name, arr)
+
+
+def _user_key(line):
+    return line[:line.index("#")]
+
+
+def merge_user_lines(runs):
+    """Merge runs of user statistics that are sorted by user key.
+
+    `runs` are iterables of lines in the format of `UserStats`, given in
+    chronological order: for each user, the latest name is kept, and the
+    statistics are combined. Yields the merged lines, sorted by user key.
+    """
+    # `heapq.merge` is stable, so the lines of later runs come last for
+    # equal keys.
+    merged = heapq.merge(*runs, key=_user_key)
+    for key, lines in itertools.groupby(merged, key=_user_key):
+        _, name, first, last, edits, articles = next(lines).strip().split("#")
+        first, last, edits, articles = map(int, (first, last, edits, articles))
+        for line in lines:
+            _, name, f, l, e, a = line.strip().split("#")
+            first = min(first, int(f))
+            last = max(last, int(l))
+            edits += int(e)
+            articles += int(a)
+        yield "{}#{}#{}#{}#{}#{}\n".format(
+                key, name, first, last, edits, articles)
+
+
+class ArticleStats(Consumer):
+
+    """Statistics about articles.
+
+    Writes one line per article: `page ID#title#number of edits#number of
+    editors`. All deleted users count as a single editor.
+    """
+
+    namespaces = {0}
+
+    def __init__(self, out):
+        self._out = out
+        self._editors = None
+        self._n_edits = 0
+
+    def start_page(self, page):
+        self._editors = set()
+        self._n_edits = 0
+
+    def add_revision(self, rev):
+        contr_id = rev.contributor
+        self._editors.add(contr_id if contr_id is not None else "-")
+        self._n_edits += 1
+
+    def end_page(self, page):
+        print("{}#{}#{}#{}".format(page.id, page.title, self._n_edits,
+                len(self._editors)), file=self._out)
+
+
+class BotDetector(Consumer):
+
+    """Officially recognized bots.
+
+    Wikipedia's policy on bots requires all bots to be marked with the
+    `{{bot}}` flag on their user pages. Writes one line per bot: `user
+    name#parameters of the flag` (or `-` if there are none). The bots are
+    also collected in `bots`, and nothing is written if `out` is `None`.
+    """
+
+    namespaces = {2}
+    text = True
+
+    BOT_FLAG = re.compile(r"\{\{bot", re.IGNORECASE)
+    BRACES = re.compile(r"[{}]")
+
+    def __init__(self, out):
+        self._out = out
+        self.bots = dict()
+        self._username = None
+
+    def start_page(self, page):
+        if page.title is None:
+            self._username = ""
+        else:
+            # Keep the user name without the "User:" prefix found in the
+            # titles of Wikipedia user pages.
+            colon_index = page.title.find(":")
+            if colon_index < 0:
+                self._username = page.title[5:]
+            else:
+                self._username = page.title[colon_index + 1:]
+
+    def add_revision(self, rev):
+        text = rev.text if rev.text is not None else ""
+        match = self.BOT_FLAG.search(text)
+        if match is None:
+            return
+        bot_label = match.start()
+        # The bot tag can also contain some data about the owner, the wiki
+        # the bot originates from, etc.
+        close_paren = text.find("}}", bot_label)
+        sep = text.find("|", bot_label)
+        if sep == -1 or sep > close_paren:
+            self.bots[self._username] = "-"
+        else:
+            # Find the matching parenthesis for the bot tag.
+            count = 0
+            end = len(text)
+            for brace in self.BRACES.finditer(text, sep):
+                count += 1 if brace.group() == "{" else -1
+                if count < 0:
+                    end = brace.end()
+                    break
+            self.bots[self._username] = text[sep + 1:end - 1]
+
+    def close(self):
+        if self._out is not None:
+            write_bots(self._out, self.bots)
+
+
+def write_bots(out, bots):
+    """Write a dictionary of bots in the format of `BotDetector`."""
+    writer = csv.writer(out, delimiter="#")
+    for name, params in bots.items():
+        writer.writerow((name, params))
+
+
+def _union(namespaces):
+    """Union of sets of namespaces, where `None` means all of them."""
+    res = set()
+    for ns in namespaces:
+        if ns is None:
+            return None
+        res |= ns
+    return res
+
+
+def process_dump(f, consumers, include_redirects=True,
+        include_disambiguation=True):
+    """Read a dump once and feed its pages to the consumers.
+
+    `f` is a binary file object (see `interank.dump.open_dump`). Redirects
+    and disambiguation pages can be excluded from the articles (i.e., the
+    pages in namespace 0). Excluding disambiguation pages requires holding
+    the whole history of each article in memory.
+    """
+    namespaces = _union(c.namespaces for c in consumers)
+    # Texts are only kept in the namespaces of the consumers that need them.
+    text = _union(c.namespaces for c in consumers if c.text)
+    if not include_disambiguation and text is not None:
+        text.add(0)
+    if text is None:
+        text = True
+    for page, revisions in iter_pages(f, namespaces, text):
+        if page.ns == 0:
+            if page.redirect and not include_redirects:
+                continue
+            if not include_disambiguation:
+                revisions = list(revisions)
+                if is_disambiguation(rev.text for rev in revisions):
+                    continue
+        active = [c for c in consumers
+                if c.namespaces is None or page.ns in c.namespaces]
+        for consumer in active:
+            consumer.start_page(page)
+        for rev in revisions:
+            for consumer in active:
+                consumer.add_revision(rev)
+        for consumer in active:
+            consumer.end_page(page)
+    for consumer in consumers:
+        consumer.close()
@@ -0,0 +1,251 @@
+"""Streaming reader for MediaWiki XML dumps.
+
+The dump is parsed with expat, and only the fields that are needed are kept:
+at any point in time, the memory usage is bounded by a chunk of the input and
+the text of a single revision. Revisions are returned as compact `Revision`
+records, which refer to the `Page` they belong to.
+
+Example:
+
+    with open_dump("trwiki-20171001-pages-meta-history.xml.bz2") as f:
+        for page, revisions in iter_pages(f, namespaces={0}):
+            for rev in revisions:
+                print(page.id, rev.id, rev.timestamp, rev.contributor)
+"""
+import calendar
+import itertools
+import operator
+import xml.parsers.expat
+
+from .bz2reader import open_dump
+
+
+# Size of the chunks fed to the parser.
+CHUNK_SIZE = 1 << 20
+
+# Tag names, for code that parses dumps with ElementTree.
+NAMESPACE = "{http://www.mediawiki.org/xml/export-0.10/}"
+PAGE_TAG = NAMESPACE + "page"
+NS_TAG = NAMESPACE + "ns"
+TITLE_TAG = NAMESPACE + "title"
+REDIRECT_TAG = NAMESPACE + "redirect"
+TEXT_TAG = NAMESPACE + "text"
+
+# Templates that mark disambiguation pages, by language. They are matched
+# as substrings of the wikitext.
+DISAMBIGUATION_TAGS = {
+    "simple": ["{{disambig}}"],
+    "bar": ["{{Begriffsklärung}}"],
+    "tr": ["{{anlam ayrımı}}"],
+    "fr": ["{{Homonymie}}", "{{homonymie}}"],
+    "en": ["{{Disambiguation", "{{disambiguation", "disambiguation}}"],
+}
+
+_DAYS = dict()
+
+
+class Page:
+
+    """Header of a page of the dump."""
+
+    __slots__ = ("id", "ns", "title", "redirect")
+
+    def __init__(self):
+        self.id = None
+        self.ns = None
+        self.title = None
+        self.redirect = False
+
+
+class Revision:
+
+    """A revision of a page.
+
+    `contributor` is the key identifying the contributor (`r<id>` for
+    registered users, `r0|<name>` for imported users without an ID and
+    `u<ip>` for anonymous users) and `username` is the name of the user, or
+    `-` for anonymous users. Both are `None` if the contributor was deleted.
+    `text` is `None` if the text was deleted or not requested.
+    """
+
+    __slots__ = ("page", "id", "timestamp", "contributor", "username", "text")
+
+    def __init__(self, page):
+        self.page = page
+        self.id = None
+        self.timestamp = None
+        self.contributor = None
+        self.username = None
+        self.text = None
+
+
+def parse_timestamp(ts):
+    """Convert a `YYYY-MM-DDTHH:MM:SSZ` timestamp into a UNIX timestamp."""
+    day = _DAYS.get(ts[:10])
+    if day is None:
+        day = calendar.timegm(
+                (int(ts[0:4]), int(ts[5:7]), int(ts[8:10]), 0, 0, 0))
+        _DAYS[ts[:10]] = day
+    return day + 3600 * int(ts[11:13]) + 60 * int(ts[14:16]) + int(ts[17:19])
+
+
+def contributor_key(user_id, username, ip):
+    """Compute the key and the name of a contributor."""
+    if ip is not None:
+        return "u" + ip, "-"
+    if user_id is None:
+        # No data about the user (probably due to account deletion).
+        return None, None
+    if user_id == "0":
+        if username is None:
+            return None, None
+        return "r0|" + username, username
+    return "r" + user_id, username
+
+
+def is_disambiguation(texts, lang=None):
+    """Decide whether one of the texts marks a disambiguation page.
+
+    `lang` is a language of `DISAMBIGUATION_TAGS` or a sequence of them;
+    by default, the tags of all the languages are used.
+    """
+    if lang is None:
+        lang = DISAMBIGUATION_TAGS.keys()
+    elif isinstance(lang, str):
+        lang = [lang]
+    tags = [tag for code in lang for tag in DISAMBIGUATION_TAGS[code]]
+    for text in texts:
+        if text is not None:
+            for tag in tags:
+                if tag in text:
+                    return True
+    return False
+
+
+class _DumpParser:
+
+    """Expat handlers that turn the dump into `Revision` records."""
+
+    def __init__(self, namespaces, text):
+        self.revisions = list()
+        self._namespaces = namespaces
+        # Either a boolean or a set of namespaces.
+        self._text_namespaces = text
+        self._with_text = text is True
+        self._parser = xml.parsers.expat.ParserCreate()
+        self._parser.buffer_text = True
+        self._parser.buffer_size = 1 << 16
+        self._parser.StartElementHandler = self._start
+        self._parser.EndElementHandler = self._end
+        self._parser.CharacterDataHandler = self._data
+        self._page = None
+        self._rev = None
+        self._contributor = None
+        self._skip = False
+        self._chars = None
+
+    def feed(self, data, final=False):
+        self._parser.Parse(data, final)
+
+    def _data(self, data):
+        if self._chars is not None:
+            self._chars.append(data)
+
+    def _text(self):
+        text = "".join(self._chars) if self._chars else None
+        self._chars = None
+        return text
+
+    def _start(self, tag, attrs):
+        if self._skip:
+            return
+        if self._contributor is not None:
+            if tag in ("id", "username", "ip"):
+                self._chars = list()
+        elif self._rev is not None:
+            if tag == "contributor":
+                self._contributor = dict()
+            elif tag in ("id", "timestamp") or (
+                    tag == "text" and self._with_text):
+                self._chars = list()
+        elif self._page is not None:
+            if tag == "revision":
+                self._rev = Revision(self._page)
+            elif tag in ("id", "ns", "title"):
+                self._chars = list()
+            elif tag == "redirect":
+                self._page.redirect = True
+        elif tag == "page":
+            self._page = Page()
+
+    def _end(self, tag):
+        if tag == "page":
+            self._page = None
+            if self._skip:
+                self._skip = False
+                self._parser.CharacterDataHandler = self._data
+            return
+        if self._skip:
+            return
+        if self._contributor is not None:
+            if tag == "contributor":
+                self._rev.contributor, self._rev.username = contributor_key(
+                        self._contributor.get("id"),
+                        self._contributor.get("username"),
+                        self._contributor.get("ip"))
+                self._contributor = None
+            elif self._chars is not None:
+                self._contributor[tag] = self._text()
+        elif self._rev is not None:
+            if tag == "revision":
+                self.revisions.append(self._rev)
+                self._rev = None
+            elif tag == "id":
+                self._rev.id = int(self._text())
+            elif tag == "timestamp":
+                self._rev.timestamp = parse_timestamp(self._text())
+            elif tag == "text" and self._chars is not None:
+                self._rev.text = self._text()
+        elif self._page is not None:
+            if tag == "id":
+                self._page.id = int(self._text())
+            elif tag == "title":
+                self._page.title = self._text()
+            elif tag == "ns":
+                self._page.ns = int(self._text())
+                if not isinstance(self._text_namespaces, bool):
+                    self._with_text = self._page.ns in self._text_namespaces
+                if (self._namespaces is not None
+                        and self._page.ns not in self._namespaces):
+                    # Nothing else is needed until the end of the page.
+                    self._skip = True
+                    self._parser.CharacterDataHandler = None
+
+
+def iter_revisions(f, namespaces=None, text=True):
+    """Iterate over the revisions of a dump.
+
+    `f` is a binary file object (see `open_dump`). If `namespaces` is given,
+    only the revisions of the pages in these namespaces are returned. If
+    `text` is false, the texts of the revisions are not kept; it can also be
+    a set of namespaces, whose pages are the only ones whose texts are kept.
+    """
+    parser = _DumpParser(namespaces, text)
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        parser.feed(chunk, final=not chunk)
+        revisions, parser.revisions = parser.revisions, list()
+        yield from revisions
+        if not chunk:
+            break
+
+
+def iter_pages(f, namespaces=None, text=True):
+    """Iterate over the pages of a dump.
+
+    Yields pairs `(page, revisions)`, where `revisions` is an iterator over
+    the revisions of the page, in the same way as `itertools.groupby`. The
+    arguments are the same as for `iter_revisions`.
+    """
+    return itertools.groupby(iter_revisions(f, namespaces, text),
+            key=operator.attrgetter("page"))
@@ -0,0 +1,281 @@
+"""Index of the pages of a MediaWiki XML dump.
+
+The index records the (decompressed) byte offset, the ID and the namespace of
+every page of a dump, and, for bz2 files, the offsets of the bz2 blocks. With
+it, a range of pages can be read without going through the rest of the file,
+which makes it possible to process a single large dump with several
+independent workers, or to jump straight to a given page. Example:
+
+    index = DumpIndex.build("dump.xml.bz2")
+    index.save("dump.xml.bz2.index.npz")
+    # Process the second quarter of the pages.
+    start, stop = index.shards(4)[1]
+    with index.open_range("dump.xml.bz2", start, stop) as f:
+        for page, revisions in iter_pages(f):
+            ...
+
+Since `<` is always escaped in the contents of a dump, pages are found by
+scanning the bytes for `<page>` rather than by parsing the XML.
+"""
+import io
+import re
+
+import numpy as np
+
+from .bz2reader import READ_SIZE, ParallelBZ2Reader
+
+
+PAGE_HEADER = re.compile(
+        rb"<page>\s*<title>[^<]*</title>\s*<ns>(-?\d+)</ns>\s*<id>(\d+)</id>")
+END_TAG = b"</mediawiki>"
+
+
+class _ChunkReader(io.RawIOBase):
+
+    """Read-only file object over an iterator of byte strings."""
+
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._buffer = b""
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while self._pos >= len(self._buffer):
+            self._buffer = next(self._chunks, None)
+            self._pos = 0
+            if self._buffer is None:
+                self._buffer = b""
+                return 0
+        n = min(len(b), len(self._buffer) - self._pos)
+        b[:n] = self._buffer[self._pos:self._pos+n]
+        self._pos += n
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._chunks.close()
+        super().close()
+
+
+def _scan_pages(f):
+    """Find the pages of a dump.
+
+    Returns lists of offsets, page IDs and namespaces, and the offset of the
+    closing `</mediawiki>` tag.
+    """
+    offsets, page_ids, namespaces = list(), list(), list()
+    end = None
+    buf = b""
+    base = 0  # Offset of `buf[0]`.
+    while True:
+        chunk = f.read(READ_SIZE)
+        buf += chunk
+        pos = 0
+        for match in PAGE_HEADER.finditer(buf):
+            offsets.append(base + match.start())
+            namespaces.append(int(match.group(1)))
+            page_ids.append(int(match.group(2)))
+            pos = match.end()
+        idx = buf.find(END_TAG, pos)
+        if idx != -1:
+            end = base + idx
+        if not chunk:
+            break
+        # Keep a page whose header is incomplete, or a partial tag.
+        keep = buf.find(b"<page>", pos)
+        if keep == -1:
+            keep = max(pos, len(buf) - len(END_TAG))
+        buf = buf[keep:]
+        base += keep
+    if end is None:
+        end = base + len(buf)
+    return offsets, page_ids, namespaces, end
+
+
+class RawPages:
+
+    """The pages of a dump, as raw bytes.
+
+    `header` holds the bytes that precede the first page (the opening
+    `<mediawiki>` tag and the site information). Iterating yields tuples
+    `(namespace, redirect, data)`, where `data` spans a page from `<page>` to
+    `</page>` included and `redirect` tells whether the page is a redirect.
+    Only one page is held in memory at a time.
+    """
+
+    def __init__(self, f):
+        self._f = f
+        self._buf = bytearray()
+        start = 0
+        while True:
+            idx = self._buf.find(b"<page>", start)
+            if idx != -1:
+                break
+            start = max(0, len(self._buf) - len(b"<page>"))
+            chunk = f.read(READ_SIZE)
+            if not chunk:
+                idx = self._buf.find(END_TAG)
+                idx = len(self._buf) if idx == -1 else idx
+                break
+            self._buf += chunk
+        self.header = bytes(self._buf[:idx]).rstrip(b" \t")
+        del self._buf[:idx]
+
+    def __iter__(self):
+        buf = self._buf
+        start = 0
+        while True:
+            end = buf.find(b"</page>", start)
+            if end == -1:
+                chunk = self._f.read(READ_SIZE)
+                if not chunk:
+                    return
+                start = max(0, len(buf) - len(b"</page>"))
+                buf += chunk
+                continue
+            end += len(b"</page>")
+            data = bytes(buf[:end])
+            del buf[:end]
+            start = 0
+            match = PAGE_HEADER.match(data)
+            if match is None:
+                raise ValueError("invalid page header: {!r}".format(data[:200]))
+            head = data[:data.find(b"<revision>")]
+            yield int(match.group(1)), b"<redirect" in head, data
+            # Skip to the next page.
+            while True:
+                idx = buf.find(b"<page>")
+                if idx != -1:
+                    del buf[:idx]
+                    break
+                if buf.find(END_TAG) != -1:
+                    return
+                chunk = self._f.read(READ_SIZE)
+                if not chunk:
+                    return
+                buf += chunk
+
+
+class DumpIndex:
+
+    """Offsets of the pages of a dump.
+
+    `offsets[i]` is the offset of the `i`-th page in the decompressed dump.
+    For bz2 files, `block_bits[j]` is the bit offset of the `j`-th block in
+    the compressed file and `block_offsets[j]` the offset of its first byte
+    in the decompressed dump.
+    """
+
+    def __init__(self, page_ids, namespaces, offsets, end,
+            block_bits=None, block_offsets=None):
+        self.page_ids = np.asarray(page_ids, dtype=np.int64)
+        self.namespaces = np.asarray(namespaces, dtype=np.int32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.end = int(end)
+        if block_bits is not None:
+            self.block_bits = np.asarray(block_bits, dtype=np.int64)
+            self.block_offsets = np.asarray(block_offsets, dtype=np.int64)
+        else:
+            self.block_bits = None
+            self.block_offsets = None
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @classmethod
+    def build(cls, path, processes=None):
+        """Index a (possibly bz2-compressed) dump."""
+        if not path.endswith(".bz2"):
+            with open(path, "rb") as f:
+                offsets, page_ids, namespaces, end = _scan_pages(f)
+            return cls(page_ids, namespaces, offsets, end)
+        raw = ParallelBZ2Reader(path, processes, record_blocks=True)
+        with io.BufferedReader(raw, buffer_size=READ_SIZE) as f:
+            offsets, page_ids, namespaces, end = _scan_pages(f)
+            block_bits, block_offsets = zip(*raw.blocks)
+        return cls(page_ids, namespaces, offsets, end,
+                block_bits, block_offsets)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        if "block_bits" in data:
+            blocks = (data["block_bits"], data["block_offsets"])
+        else:
+            blocks = (None, None)
+        return cls(data["page_ids"], data["namespaces"], data["offsets"],
+                data["end"], *blocks)
+
+    def save(self, path):
+        arrays = {
+            "page_ids": self.page_ids,
+            "namespaces": self.namespaces,
+            "offsets": self.offsets,
+            "end": np.int64(self.end),
+        }
+        if self.block_bits is not None:
+            arrays["block_bits"] = self.block_bits
+            arrays["block_offsets"] = self.block_offsets
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    def find(self, page_id):
+        """Position of the page with the given ID in the dump."""
+        idx = np.flatnonzero(self.page_ids == page_id)
+        if len(idx) == 0:
+            raise KeyError(page_id)
+        return int(idx[0])
+
+    def shards(self, n):
+        """Split the pages into `n` ranges of about the same size in bytes.
+
+        Returns a list of pairs `(start, stop)` of page positions.
+        """
+        first = self.offsets[0] if len(self) > 0 else self.end
+        targets = first + (self.end - first) * np.arange(1, n) / n
+        bounds = [0] + list(np.searchsorted(self.offsets, targets)) + [len(self)]
+        return [(int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:])]
+
+    def open_range(self, path, start, stop, processes=None):
+        """Open the pages at positions `start` to `stop` (excluded).
+
+        The pages are wrapped into the header of the dump and a closing
+        `</mediawiki>` tag, so that the result is a valid dump.
+        """
+        begin = self.offsets[start] if start < len(self) else self.end
+        end = self.offsets[stop] if stop < len(self) else self.end
+        head = self.offsets[0] if len(self) > 0 else self.end
+        chunks = self._iter_ranges(path, [(0, head), (begin, end)], processes)
+        return io.BufferedReader(_ChunkReader(chunks), buffer_size=READ_SIZE)
+
+    def _iter_ranges(self, path, ranges, processes):
+        for begin, end in ranges:
+            yield from self._iter_bytes(path, begin, end, processes)
+        yield END_TAG + b"\n"
+
+    def _iter_bytes(self, path, begin, end, processes):
+        """Iterate over the decompressed bytes from `begin` to `end`."""
+        if begin >= end:
+            return
+        if self.block_bits is None:
+            f = open(path, "rb")
+            f.seek(begin)
+        else:
+            i = np.searchsorted(self.block_offsets, begin, side="right") - 1
+            f = ParallelBZ2Reader(path, processes,
+                    start=int(self.block_bits[i]))
+            f = io.BufferedReader(f, buffer_size=READ_SIZE)
+            skip = int(begin - self.block_offsets[i])
+            while skip > 0:
+                skip -= len(f.read(min(skip, READ_SIZE)))
+        with f:
+            left = end - begin
+            while left > 0:
+                chunk = f.read(min(left, READ_SIZE))
+                if not chunk:
+                    break
+                left -= len(chunk)
+                yield chunk
@@ -0,0 +1,129 @@
+"""Persistent index from wiki IDs to the IDs of a processed dataset.
+
+The processed `users.txt` and `articles.txt` files map dense IDs to wiki IDs
+(user keys such as `r123` or `u1.2.3.4`, and page IDs). `IdIndex` stores
+the 64-bit BLAKE2b hashes of the wiki IDs in sorted order, next to the
+corresponding dense IDs, in a single `.npy` file of records (e.g.,
+`users.index.npy`), which is replaced atomically so that readers never see
+the hashes of one build with the IDs of another. The file is memory-mapped,
+so opening an index is instantaneous and processes that use the same index
+share it through the page cache. An unknown wiki ID is mistaken for a known one only if their
+hashes collide, which happens with probability about `len(index) / 2**64`.
+Example:
+
+    index = IdIndex.for_file("processed/users.txt")
+    uids = index.lookup(["r123", "u1.2.3.4"])  # -1 if not found.
+"""
+import hashlib
+import os
+import os.path
+
+import numpy as np
+
+
+# Records of the index file.
+DTYPE = np.dtype([("hash", "<u8"), ("id", "<i8")])
+
+
+def hash_keys(keys):
+    """64-bit hashes of string keys."""
+    blake2b = hashlib.blake2b
+    digests = b"".join([blake2b(key.encode(), digest_size=8).digest()
+            for key in keys])
+    return np.frombuffer(digests, dtype="<u8")
+
+
+class IdIndex:
+
+    """Sorted hashes of wiki IDs, with their dense IDs."""
+
+    def __init__(self, hashes, ids):
+        self._hashes = hashes
+        self._ids = ids
+
+    @staticmethod
+    def index_path(path):
+        """Path of the index file of a processed users or articles file."""
+        return os.path.splitext(path)[0] + ".index.npy"
+
+    @classmethod
+    def build(cls, path):
+        """Index the wiki IDs of a processed users or articles file.
+
+        If a wiki ID appears several times, the last dense ID is kept.
+        """
+        keys = list()
+        ids = list()
+        with open(path) as f:
+            for line in f:
+                idx, wiki_id, _ = line.split("#", 2)
+                keys.append(wiki_id)
+                ids.append(int(idx))
+        hashes = hash_keys(keys)
+        ids = np.array(ids, dtype=np.int64)
+        # Reversing first keeps the last occurrence of duplicates.
+        hashes, ids, keys = hashes[::-1], ids[::-1], keys[::-1]
+        order = np.argsort(hashes, kind="mergesort")
+        hashes = hashes[order]
+        first = np.ones(len(hashes), dtype=bool)
+        first[1:] = hashes[1:] != hashes[:-1]
+        for i in np.flatnonzero(~first):
+            if keys[order[i]] != keys[order[i - 1]]:
+                raise ValueError("hash collision between {!r} and {!r}"
+                        .format(keys[order[i]], keys[order[i - 1]]))
+        return cls(hashes[first], ids[order][first])
+
+    def save(self, path):
+        """Write the index file of a processed users or articles file."""
+        dst = self.index_path(path)
+        records = np.empty(len(self._hashes), dtype=DTYPE)
+        records["hash"] = self._hashes
+        records["id"] = self._ids
+        # Written under a temporary name, as other processes might be
+        # reading the previous index.
+        tmp = "{}.{}.part".format(dst, os.getpid())
+        try:
+            with open(tmp, "wb") as f:
+                np.save(f, records)
+            os.replace(tmp, dst)
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """Memory-map the index file of a processed users or articles file."""
+        records = np.load(cls.index_path(path), mmap_mode="r")
+        return cls(records["hash"], records["id"])
+
+    @classmethod
+    def for_file(cls, path):
+        """Load the index of a file, building it first if it is outdated."""
+        index_path = cls.index_path(path)
+        if (os.path.exists(index_path)
+                and os.path.getmtime(index_path) >= os.path.getmtime(path)):
+            return cls.load(path)
+        index = cls.build(path)
+        index.save(path)
+        return index
+
+    def __len__(self):
+        return len(self._hashes)
+
+    @property
+    def max_id(self):
+        return int(self._ids.max()) if len(self._ids) else -1
+
+    def lookup(self, keys):
+        """Dense IDs of a sequence of wiki IDs, `-1` for unknown ones."""
+        hashes = hash_keys(keys)
+        if len(self._hashes) == 0:
+            return np.full(len(hashes), -1, dtype=np.int64)
+        pos = np.searchsorted(self._hashes, hashes)
+        pos[pos == len(self._hashes)] = 0
+        found = self._hashes[pos] == hashes
+        return np.where(found, self._ids[pos], -1)
+
+    def get(self, key, default=None):
+        idx = int(self.lookup([key])[0])
+        return default if idx < 0 else idx
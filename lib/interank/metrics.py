@@ -0,0 +1,223 @@
+"""Evaluation metrics for binary predictions, with bootstrap confidence
+intervals.
+
+The precision-recall curve and the average precision give the same results
+as their scikit-learn counterparts, but the predictions are sorted only once:
+bootstrap replicates are then evaluated by reweighting the sorted predictions
+(a bootstrap sample is equivalent to weighting each prediction by the number
+of times it is drawn), which avoids sorting tens of millions of predictions
+for every replicate. Replicates are computed in a pool of processes that
+share the inputs through shared memory. Example:
+
+    ap = average_precision(labels, 1 - probs)
+    estimate, low, high = bootstrap_ci(
+            "average_precision", labels, 1 - probs, processes=8)
+"""
+import multiprocessing as mp
+
+import numpy as np
+
+
+def _sort(y_true, y_score):
+    """Sort the predictions by decreasing score.
+
+    Returns the order, the sorted labels and the positions of the last
+    prediction of each distinct score.
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_score = np.asarray(y_score)
+    order = np.argsort(y_score, kind="mergesort")[::-1]
+    sorted_score = y_score[order]
+    idx = np.r_[np.flatnonzero(np.diff(sorted_score)), len(order) - 1]
+    return order, y_true[order], idx, sorted_score[idx]
+
+
+def _counts(sorted_true, idx, weights):
+    """True and false positives at each threshold."""
+    if weights is None:
+        tps = np.cumsum(sorted_true)[idx]
+        fps = 1 + idx - tps
+    else:
+        tps = np.cumsum(weights * sorted_true)[idx]
+        fps = np.cumsum(weights * (1 - sorted_true))[idx]
+    return tps, fps
+
+
+def _precision_recall(tps, fps):
+    ps = tps + fps
+    precision = np.divide(tps, ps, out=np.zeros_like(tps), where=(ps != 0))
+    if tps[-1] == 0:
+        recall = np.ones_like(tps)
+    else:
+        recall = tps / tps[-1]
+    return precision, recall
+
+
+def _average_precision(sorted_true, idx, weights=None):
+    precision, recall = _precision_recall(
+            *_counts(sorted_true, idx, weights))
+    return np.sum(np.diff(recall, prepend=0) * precision)
+
+
+def precision_recall_curve(y_true, y_score, sample_weight=None):
+    """Precision-recall pairs for different thresholds.
+
+    Same as `sklearn.metrics.precision_recall_curve` (up to scikit-learn
+    1.0, which stops the curve at the first threshold that reaches full
+    recall): returns the precision, the recall (in decreasing order, with a
+    final point at recall 0 and precision 1) and the increasing thresholds.
+    """
+    order, sorted_true, idx, thresholds = _sort(y_true, y_score)
+    weights = None
+    if sample_weight is not None:
+        weights = np.asarray(sample_weight, dtype=np.float64)[order]
+    tps, fps = _counts(sorted_true, idx, weights)
+    precision, recall = _precision_recall(tps, fps)
+    last = tps.searchsorted(tps[-1])
+    return (np.r_[precision[last::-1], 1], np.r_[recall[last::-1], 0],
+            thresholds[last::-1])
+
+
+def average_precision(y_true, y_score, sample_weight=None):
+    """Area under the precision-recall curve.
+
+    Same as `sklearn.metrics.average_precision_score` for binary labels.
+    """
+    order, sorted_true, idx, _ = _sort(y_true, y_score)
+    weights = None
+    if sample_weight is not None:
+        weights = np.asarray(sample_weight, dtype=np.float64)[order]
+    return _average_precision(sorted_true, idx, weights)
+
+
+def _log_losses(y_true, y_pred):
+    y_true = np.asarray(y_true, dtype=np.float64)
+    y_pred = np.asarray(y_pred, dtype=np.float64)
+    return -(y_true * np.log(y_pred) + (1 - y_true) * np.log(1 - y_pred))
+
+
+def avg_log_loss(y_true, y_pred, sample_weight=None):
+    """Average log-loss of the predicted probabilities."""
+    losses = _log_losses(y_true, y_pred)
+    if sample_weight is None:
+        return losses.mean()
+    return np.sum(sample_weight * losses) / np.sum(sample_weight)
+
+
+METRICS = ("average_precision", "avg_log_loss")
+
+# Inputs of the bootstrap, set in each worker by `_init_worker`.
+_shared = dict()
+
+
+def _to_shared(arr):
+    """Copy an array into shared memory, as 64-bit floats or integers."""
+    if arr.dtype.kind == "f":
+        code, arr = "d", np.ascontiguousarray(arr, dtype=np.float64)
+    else:
+        code, arr = "q", np.ascontiguousarray(arr, dtype=np.int64)
+    raw = mp.RawArray(code, len(arr))
+    np.frombuffer(raw, dtype=arr.dtype)[:] = arr
+    return raw, arr.dtype
+
+
+def _init_worker(metric, arrays):
+    _shared["metric"] = metric
+    _shared["arrays"] = [tuple(np.frombuffer(raw, dtype=dtype)
+            for raw, dtype in group) for group in arrays]
+
+
+def _replicates(seed, n_replicates):
+    """Evaluate the metric on bootstrap samples, for each prediction."""
+    metric, arrays = _shared["metric"], _shared["arrays"]
+    rng = np.random.default_rng(seed)
+    n = len(arrays[0][0])
+    res = np.empty((len(arrays), n_replicates))
+    for r in range(n_replicates):
+        weights = np.bincount(rng.integers(0, n, size=n),
+                minlength=n).astype(np.float64)
+        for i, group in enumerate(arrays):
+            if metric == "average_precision":
+                order, sorted_true, idx = group
+                res[i, r] = _average_precision(
+                        sorted_true, idx, weights[order])
+            else:
+                losses, = group
+                res[i, r] = np.dot(weights, losses) / n
+    return res
+
+
+def bootstrap_replicates(metric, y_true, y_scores, n_replicates=1000,
+        processes=None, seed=None):
+    """Values of a metric on bootstrap samples of the predictions.
+
+    `metric` is one of `METRICS`, and `y_scores` is a list of predictions
+    for the same labels. All predictions are evaluated on the same
+    bootstrap samples, which makes it possible to compare them (see
+    `paired_bootstrap_ci`). Returns an array of shape `(len(y_scores),
+    n_replicates)`. If `processes` is given, the replicates are computed in
+    a pool of processes, and the inputs are shared among them.
+    """
+    if metric not in METRICS:
+        raise ValueError("unknown metric: {}".format(metric))
+    arrays = list()
+    for y_score in y_scores:
+        if metric == "average_precision":
+            order, sorted_true, idx, _ = _sort(y_true, y_score)
+            group = (order, sorted_true, idx)
+        else:
+            group = (_log_losses(y_true, y_score),)
+        arrays.append(group)
+    seeds = np.random.SeedSequence(seed)
+    if processes is None:
+        _shared["metric"], _shared["arrays"] = metric, arrays
+        try:
+            return _replicates(seeds, n_replicates)
+        finally:
+            _shared.clear()
+    shared = [[_to_shared(arr) for arr in group] for group in arrays]
+    del arrays
+    n_tasks = min(n_replicates, 4 * processes)
+    sizes = [len(chunk) for chunk in np.array_split(
+            np.arange(n_replicates), n_tasks)]
+    tasks = list(zip(seeds.spawn(n_tasks), sizes))
+    with mp.Pool(processes, initializer=_init_worker,
+            initargs=(metric, shared)) as pool:
+        results = pool.starmap(_replicates, tasks)
+    return np.concatenate(results, axis=1)
+
+
+def _metric(metric, y_true, y_score):
+    if metric == "average_precision":
+        return average_precision(y_true, y_score)
+    return avg_log_loss(y_true, y_score)
+
+
+def bootstrap_ci(metric, y_true, y_score, n_replicates=1000, alpha=0.05,
+        processes=None, seed=None):
+    """Percentile bootstrap confidence interval of a metric.
+
+    Returns the value of the metric and the bounds of the `1 - alpha`
+    confidence interval.
+    """
+    values = bootstrap_replicates(metric, y_true, [y_score],
+            n_replicates, processes, seed)[0]
+    low, high = np.percentile(values, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+    return _metric(metric, y_true, y_score), low, high
+
+
+def paired_bootstrap_ci(metric, y_true, y_score1, y_score2,
+        n_replicates=1000, alpha=0.05, processes=None, seed=None):
+    """Paired bootstrap confidence interval of the difference of a metric.
+
+    The two predictions are evaluated on the same bootstrap samples. Returns
+    the difference between the metric of the first and of the second
+    prediction, and the bounds of its `1 - alpha` confidence interval.
+    """
+    values = bootstrap_replicates(metric, y_true, [y_score1, y_score2],
+            n_replicates, processes, seed)
+    diffs = values[0] - values[1]
+    low, high = np.percentile(diffs, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+    diff = (_metric(metric, y_true, y_score1)
+            - _metric(metric, y_true, y_score2))
+    return diff, low, high
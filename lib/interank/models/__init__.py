@@ -1,3 +1,58 @@
-from .basic_model import BasicModel
-from .dot_model import DotModel
-from .whitehill_model import WhitehillModel
+"""Models, with their backends.
+
+The TensorFlow models are imported on first use, e.g., by
+`from interank.models import BasicModel`, so that importing `interank` does
+not import TensorFlow. `get_model` looks a model up by backend and name; the
+`numpy` backend provides the online model of `interank.replay`, which does
+not need TensorFlow:
+
+    Model = get_model("dot", backend="numpy")
+    model = Model(n_users=n_users, n_articles=n_articles, n_dims=10)
+"""
+import importlib
+
+
+# Models of each backend, as `module:attribute`, imported on request.
+BACKENDS = {
+    "tensorflow": {
+        "basic": "interank.models.basic_model:BasicModel",
+        "dot": "interank.models.dot_model:DotModel",
+        "whitehill": "interank.models.whitehill_model:WhitehillModel",
+    },
+    "numpy": {
+        "basic": "interank.replay:OnlineModel",
+        "dot": "interank.replay:OnlineModel",
+    },
+}
+
+# Classes that are imported from this package, and their modules.
+_LAZY = {
+    "TensorFlowModel": ".model",
+    "BasicModel": ".basic_model",
+    "DotModel": ".dot_model",
+    "WhitehillModel": ".whitehill_model",
+}
+
+
+def register(backend, name, path):
+    """Add a model (given as `module:attribute`) to a backend."""
+    BACKENDS.setdefault(backend, dict())[name] = path
+
+
+def get_model(name, backend="tensorflow"):
+    """Class of a model, importing its backend if needed."""
+    try:
+        path = BACKENDS[backend][name]
+    except KeyError:
+        raise ValueError("unknown model {!r} for backend {!r}".format(
+                name, backend))
+    module, attr = path.split(":")
+    return getattr(importlib.import_module(module), attr)
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        module = importlib.import_module(_LAZY[name], __name__)
+        return getattr(module, name)
+    raise AttributeError("module {!r} has no attribute {!r}".format(
+            __name__, name))
@@ -9,22 +9,27 @@ class BasicModel(TensorFlowModel):
     """Class for managing the simple model in TensorFlow.
 
     The simple model only contains a skill parameter for each user
-    and a difficulty parameter for each article.
+    and a difficulty parameter for each article. With a vocabulary, some
+    users share their skill parameter (see `interank.vocabulary`).
     """
 
-    def __init__(self, *, n_users, n_articles, global_bias=False):
+    def __init__(self, *, n_users, n_articles, global_bias=False,
+            vocabulary=None):
         self._with_global_bias = global_bias
+        # Users share parameters according to the vocabulary, if any.
+        n_rows = n_users if vocabulary is None else vocabulary.n_rows
         # Parameters.
-        self._skill = tf.Variable(tf.zeros([n_users]), name="skill")
+        self._skill = tf.Variable(tf.zeros([n_rows]), name="skill")
         self._difficulty = tf.Variable(tf.zeros([n_articles]),
                 name="difficulty")
         # L2 losses (for regularization purposes).
         self._l2_skill = tf.nn.l2_loss(self._skill)
         self._l2_difficulty = tf.nn.l2_loss(self._difficulty)
-        super().__init__(n_users=n_users, n_articles=n_articles)
+        super().__init__(n_users=n_users, n_articles=n_articles,
+                vocabulary=vocabulary)
 
     def _logit_model(self, user_id, article_id):
-        logit = (tf.gather(self._skill, self._user_id)
+        logit = (tf.gather(self._skill, self._user_row(self._user_id))
                 - tf.gather(self._difficulty, self._article_id))
         if self._with_global_bias:
             self._global_bias = tf.Variable(0., name="global_bias")
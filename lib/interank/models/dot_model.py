@@ -7,15 +7,18 @@ class DotModel(TensorFlowModel):
 
     """Class for managing the dot model in TensorFlow."""
 
-    def __init__(self, *, n_users, n_articles, n_dims, global_bias=False):
+    def __init__(self, *, n_users, n_articles, n_dims, global_bias=False,
+            vocabulary=None):
         self._with_global_bias = global_bias
         self._n_dims = n_dims
+        # Users share parameters according to the vocabulary, if any.
+        n_rows = n_users if vocabulary is None else vocabulary.n_rows
         # Parameters.
-        self._skill = tf.Variable(tf.zeros([n_users]), name="skill")
+        self._skill = tf.Variable(tf.zeros([n_rows]), name="skill")
         self._difficulty = tf.Variable(tf.zeros([n_articles]),
                 name="difficulty")
         self._vec_user = tf.Variable(
-                tf.random_uniform([n_users, n_dims],
+                tf.random_uniform([n_rows, n_dims],
                         minval=-1e-3, maxval=1e-3, seed=42),
                 name="vec_user")
         self._vec_article = tf.Variable(
@@ -27,13 +30,15 @@ class DotModel(TensorFlowModel):
         self._l2_difficulty = tf.nn.l2_loss(self._difficulty)
         self._l2_vec_user = tf.nn.l2_loss(self._vec_user)
         self._l2_vec_article = tf.nn.l2_loss(self._vec_article)
-        super().__init__(n_users=n_users, n_articles=n_articles)
+        super().__init__(n_users=n_users, n_articles=n_articles,
+                vocabulary=vocabulary)
 
     def _logit_model(self, user_id, article_id):
+        user_row = self._user_row(user_id)
         dot_prod = tf.reduce_sum(tf.multiply(
-                tf.gather(self._vec_user, user_id),
+                tf.gather(self._vec_user, user_row),
                 tf.gather(self._vec_article, self._article_id)), 1)
-        logit = (tf.gather(self._skill, self._user_id)
+        logit = (tf.gather(self._skill, user_row)
                 - tf.gather(self._difficulty, self._article_id)
                 + dot_prod)
         if self._with_global_bias:
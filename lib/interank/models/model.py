@@ -1,22 +1,104 @@
 import abc
+import os
+
+import numpy as np
 import tensorflow as tf
 
 
 class TensorFlowModel(metaclass=abc.ABCMeta):
 
-    def __init__(self, *, n_users, n_articles):
+    """Base class of the models.
+
+    The inputs (`user_id`, `article_id` and `quality`) can be fed directly.
+    Alternatively, datasets can be staged once in variables of the graph
+    with `stage`, after which only the positions of the edits (a minibatch)
+    or nothing at all (a whole dataset) are fed, with `staged_feed`:
+
+        model.stage(session, train=train_data, test=test_data)
+        for idx in np.array_split(np.random.permutation(n_train), n_batches):
+            session.run(train_op, feed_dict=model.staged_feed("train", idx))
+        session.run(model.avg_log_loss, feed_dict=model.staged_feed("test"))
+
+    With a vocabulary (see `interank.vocabulary`), the mapping from users to
+    rows of the user parameters is held in a variable, rather than in a
+    constant that would be part of the graph definition; it must be set with
+    `load_vocabulary` after the variables are initialized.
+    """
+
+    # Form of the logit, recorded by `export` (see `interank.scoring`).
+    LOGIT = "skill-difficulty"
+
+    # Inputs of the model, with their types.
+    INPUTS = (("user_id", tf.int32), ("article_id", tf.int32),
+            ("quality", tf.float32))
+
+    def __init__(self, *, n_users, n_articles, vocabulary=None):
         self._n_users = n_users
         self._n_articles = n_articles
+        self._vocabulary = vocabulary
         self._build_tf_graph()
 
+    def _user_row(self, user_id):
+        """Rows of the user parameters (see `interank.vocabulary`)."""
+        if self._vocabulary is None:
+            return user_id
+        if not hasattr(self, "_user_rows"):
+            # Not in any collection, as the staged data (it is exported with
+            # the parameters by `export`). Using the model before
+            # `load_vocabulary` fails, as the variable is not initialized.
+            self._user_rows = tf.Variable(tf.zeros([0], dtype=tf.int32),
+                    trainable=False, collections=[], validate_shape=False,
+                    name="user_row")
+            self._user_rows_input = tf.placeholder(tf.int32, shape=[None])
+            self._load_user_rows = tf.assign(self._user_rows,
+                    self._user_rows_input, validate_shape=False)
+        return tf.gather(self._user_rows, user_id)
+
+    def load_vocabulary(self, session):
+        """Set the mapping from users to rows of the user parameters."""
+        if self._vocabulary is not None:
+            session.run(self._load_user_rows,
+                    feed_dict={self._user_rows_input: self._vocabulary.rows})
+
+    def _build_staging(self):
+        # The staged data are not part of the parameters: the variables are
+        # not in any collection, so that they are neither initialized nor
+        # saved with the model. They are set by `stage`.
+        self._staged = dict()
+        self._stage_input = dict()
+        self._stage_ops = list()
+        for name, dtype in self.INPUTS:
+            var = tf.Variable(tf.zeros([0], dtype=dtype), trainable=False,
+                    collections=[], validate_shape=False,
+                    name="staged_{}".format(name))
+            value = tf.placeholder(dtype, shape=[None])
+            self._stage_ops.append(
+                    tf.assign(var, value, validate_shape=False))
+            self._staged[name] = var
+            self._stage_input[name] = value
+        self._stage_ranges = dict()
+        # Positions of the edits in the staged data: either given, or the
+        # range `[start, stop)` (by default, all the staged data).
+        n_staged = tf.shape(self._staged["user_id"])[0]
+        self._start = tf.placeholder_with_default(0, shape=[], name="start")
+        self._stop = tf.placeholder_with_default(
+                n_staged, shape=[], name="stop")
+        self._index = tf.placeholder_with_default(
+                tf.range(self._start, self._stop), shape=[None],
+                name="index")
+
     def _build_tf_graph(self):
-        # Placeholders.
-        self._user_id = tf.placeholder(
-                tf.int32, shape=[None], name="user_id")
-        self._article_id = tf.placeholder(
-                tf.int32, shape=[None], name="article_id")
-        self._quality = tf.placeholder(
-                tf.float32, shape=[None], name="quality")
+        self._build_staging()
+        # Inputs, which are the staged data unless they are fed.
+        self._user_id = tf.placeholder_with_default(
+                tf.gather(self._staged["user_id"], self._index),
+                shape=[None], name="user_id")
+        self._article_id = tf.placeholder_with_default(
+                tf.gather(self._staged["article_id"], self._index),
+                shape=[None], name="article_id")
+        self._quality = tf.placeholder_with_default(
+                tf.gather(self._staged["quality"], self._index),
+                shape=[None], name="quality")
 
         logit = self._logit_model(self._user_id, self._article_id)
         self._probability = tf.nn.sigmoid(logit)
@@ -28,14 +110,70 @@ class TensorFlowModel(metaclass=abc.ABCMeta):
         self._avg_log_loss = tf.reduce_mean(
                 cross_entropy, name='avg_log_loss')
 
+    def stage(self, session, **datasets):
+        """Copy datasets into the graph, once.
+
+        Each dataset is a tuple `(user IDs, article IDs, qualities, ...)`,
+        as returned by `WikiData` or `LinuxData`, and is then referred to by
+        its keyword in `staged_feed`. Replaces the previously staged data.
+        """
+        columns = [list() for _ in self.INPUTS]
+        offset = 0
+        self._stage_ranges = dict()
+        for name, data in datasets.items():
+            size = len(data[0])
+            for col, values in zip(columns, data[:3]):
+                col.append(values)
+            self._stage_ranges[name] = (offset, offset + size)
+            offset += size
+        feed = dict()
+        for (name, dtype), col in zip(self.INPUTS, columns):
+            feed[self._stage_input[name]] = np.concatenate(
+                    [np.asarray(x) for x in col] or [np.zeros(0)]
+                    ).astype(dtype.as_numpy_dtype)
+        session.run(self._stage_ops, feed_dict=feed)
+
+    def staged_feed(self, name, index=None):
+        """Feed dictionary that selects edits of a staged dataset.
+
+        `index` contains the positions of the edits in the dataset (e.g., of
+        a minibatch); if it is `None`, the whole dataset is selected.
+        """
+        start, stop = self._stage_ranges[name]
+        if index is None:
+            return {self._start: start, self._stop: stop}
+        return {self._index: np.asarray(index, dtype=np.int32) + start}
+
     @abc.abstractmethod
     def _logit_model(self, user_id, article_id):
         """Defines how the prediction is made."""
 
+    def export(self, session, path):
+        """Save the parameters to a `.npz` file, for `interank.scoring`.
+
+        The file is replaced atomically, so that scorers that reload it never
+        see a partial export.
+        """
+        names = ("skill", "difficulty", "global_bias",
+                "vec_user", "vec_article")
+        tensors = {name: getattr(self, name) for name in names
+                if getattr(self, name, None) is not None}
+        params = session.run(tensors)
+        if self._vocabulary is not None:
+            params["user_row"] = self._vocabulary.rows
+        tmp = path + ".part"
+        with open(tmp, "wb") as f:
+            np.savez(f, logit=np.array(self.LOGIT), **params)
+        os.replace(tmp, path)
+
     @property
     def n_users(self):
         return self._n_users
 
+    @property
+    def vocabulary(self):
+        return self._vocabulary
+
     @property
     def n_articles(self):
         return self._n_articles
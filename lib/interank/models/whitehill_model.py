@@ -8,6 +8,8 @@ class WhitehillModel(TensorFlowModel):
 
     """Class to compute the baseline from Whitehill et al."""
 
+    LOGIT = "whitehill"
+
     def __init__(self, *, n_users, n_articles, global_bias=False):
         self._with_global_bias = global_bias
         # Parameters.
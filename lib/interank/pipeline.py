@@ -0,0 +1,186 @@
+"""Local execution of jobs that depend on each other.
+
+A pipeline is a list of `Job`s, each of which produces some output files
+from some input files. A job can start once the jobs that produce its inputs
+have completed and enough CPUs and memory are available. Jobs whose outputs
+are newer than all their inputs are skipped, so that an interrupted pipeline
+can simply be run again. Outputs are written to temporary files and renamed
+once the job succeeds, hence a partial output is never mistaken for a
+complete one.
+"""
+import collections
+import concurrent.futures
+import os
+import subprocess
+import sys
+import time
+
+
+class Job:
+
+    """A step of a pipeline.
+
+    The job is either a command or a Python function. `command` is called
+    with the list of (temporary) output paths and returns the command-line
+    arguments; if `stdout` is true, the standard output of the command is
+    written to the first output. `function` is called with the list of input
+    paths and the list of (temporary) output paths. `cpus` and `memory` (in
+    GB) are the resources that the job is expected to use.
+    """
+
+    def __init__(self, name, inputs, outputs, command=None, function=None,
+            stdout=False, cpus=1, memory=0):
+        if (command is None) == (function is None):
+            raise ValueError("exactly one of command and function is needed")
+        self.name = name
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.command = command
+        self.function = function
+        self.stdout = stdout
+        self.cpus = cpus
+        self.memory = memory
+
+    def up_to_date(self):
+        """Whether all the outputs exist and are newer than the inputs."""
+        try:
+            oldest = min(os.path.getmtime(p) for p in self.outputs)
+        except (OSError, ValueError):
+            return False
+        newest = max((os.path.getmtime(p) for p in self.inputs
+                if os.path.exists(p)), default=0)
+        return oldest >= newest
+
+    def execute(self):
+        """Run the job, and move its outputs in place if it succeeds."""
+        tmp = ["{}.part".format(path) for path in self.outputs]
+        for path in self.outputs:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        try:
+            if self.function is not None:
+                self.function(self.inputs, tmp)
+            elif self.stdout:
+                with open(tmp[0], "wb") as out:
+                    subprocess.run(self.command(tmp), stdout=out, check=True)
+            else:
+                subprocess.run(self.command(tmp), check=True)
+            for src, dst in zip(tmp, self.outputs):
+                os.replace(src, dst)
+        finally:
+            for path in tmp:
+                if os.path.exists(path):
+                    os.remove(path)
+
+
+def _dependencies(jobs):
+    """Map each job to the names of the jobs that produce its inputs."""
+    producers = dict()
+    for job in jobs:
+        for path in job.outputs:
+            if path in producers:
+                raise ValueError("{} is produced by {} and {}".format(
+                        path, producers[path].name, job.name))
+            producers[path] = job
+    return {job.name: {producers[p].name for p in job.inputs
+            if p in producers} for job in jobs}
+
+
+def run(jobs, cpus=None, memory=None, retries=0, log=sys.stderr):
+    """Run a pipeline of jobs.
+
+    At most `cpus` CPUs (by default, all of them) and `memory` GB (by
+    default, unlimited) are used by the jobs that run concurrently. Jobs
+    start in order, but a job that does not fit in the remaining budget
+    does not hold back the next ones; a job that requires more than the
+    budget runs alone. Failed jobs are retried up
+    to `retries` times; if a job still fails, the jobs that depend on it are
+    not run and `RuntimeError` is raised once the others have completed.
+    """
+    if cpus is None:
+        cpus = os.cpu_count()
+    deps = _dependencies(jobs)
+    dependents = collections.defaultdict(list)
+    for job in jobs:
+        for name in deps[job.name]:
+            dependents[name].append(job)
+    pending = {job.name: len(deps[job.name]) for job in jobs}
+    ready = collections.deque(job for job in jobs if pending[job.name] == 0)
+    attempts = collections.Counter()
+    # Whether a job was run, as opposed to being skipped.
+    changed = dict()
+    failed = list()
+    running = dict()
+    used_cpus, used_memory = 0, 0
+
+    def finish(job, ok):
+        for child in dependents[job.name]:
+            if not ok:
+                if child.name not in failed:
+                    print("skipping {} (depends on {})".format(
+                            child.name, job.name), file=log)
+                    failed.append(child.name)
+                    finish(child, False)
+                continue
+            pending[child.name] -= 1
+            if pending[child.name] == 0:
+                ready.append(child)
+
+    def fits(job):
+        if not running:
+            return True
+        return (used_cpus + job.cpus <= cpus and (memory is None
+                or used_memory + job.memory <= memory))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=cpus) as executor:
+        while ready or running:
+            # Start the ready jobs, in order, skipping those that do not fit
+            # in the budget for now.
+            while True:
+                job = next((job for job in ready if fits(job)), None)
+                if job is None:
+                    break
+                ready.remove(job)
+                inputs_changed = any(changed.get(name, False)
+                        for name in deps[job.name])
+                if not inputs_changed and job.up_to_date():
+                    print("up to date: {}".format(job.name), file=log)
+                    changed[job.name] = False
+                    finish(job, True)
+                    continue
+                attempts[job.name] += 1
+                print("starting: {} (attempt {})".format(
+                        job.name, attempts[job.name]), file=log)
+                future = executor.submit(job.execute)
+                running[future] = (job, time.time())
+                used_cpus += job.cpus
+                used_memory += job.memory
+            if not running:
+                continue
+            done, _ = concurrent.futures.wait(running,
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                job, start = running.pop(future)
+                used_cpus -= job.cpus
+                used_memory -= job.memory
+                try:
+                    future.result()
+                except Exception as error:
+                    print("failed: {} ({})".format(job.name, error), file=log)
+                    if attempts[job.name] <= retries:
+                        ready.appendleft(job)
+                    else:
+                        failed.append(job.name)
+                        finish(job, False)
+                    continue
+                print("done: {} ({:.0f}s)".format(
+                        job.name, time.time() - start), file=log)
+                changed[job.name] = True
+                finish(job, True)
+    stuck = [name for name, n in pending.items()
+            if n > 0 and name not in failed]
+    if stuck:
+        raise ValueError("circular dependencies: {}".format(", ".join(stuck)))
+    if failed:
+        raise RuntimeError("failed jobs: {}".format(", ".join(failed)))
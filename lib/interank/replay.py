@@ -0,0 +1,138 @@
+"""Online evaluation of the models, by replaying the data in time order.
+
+The edits are processed in windows of consecutive edits (in timestamp
+order). The edits of each window are first predicted with the current
+parameters, then the parameters are updated with a step of stochastic
+gradient descent on the window. Every prediction is therefore made before
+the model sees the outcome, as it would be at the time of the edit. The
+model is a NumPy version of `BasicModel` (optionally with the dot-product
+term of `DotModel`), and updates only touch the parameters of the users and
+articles of the window, so that a full dataset is replayed in minutes.
+Example:
+
+    dataset = WikiData("path/to/dataset")
+    data = dataset.get_combined_data()
+    model = OnlineModel(n_users=dataset.n_users, n_articles=dataset.n_articles)
+    probs, periods = replay(data, model, window=1000, period=30 * 86400)
+    for period in periods:
+        print(period["start"], period["avg_log_loss"], period["avg_precision"])
+"""
+import numpy as np
+
+from .metrics import average_precision, avg_log_loss
+
+
+class OnlineModel:
+
+    """Skill-difficulty model fitted by stochastic gradient descent.
+
+    The probability that user `u` makes a good edit on article `a` is the
+    sigmoid of `skill[u] - difficulty[a] + bias`, plus `vec_user[u] .
+    vec_article[a]` if `n_dims` is positive.
+    """
+
+    def __init__(self, *, n_users, n_articles, n_dims=0, global_bias=True,
+            learning_rate=0.1, l2=1e-4, seed=42):
+        self.skill = np.zeros(n_users)
+        self.difficulty = np.zeros(n_articles)
+        self.bias = 0.0
+        self._with_global_bias = global_bias
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        if n_dims > 0:
+            rng = np.random.default_rng(seed)
+            self.vec_user = rng.uniform(-1e-3, 1e-3, (n_users, n_dims))
+            self.vec_article = rng.uniform(-1e-3, 1e-3, (n_articles, n_dims))
+        else:
+            self.vec_user = None
+            self.vec_article = None
+
+    def logit(self, user_id, article_id):
+        logit = self.skill[user_id] - self.difficulty[article_id] + self.bias
+        if self.vec_user is not None:
+            logit += np.einsum("ij,ij->i", self.vec_user[user_id],
+                    self.vec_article[article_id])
+        return logit
+
+    def predict(self, user_id, article_id):
+        """Probabilities that the edits are good."""
+        return 1 / (1 + np.exp(-self.logit(user_id, article_id)))
+
+    def update(self, user_id, article_id, quality, probs=None):
+        """Take a gradient step on the cross-entropy of a batch of edits."""
+        if probs is None:
+            probs = self.predict(user_id, article_id)
+        # Derivative of the cross-entropy with respect to the logit.
+        err = probs - quality
+        lr, l2 = self.learning_rate, self.l2
+        grad_skill = err + l2 * self.skill[user_id]
+        grad_difficulty = -err + l2 * self.difficulty[article_id]
+        if self.vec_user is not None:
+            vec_u = self.vec_user[user_id]
+            vec_a = self.vec_article[article_id]
+            np.add.at(self.vec_user, user_id,
+                    -lr * (err[:, None] * vec_a + l2 * vec_u))
+            np.add.at(self.vec_article, article_id,
+                    -lr * (err[:, None] * vec_u + l2 * vec_a))
+        np.add.at(self.skill, user_id, -lr * grad_skill)
+        np.add.at(self.difficulty, article_id, -lr * grad_difficulty)
+        if self._with_global_bias:
+            self.bias -= lr * err.mean()
+
+
+def _period_metrics(quality, probs, bad_edit_threshold):
+    labels = (quality < bad_edit_threshold).astype(int)
+    res = {
+        "n_edits": len(quality),
+        "avg_log_loss": avg_log_loss(quality, probs),
+        "bad_fraction": labels.mean(),
+    }
+    # Average precision of the detection of bad edits.
+    if 0 < labels.sum() < len(labels):
+        res["avg_precision"] = average_precision(labels, 1 - probs)
+    else:
+        res["avg_precision"] = float("nan")
+    return res
+
+
+def replay(data, model, window=1000, period=None, bad_edit_threshold=0.5):
+    """Replay a dataset in timestamp order, predicting each edit online.
+
+    `data` is a tuple `(user IDs, article IDs, qualities, timestamps)`, as
+    returned by `WikiData.get_combined_data()` (or `LinuxData`). Each window
+    of `window` edits is predicted with the current parameters of `model`,
+    which are then updated on the window.
+
+    Returns the predicted probabilities (aligned with `data`) and a list of
+    metrics (number of edits, average log-loss, fraction and average
+    precision of bad edits) for each period of `period` seconds, or for the
+    whole dataset if `period` is `None`.
+    """
+    user_id, article_id, quality, ts = (np.asarray(x) for x in data[:4])
+    quality = quality.astype(np.float64)
+    order = np.argsort(ts, kind="mergesort")
+    probs = np.empty(len(order))
+    for start in range(0, len(order), window):
+        idx = order[start:start+window]
+        uid, aid, q = user_id[idx], article_id[idx], quality[idx]
+        pred = model.predict(uid, aid)
+        probs[idx] = pred
+        model.update(uid, aid, q, pred)
+    periods = list()
+    if len(order) == 0:
+        return probs, periods
+    sorted_ts = ts[order]
+    if period is None:
+        bounds = [0, len(order)]
+    else:
+        edges = np.arange(sorted_ts[0], sorted_ts[-1] + period, period)
+        bounds = list(np.searchsorted(sorted_ts, edges)) + [len(order)]
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        if lo == hi:
+            continue
+        idx = order[lo:hi]
+        res = _period_metrics(quality[idx], probs[idx], bad_edit_threshold)
+        res["start"] = int(sorted_ts[lo])
+        res["end"] = int(sorted_ts[hi - 1])
+        periods.append(res)
+    return probs, periods
@@ -0,0 +1,135 @@
+"""Scoring of edits with exported model parameters, without TensorFlow.
+
+The parameters of a fitted model are exported to a `.npz` file with
+`TensorFlowModel.export`. `Scorer` loads them and computes, in a vectorized
+way, the probabilities that edits are good. Users and articles that the
+model does not know are handled according to a fallback policy:
+
+- `"prior"`: their parameters are zero (i.e., the prior of the model),
+- `"mean"`: their parameters are the average parameters of the model,
+- `"nan"`: the probability of their edits is NaN.
+
+Example:
+
+    scorer = Scorer("params.npz", user_fallback="mean")
+    probs = scorer.score(user_ids, article_ids)  # -1 means unknown.
+"""
+import os
+
+import numpy as np
+
+
+FALLBACKS = ("prior", "mean", "nan")
+
+# Form of the logit (see `TensorFlowModel.LOGIT`).
+SKILL_DIFFICULTY = "skill-difficulty"
+WHITEHILL = "whitehill"
+
+
+def _gather(params, ids, default):
+    """Rows of `params`, with the `default` row for IDs `-1`."""
+    rows = params[np.maximum(ids, 0)]
+    unknown = ids < 0
+    if unknown.any():
+        rows[unknown] = default
+    return rows
+
+
+def _default(params, fallback):
+    if fallback == "mean":
+        return params.mean(axis=0)
+    # NaN probabilities are set by `Scorer.score`.
+    return np.zeros(params.shape[1:], dtype=params.dtype)
+
+
+class Scorer:
+
+    """Probabilities of edits, from parameters exported to a `.npz` file.
+
+    The file is reloaded by `maybe_reload` when it changes on disk.
+    """
+
+    def __init__(self, path, user_fallback="mean", article_fallback="mean"):
+        for fallback in (user_fallback, article_fallback):
+            if fallback not in FALLBACKS:
+                raise ValueError("unknown fallback: {}".format(fallback))
+        self.path = path
+        self.user_fallback = user_fallback
+        self.article_fallback = article_fallback
+        self._mtime = None
+        self.reload()
+
+    def reload(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        with np.load(self.path) as data:
+            params = {key: data[key] for key in data.files}
+        self.logit_form = str(params.pop("logit", SKILL_DIFFICULTY))
+        if self.logit_form not in (SKILL_DIFFICULTY, WHITEHILL):
+            raise ValueError("unknown logit: {}".format(self.logit_form))
+        self.skill = params["skill"]
+        self.difficulty = params["difficulty"]
+        self.global_bias = float(params.get("global_bias", 0.0))
+        self.vec_user = params.get("vec_user")
+        self.vec_article = params.get("vec_article")
+        # Rows of the user parameters, if users share them (see
+        # `interank.vocabulary`).
+        self.user_row = params.get("user_row")
+        self._defaults = dict()
+        for name in ("skill", "vec_user"):
+            if getattr(self, name) is not None:
+                self._defaults[name] = _default(
+                        getattr(self, name), self.user_fallback)
+        for name in ("difficulty", "vec_article"):
+            if getattr(self, name) is not None:
+                self._defaults[name] = _default(
+                        getattr(self, name), self.article_fallback)
+        self._mtime = mtime
+
+    def maybe_reload(self):
+        """Reload the parameters if the file changed; return whether it did."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self.reload()
+        return True
+
+    @property
+    def n_users(self):
+        if self.user_row is not None:
+            return len(self.user_row)
+        return len(self.skill)
+
+    @property
+    def n_articles(self):
+        return len(self.difficulty)
+
+    def score(self, user_id, article_id):
+        """Probabilities that the edits are good.
+
+        IDs equal to `-1` denote unknown users and articles.
+        """
+        uid = np.asarray(user_id)
+        aid = np.asarray(article_id)
+        if self.user_row is not None:
+            uid = np.where(uid < 0, -1, self.user_row[np.maximum(uid, 0)])
+        skill = _gather(self.skill, uid, self._defaults["skill"])
+        difficulty = _gather(
+                self.difficulty, aid, self._defaults["difficulty"])
+        if self.logit_form == WHITEHILL:
+            logit = skill * np.exp(difficulty)
+        else:
+            logit = skill - difficulty
+        if self.vec_user is not None:
+            logit = logit + np.einsum("ij,ij->i",
+                    _gather(self.vec_user, uid, self._defaults["vec_user"]),
+                    _gather(self.vec_article, aid,
+                            self._defaults["vec_article"]))
+        probs = 1 / (1 + np.exp(-(logit + self.global_bias)))
+        if self.user_fallback == "nan":
+            probs[uid < 0] = np.nan
+        if self.article_fallback == "nan":
+            probs[aid < 0] = np.nan
+        return probs
@@ -0,0 +1,336 @@
+"""Columnar shards of rows with a fixed schema, e.g., of edit qualities.
+
+`ShardWriter` buffers rows and writes them to shard files of at most
+`shard_rows` rows. In each shard, rows are sorted by article and split into
+groups of `group_rows` rows; each column of a group is compressed
+separately with zlib. A JSON footer records, for each group, the position
+and CRC-32 checksum of its columns and the range of article IDs and
+timestamps that it contains. Shards are written under a temporary name and
+renamed once complete, so that a crash never leaves a truncated shard, and
+a corrupted shard (detected by its checksums) only affects its own rows.
+Rows are not grouped by article across shards, though: the articles at both
+ends of the range of a shard usually have rows in the neighbouring shards
+as well, so recomputing the rows of a corrupted shard means recomputing
+all the rows of the articles of its range, and dropping those that the
+other shards contain.
+
+`ShardReader` memory-maps the shards and only decompresses the columns and
+groups that a query needs: groups whose ranges do not intersect the
+requested article IDs or timestamps are skipped. Example:
+
+    reader = ShardReader("path/to/shards")
+    data = reader.read(["user", "quality"], article_id=(100, 200),
+            timestamp=(1300000000, None))
+
+File layout: the compressed columns, the footer (UTF-8 JSON), the length of
+the footer (8 bytes, little-endian) and `MAGIC`.
+"""
+import glob
+import json
+import mmap
+import os
+import os.path
+import struct
+import zlib
+
+import numpy as np
+
+
+MAGIC = b"IRQSHRD1"
+SUFFIX = ".shard"
+
+# Columns of `QualityScorer` rows (see `interank.quality`). Strings are
+# stored joined by newlines.
+QUALITY_SCHEMA = (("edit_id", "<i8"), ("timestamp", "<i8"),
+        ("article_id", "<i8"), ("user", "str"), ("quality", "<f8"),
+        ("delta", "<i8"), ("len_before", "<i8"), ("len_after", "<i8"),
+        ("n_judges", "<i1"))
+
+# Same, with the flag of the approximate mode.
+APPROX_QUALITY_SCHEMA = QUALITY_SCHEMA + (("approx", "<i1"),)
+
+# Columns whose range is recorded for each group.
+INDEX_COLUMNS = ("article_id", "timestamp")
+
+TRAILER = struct.Struct("<Q8s")
+
+
+def _encode(values, dtype):
+    if dtype == "str":
+        return "\n".join(values).encode()
+    return np.asarray(values, dtype=dtype).tobytes()
+
+
+def _decode(data, dtype, n_rows):
+    if dtype == "str":
+        if n_rows == 0:
+            return np.array([], dtype=object)
+        return np.array(bytes(data).decode().split("\n"), dtype=object)
+    return np.frombuffer(data, dtype=dtype)
+
+
+class ShardWriter:
+
+    """Writes rows to columnar shards in a directory.
+
+    Has the `writerow` method of CSV writers, so that it can replace them
+    (e.g., as the output of `QualityScorer`). Shards are named
+    `<prefix>-<number>.shard`; `meta` is stored in the footer of each shard.
+    As `ShardReader` reads all the shards of a directory, the directory must
+    not contain shards already (e.g., of a previous run), unless `overwrite`
+    is true, in which case they are removed first.
+    """
+
+    def __init__(self, directory, schema=QUALITY_SCHEMA, meta=None,
+            shard_rows=1 << 20, group_rows=1 << 16, prefix="part",
+            overwrite=False):
+        os.makedirs(directory, exist_ok=True)
+        existing = (glob.glob(os.path.join(directory, "*" + SUFFIX))
+                + glob.glob(os.path.join(directory, "*" + SUFFIX + ".part")))
+        if existing and not overwrite:
+            raise ValueError("{} already contains shards".format(directory))
+        for path in existing:
+            os.remove(path)
+        self._directory = directory
+        self._schema = schema
+        self._meta = meta if meta is not None else dict()
+        self._shard_rows = shard_rows
+        self._group_rows = group_rows
+        self._prefix = prefix
+        self._rows = list()
+        self.n_shards = 0
+        self.n_rows = 0
+
+    def writerow(self, row):
+        if len(row) != len(self._schema):
+            raise ValueError("row has {} columns, the schema has {}".format(
+                    len(row), len(self._schema)))
+        self._rows.append(row)
+        if len(self._rows) >= self._shard_rows:
+            self._write_shard()
+
+    def flush(self):
+        # Shards are only written once full (or by `close`).
+        pass
+
+    def close(self):
+        if self._rows:
+            self._write_shard()
+
+    def _write_shard(self):
+        columns = dict()
+        for (name, dtype), values in zip(self._schema, zip(*self._rows)):
+            columns[name] = np.array(values,
+                    dtype=object if dtype == "str" else dtype)
+        order = np.lexsort([columns[name]
+                for name in reversed(INDEX_COLUMNS) if name in columns])
+        path = os.path.join(self._directory, "{}-{:05d}{}".format(
+                self._prefix, self.n_shards, SUFFIX))
+        footer = {"version": 1, "meta": self._meta,
+                "schema": [list(col) for col in self._schema],
+                "n_rows": len(self._rows), "groups": list()}
+        offset = 0
+        with open(path + ".part", "wb") as f:
+            for start in range(0, len(order), self._group_rows):
+                idx = order[start:start+self._group_rows]
+                group = {"n_rows": len(idx), "columns": dict()}
+                for name, dtype in self._schema:
+                    values = columns[name][idx]
+                    if name in INDEX_COLUMNS:
+                        group[name] = [int(values.min()), int(values.max())]
+                    block = zlib.compress(_encode(values, dtype))
+                    f.write(block)
+                    group["columns"][name] = [
+                            offset, len(block), zlib.crc32(block)]
+                    offset += len(block)
+                footer["groups"].append(group)
+            data = json.dumps(footer).encode()
+            f.write(data)
+            f.write(TRAILER.pack(len(data), MAGIC))
+        os.replace(path + ".part", path)
+        self.n_shards += 1
+        self.n_rows += len(self._rows)
+        self._rows = list()
+
+
+class CorruptShardError(ValueError):
+
+    """A shard is truncated or does not match its checksums."""
+
+
+class Shard:
+
+    """A memory-mapped shard file."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < TRAILER.size:
+                raise CorruptShardError("truncated shard: {}".format(path))
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        length, magic = TRAILER.unpack(self._map[-TRAILER.size:])
+        if magic != MAGIC or length > size - TRAILER.size:
+            raise CorruptShardError("invalid shard: {}".format(path))
+        start = size - TRAILER.size - length
+        try:
+            self.footer = json.loads(self._map[start:start+length].decode())
+        except ValueError:
+            raise CorruptShardError("invalid footer: {}".format(path))
+        self.schema = dict(self.footer["schema"])
+
+    @property
+    def groups(self):
+        return self.footer["groups"]
+
+    def column(self, group, name):
+        """Decompressed column of a group, after checking its checksum."""
+        offset, length, crc = group["columns"][name]
+        block = self._map[offset:offset+length]
+        if zlib.crc32(block) != crc:
+            raise CorruptShardError("checksum mismatch in {} ({})".format(
+                    self.path, name))
+        return _decode(zlib.decompress(block), self.schema[name],
+                group["n_rows"])
+
+    def close(self):
+        self._map.close()
+
+
+def _overlaps(bounds, query):
+    low, high = query
+    return ((low is None or bounds[1] >= low)
+            and (high is None or bounds[0] <= high))
+
+
+def _within(values, query):
+    low, high = query
+    mask = np.ones(len(values), dtype=bool)
+    if low is not None:
+        mask &= values >= low
+    if high is not None:
+        mask &= values <= high
+    return mask
+
+
+class ShardReader:
+
+    """Reads the shards of a directory (or a list of shard files).
+
+    Filters are given as keyword arguments, e.g., `article_id=(low, high)`
+    selects the rows whose article ID is between `low` and `high`
+    (inclusive); either bound can be `None`. Filters on `INDEX_COLUMNS` skip
+    the groups outside of the range without decompressing them.
+    """
+
+    def __init__(self, path):
+        if not isinstance(path, str):
+            self.paths = list(path)
+        elif os.path.isdir(path):
+            self.paths = sorted(glob.glob(os.path.join(path, "*" + SUFFIX)))
+        else:
+            self.paths = [path]
+        self._shards = None
+
+    @property
+    def shards(self):
+        """The shards, opened on first use (raises if one is corrupted)."""
+        if self._shards is None:
+            shards = list()
+            try:
+                for p in self.paths:
+                    shards.append(Shard(p))
+            except CorruptShardError:
+                for shard in shards:
+                    shard.close()
+                raise
+            self._shards = shards
+        return self._shards
+
+    @property
+    def schema(self):
+        if not self.shards:
+            return list()
+        return [name for name, _ in self.shards[0].footer["schema"]]
+
+    @property
+    def meta(self):
+        return self.shards[0].footer["meta"] if self.shards else dict()
+
+    @property
+    def n_rows(self):
+        return sum(shard.footer["n_rows"] for shard in self.shards)
+
+    def close(self):
+        if self._shards is not None:
+            for shard in self._shards:
+                shard.close()
+            self._shards = None
+
+    def verify(self):
+        """Paths of the shards that are truncated or do not match their
+        checksums.
+
+        Each shard is opened separately, so that the corrupted ones do not
+        prevent checking the others.
+        """
+        corrupt = list()
+        for path in self.paths:
+            shard = None
+            try:
+                shard = Shard(path)
+                for group in shard.groups:
+                    for name in group["columns"]:
+                        shard.column(group, name)
+            except (CorruptShardError, zlib.error, KeyError, TypeError,
+                    ValueError):
+                corrupt.append(path)
+            finally:
+                if shard is not None:
+                    shard.close()
+        return corrupt
+
+    def iter_groups(self, columns=None, **filters):
+        """Yield dictionaries of the (filtered) columns of each group."""
+        if columns is None:
+            columns = self.schema
+        for shard in self.shards:
+            for group in shard.groups:
+                if not all(_overlaps(group[name], query)
+                        for name, query in filters.items()
+                        if name in INDEX_COLUMNS):
+                    continue
+                mask = None
+                for name, query in filters.items():
+                    keep = _within(shard.column(group, name), query)
+                    mask = keep if mask is None else mask & keep
+                data = {name: shard.column(group, name) for name in columns}
+                if mask is not None:
+                    if not mask.any():
+                        continue
+                    data = {name: values[mask]
+                            for name, values in data.items()}
+                yield data
+
+    def read(self, columns=None, **filters):
+        """Columns of the rows that match the filters, as arrays."""
+        if columns is None:
+            columns = self.schema
+        parts = {name: list() for name in columns}
+        for data in self.iter_groups(columns, **filters):
+            for name in columns:
+                parts[name].append(data[name])
+        res = dict()
+        for name in columns:
+            if parts[name]:
+                res[name] = np.concatenate(parts[name])
+            else:
+                dtype = self.shards[0].schema[name] if self.shards else "<f8"
+                res[name] = np.array([],
+                        dtype=object if dtype == "str" else dtype)
+        return res
+
+    def rows(self, **filters):
+        """Yield the rows that match the filters, as tuples."""
+        for data in self.iter_groups(**filters):
+            yield from zip(*(values.tolist() for values in data.values()))
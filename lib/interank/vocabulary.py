@@ -0,0 +1,80 @@
+"""Vocabularies of users, to share parameters between infrequent users.
+
+On large wikis, most users (in particular, anonymous ones) make only one or
+two edits, but each of them has its own parameters. A vocabulary maps the
+users to rows of the user parameters: users with at least `min_edits` edits
+get a dedicated row, and the others share a few rows, either
+
+- by hashing their IDs into `n_buckets` buckets (`policy="hash"`), or
+- by class, with one row for anonymous and one for registered users
+  (`policy="class"`), which acts as a prior for each class.
+
+Example:
+
+    counts = np.bincount(train_data[0], minlength=dataset.n_users)
+    vocabulary = frequency_vocabulary(counts, min_edits=5, policy="class",
+            anonymous=dataset.get_anonymous_users())
+    model = DotModel(n_users=dataset.n_users, n_articles=dataset.n_articles,
+            n_dims=20, vocabulary=vocabulary)
+    session.run(tf.global_variables_initializer())
+    model.load_vocabulary(session)
+"""
+import numpy as np
+
+
+POLICIES = ("hash", "class")
+
+
+class Vocabulary:
+
+    """Mapping from user IDs to rows of the user parameters.
+
+    The first `n_dedicated` rows belong to a single user each, and the
+    other rows are shared.
+    """
+
+    def __init__(self, rows, n_dedicated, n_rows):
+        self.rows = np.asarray(rows, dtype=np.int32)
+        self.n_dedicated = n_dedicated
+        self.n_rows = n_rows
+
+    @property
+    def n_users(self):
+        return len(self.rows)
+
+    @property
+    def n_shared(self):
+        return self.n_rows - self.n_dedicated
+
+
+def _hash(ids, n_buckets):
+    # Multiplicative hashing (keeping the high bits of the product), so that
+    # buckets do not follow the order of IDs.
+    h = ids.astype(np.uint64) * np.uint64(2654435761) % np.uint64(2**32)
+    return (h * np.uint64(n_buckets) >> np.uint64(32)).astype(np.int64)
+
+
+def frequency_vocabulary(counts, min_edits, policy="hash", n_buckets=1024,
+        anonymous=None):
+    """Dedicated rows for users with at least `min_edits` edits.
+
+    `counts` contains the number of (training) edits of each user. With
+    `policy="class"`, `anonymous` tells which users are anonymous.
+    """
+    if policy not in POLICIES:
+        raise ValueError("unknown policy: {}".format(policy))
+    counts = np.asarray(counts)
+    frequent = counts >= min_edits
+    n_dedicated = np.count_nonzero(frequent)
+    rows = np.empty(len(counts), dtype=np.int64)
+    rows[frequent] = np.arange(n_dedicated)
+    rare = np.flatnonzero(~frequent)
+    if policy == "hash":
+        rows[rare] = n_dedicated + _hash(rare, n_buckets)
+        n_shared = n_buckets
+    else:
+        if anonymous is None:
+            raise ValueError("the class policy needs `anonymous`")
+        rows[rare] = n_dedicated + np.asarray(anonymous, dtype=bool)[rare]
+        n_shared = 2
+    return Vocabulary(rows, n_dedicated, n_dedicated + n_shared)
@@ -0,0 +1,221 @@
+"""Client of the Wikipedia API, with batching and a local cache.
+
+The API accepts at most 50 IDs per request. `WikiAPI` splits lookups into
+batches of that size, sends them concurrently, and stores each page, user or
+revision that it receives in a SQLite cache, so that looking up the same IDs
+again (e.g., across sanity-check sessions) does not hit the network until
+the cached entries expire. Only the objects that a response actually
+contains are cached: IDs that are absent from a (partial) response are left
+out of the result, and API errors (e.g., `maxlag`) are retried and then
+raised, so that they never mark IDs as missing. Example:
+
+    api = WikiAPI("tr", cache="wikiapi.sqlite3")
+    for page_id, page in api.get_articles([146, 1001, 2034]).items():
+        print(page_id, page.get("title"))
+"""
+import concurrent.futures
+import json
+import os.path
+import sqlite3
+import time
+import urllib.parse
+import urllib.request
+
+
+URL_TEMPLATE = "https://{lang}.wikipedia.org/w/api.php"
+DEFAULT_CACHE = os.path.join(
+        os.path.expanduser("~"), ".cache", "interank", "wikiapi.sqlite3")
+
+# Maximal number of IDs per request.
+BATCH_SIZE = 50
+
+USER_PROPS = "groups|editcount|gender|registration"
+
+# Codes of the API errors after which a request is retried.
+RETRY_CODES = {"maxlag", "ratelimited", "readonly"}
+
+
+class APIError(Exception):
+
+    """The API returned an error instead of a result."""
+
+    def __init__(self, code, info):
+        super().__init__("{}: {}".format(code, info))
+        self.code = code
+
+
+class WikiAPI:
+
+    """Batched and cached lookups of edits, articles and users.
+
+    All lookups return a dictionary that maps the requested IDs (or names)
+    to the corresponding objects of the API response. Objects that the API
+    reports as missing are included (they have a `missing` or `invalid`
+    key); IDs that the response does not mention are not. If `cache` is
+    `None`, nothing is cached; cached entries are used for `ttl` seconds.
+    Requests that fail with one of `RETRY_CODES` are retried `retries`
+    times, after `backoff` seconds (doubled each time).
+    """
+
+    def __init__(self, lang="simple", cache=DEFAULT_CACHE, ttl=7 * 24 * 3600,
+            max_workers=4, url=None, retries=3, backoff=5):
+        self.lang = lang
+        self._url = url if url is not None else URL_TEMPLATE.format(lang=lang)
+        self._ttl = ttl
+        self._max_workers = max_workers
+        self._retries = retries
+        self._backoff = backoff
+        self._db = None
+        if cache is not None:
+            directory = os.path.dirname(cache)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(cache)
+            self._db.execute("CREATE TABLE IF NOT EXISTS cache ("
+                    "key TEXT PRIMARY KEY, fetched REAL, value TEXT)")
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def get_edits(self, edit_ids):
+        """Revisions, with the ID and title of their page."""
+        return self._lookup("rev", edit_ids, {"prop": "revisions"},
+                "revids", _parse_revisions)
+
+    def get_articles(self, article_ids):
+        """Information about pages, including their URL."""
+        return self._lookup("page", article_ids,
+                {"prop": "info", "inprop": "url"}, "pageids", _parse_pages)
+
+    def get_users(self, user_ids):
+        """Groups, edit count, gender and registration date of users."""
+        return self._lookup("user", user_ids,
+                {"list": "users", "usprop": USER_PROPS}, "ususerids",
+                lambda data: _parse_users(data, "userid"))
+
+    def get_users_by_name(self, names):
+        """Same as `get_users`, from user names.
+
+        The result is keyed by the names as given, even if the API
+        normalizes them."""
+        return self._lookup("name", names,
+                {"list": "users", "usprop": USER_PROPS}, "ususers",
+                lambda data: _parse_users(data, "name"))
+
+    def annotate_articles(self, article_ids):
+        """Current title and URL of articles, `None` if they are missing."""
+        pages = self.get_articles(article_ids)
+        return {aid: None if "missing" in page or "invalid" in page
+                else (page.get("title"), page.get("fullurl"))
+                for aid, page in pages.items()}
+
+    def annotate_users(self, user_keys):
+        """Groups and edit count of users given by their key (`r<id>`).
+
+        Anonymous and deleted users are mapped to `None`.
+        """
+        ids = {key: int(key[1:]) for key in user_keys
+                if key.startswith("r") and key[1:].isdigit() and key != "r0"}
+        users = self.get_users(list(ids.values()))
+        res = dict()
+        for key in user_keys:
+            user = users.get(ids[key]) if key in ids else None
+            if user is None or "missing" in user:
+                res[key] = None
+            else:
+                res[key] = (user.get("groups", []), user.get("editcount"))
+        return res
+
+    def _lookup(self, kind, ids, params, param, parse):
+        ids = list(dict.fromkeys(ids))
+        res = self._get_cached(kind, ids)
+        missing = [x for x in ids if x not in res]
+        batches = [missing[i:i+BATCH_SIZE]
+                for i in range(0, len(missing), BATCH_SIZE)]
+        with concurrent.futures.ThreadPoolExecutor(self._max_workers) as ex:
+            futures = [ex.submit(self._query, params, param, batch)
+                    for batch in batches]
+            for batch, future in zip(batches, futures):
+                found = parse(future.result())
+                # Match the keys of the response with the requested IDs.
+                fetched = {x: found[str(x)] for x in batch if str(x) in found}
+                self._put_cached(kind, fetched)
+                res.update(fetched)
+        return {x: res[x] for x in ids if x in res}
+
+    def _query(self, params, param, batch):
+        params = dict(params, action="query", format="json")
+        params[param] = "|".join(str(x) for x in batch)
+        data = urllib.parse.urlencode(params).encode()
+        for attempt in range(self._retries + 1):
+            # POST avoids long URLs when many names are looked up.
+            with urllib.request.urlopen(self._url, data) as f:
+                res = json.loads(f.read().decode())
+            if "error" not in res:
+                return res
+            error = APIError(res["error"].get("code"),
+                    res["error"].get("info"))
+            if error.code not in RETRY_CODES or attempt == self._retries:
+                raise error
+            time.sleep(self._backoff * 2 ** attempt)
+
+    def _key(self, kind, x):
+        return "{}|{}|{}".format(self.lang, kind, x)
+
+    def _get_cached(self, kind, ids):
+        res = dict()
+        if self._db is None:
+            return res
+        oldest = time.time() - self._ttl
+        for x in ids:
+            row = self._db.execute(
+                    "SELECT value FROM cache WHERE key = ? AND fetched >= ?",
+                    (self._key(kind, x), oldest)).fetchone()
+            if row is not None:
+                res[x] = json.loads(row[0])
+        return res
+
+    def _put_cached(self, kind, items):
+        if self._db is None:
+            return
+        now = time.time()
+        with self._db:
+            self._db.executemany(
+                    "INSERT OR REPLACE INTO cache VALUES (?, ?, ?)",
+                    [(self._key(kind, x), now, json.dumps(item))
+                    for x, item in items.items()])
+
+
+def _parse_revisions(data):
+    query = data.get("query", dict())
+    found = dict()
+    for page in query.get("pages", dict()).values():
+        for rev in page.get("revisions", list()):
+            found[str(rev["revid"])] = dict(rev,
+                    pageid=page.get("pageid"), title=page.get("title"))
+    for rev in query.get("badrevids", dict()).values():
+        found[str(rev["revid"])] = dict(rev, missing="")
+    return found
+
+
+def _parse_pages(data):
+    pages = data.get("query", dict()).get("pages", dict())
+    return {str(key): page for key, page in pages.items()}
+
+
+def _parse_users(data, field):
+    query = data.get("query", dict())
+    found = dict()
+    for user in query.get("users", list()):
+        key = user.get(field)
+        if key is not None:
+            found[str(key)] = user
+    if field == "name":
+        # The API normalizes names (e.g., `foo_bar` into `Foo bar`) and only
+        # returns the normalized ones.
+        for item in query.get("normalized", list()):
+            if item.get("to") in found:
+                found[item["from"]] = found[item["to"]]
+    return found
@@ -9,7 +9,18 @@ np.random.seed(0)
 
 
 class WikiData:
-    """Helper class for loading pre-generated Wiki observations."""
+    """Helper class for loading pre-generated Wiki observations.
+
+    Datasets built with `process_raw.py build` are stored as one `.npy` file
+    per column (e.g., `train.uid.npy`), which are memory-mapped. Otherwise,
+    the text files produced by `process_raw.py qualities` are parsed. Note
+    that the types of the columns differ: memory-mapped user and article IDs
+    are `int32` and qualities `float32` (the types that the models use),
+    whereas the arrays parsed from text files are `int64` and `float64`.
+    Timestamps are `int64` in both cases.
+    """
+
+    COLUMNS = ("uid", "aid", "q", "ts")
 
     def __init__(self, base_directory):
         self.base_directory = base_directory
@@ -17,6 +28,11 @@ class WikiData:
             self._meta = json.load(f)
 
     def _get_data(self, filename):
+        name = os.path.splitext(filename)[0]
+        paths = [os.path.join(self.base_directory,
+                "{}.{}.npy".format(name, col)) for col in self.COLUMNS]
+        if all(os.path.exists(p) for p in paths):
+            return tuple(np.load(p, mmap_mode="r") for p in paths)
         path = os.path.join(self.base_directory, filename)
         uids = list()
         aids = list()
@@ -37,6 +53,7 @@ class WikiData:
                 [], [], [], [], [], [], [], [], [])
         with open(path) as f:
             for line in f:
+                # A 10th column (approximate mode) is ignored.
                 elems = line.strip().split("#")
                 eids.append(int(elems[0]))  # Edit ID.
                 ts.append(int(elems[1]))  # Timestamp.
@@ -66,6 +83,17 @@ class WikiData:
     def get_raw_combined_data(self):
         return self._get_raw_data("raw-combined.txt")
 
+    def get_ores_scores(self):
+        """ORES predictions, aligned with `get_raw_test_data()`.
+
+        Returns the probabilities that the edits are damaging, in good faith
+        and reverted (NaN if missing), and a mask of the edits that have all
+        three. See `convert_ores.py`.
+        """
+        return tuple(np.load(os.path.join(self.base_directory,
+                "ores.{}.npy".format(name)), mmap_mode="r")
+                for name in ("damaging", "goodfaith", "reverted", "mask"))
+
     def get_users(self):
         users = dict()
         with open(os.path.join(self.base_directory, "users.txt")) as f:
@@ -76,6 +104,15 @@ class WikiData:
                         int(n_edits), int(n_articles))
         return users
 
+    def get_anonymous_users(self):
+        """Boolean array telling which users are anonymous."""
+        anonymous = np.zeros(self.n_users, dtype=bool)
+        with open(os.path.join(self.base_directory, "users.txt")) as f:
+            for line in f:
+                uid, wiki_id, _ = line.split("#", 2)
+                anonymous[int(uid)] = wiki_id.startswith("u")
+        return anonymous
+
     def get_articles(self):
         articles = dict()
         with open(os.path.join(self.base_directory, "articles.txt")) as f:
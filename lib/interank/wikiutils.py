@@ -3,25 +3,52 @@ import numpy as np
 from urllib.parse import quote
 
 
-def print_articles_summary(difficulties, articles, n=10):
+def print_articles_summary(difficulties, articles, n=10, api=None):
+    """Print the most and least difficult articles.
+
+    If `api` (an `interank.wikiapi.WikiAPI`) is given, the current titles and
+    URLs of all the printed articles are looked up in a single bulk call.
+    """
+    idx = np.argsort(difficulties)
+    top, bottom = idx[::-1][:n], idx[:n]
+    current = dict()
+    if api is not None:
+        wiki_ids = [int(articles[aid][0]) for aid in np.concatenate((top, bottom))]
+        current = api.annotate_articles(wiki_ids)
+
     def print_summary(aid):
         diff = difficulties[aid]
         art = articles[aid]
         url = "https://tr.wikipedia.org/wiki/{}".format(quote(art[1]))
+        info = current.get(int(art[0]))
+        title = art[1]
+        if info is not None:
+            title, url = info
         print("{: >2} {:+.3f} {} ({} edits, {} users)".format(
-                i, diff, art[1], art[2], art[3]))
+                i, diff, title, art[2], art[3]))
         print("    {}".format(url))
-    idx = np.argsort(difficulties)
     print("### {} most difficult articles:".format(n))
-    for i, aid in enumerate(idx[::-1][:n], start=1):
+    for i, aid in enumerate(top, start=1):
         print_summary(aid)
     print()
     print("### {} least difficult articles:".format(n))
-    for i, aid in enumerate(idx[:n], start=1):
+    for i, aid in enumerate(bottom, start=1):
         print_summary(aid)
 
 
-def print_users_summary(skills, users, n=10):
+def print_users_summary(skills, users, n=10, api=None):
+    """Print the most and least skilled users.
+
+    If `api` (an `interank.wikiapi.WikiAPI`) is given, the groups and edit
+    counts of all the printed users are looked up in a single bulk call.
+    """
+    idx = np.argsort(skills)
+    top, bottom = idx[::-1][:n], idx[:n]
+    current = dict()
+    if api is not None:
+        keys = [users[uid][0] for uid in np.concatenate((top, bottom))]
+        current = api.annotate_users(keys)
+
     def print_summary(uid):
         skill = skills[uid]
         user = users[uid]
@@ -29,11 +56,15 @@ def print_users_summary(skills, users, n=10):
         print("{: >2} {:+.3f} {} ({} edits, {} articles)".format(
                 i, skill, user[1], user[4], user[5]))
         print("    {}".format(url))
-    idx = np.argsort(skills)
+        info = current.get(user[0])
+        if info is not None:
+            groups, editcount = info
+            print("    groups: {}, total edits: {}".format(
+                    ", ".join(groups) or "-", editcount))
     print("### {} most skilled users:".format(n))
-    for i, uid in enumerate(idx[::-1][:n], start=1):
+    for i, uid in enumerate(top, start=1):
         print_summary(uid)
     print()
     print("### {} least skilled users:".format(n))
-    for i, uid in enumerate(idx[:n], start=1):
+    for i, uid in enumerate(bottom, start=1):
         print_summary(uid)
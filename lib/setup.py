@@ -4,6 +4,7 @@ from setuptools import setup
 setup(
     name="interank",
     version="0.1",
+    python_requires=">=3.7",
     packages=[
         "interank",
         "interank.models",
@@ -4,21 +4,40 @@
 This script can be used to collect ORES predictions for a given set of
 revisions, parsed from a raw data file. Example:
 
-    ./collect_ores.py trwiki path/to/raw-test.txt > output.txt
+    ./collect_ores.py trwiki path/to/raw-test.txt --output output.txt
 
-The flag --ignore-from `path/to/output.txt` can be used to resume the
-collection after an interruption without re-querying revisions that have
-already been collected.
+Requests for chunks of revisions are sent concurrently over a pool of
+keep-alive connections, at most `--concurrency` at a time and at most
+`--rate` per second. Failed requests are retried with exponential backoff.
+Each chunk of scores is appended to the output as a line of JSON, and the
+IDs of the revisions that were collected are appended to a cache file
+(`output.txt.revids` by default), so that running the same command again
+resumes the collection where it stopped. When resuming, the revisions that
+the output already contains are skipped as well, in case the output was
+written but not the cache file, and a line that was cut short (e.g., by a
+crash) is removed from the output. The flag --ignore-from
+`path/to/output.txt` can also be used to skip the revisions found in a
+previous output.
+
+The service can be changed with `--base-url`, e.g., to run against a local
+stand-in server.
 """
 import argparse
-import collections
+import asyncio
+import http.client
 import json
-import urllib.request
+import random
+import sys
+import time
+import urllib.parse
 
 
 MODELS = ["damaging", "goodfaith", "reverted"]
-URL_TEMPLATE = ("https://ores.wikimedia.org/v3/scores/{lang}"
-        "?revids={revids}&models={models}")
+BASE_URL = "https://ores.wikimedia.org"
+PATH_TEMPLATE = "{prefix}/v3/scores/{lang}?revids={revids}&models={models}"
+
+# HTTP statuses after which a request is retried.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
 
 
 def get_revids(path):
@@ -30,27 +49,184 @@ def get_revids(path):
     return set(revids)
 
 
-def main(lang, testfile, chunk_size, model, ignore_from):
-    if model is None:
+def get_collected_revids(path):
+    """IDs of the revisions in an output, after removing a partial last
+    line."""
+    revids = set()
+    try:
+        f = open(path, "r+b")
+    except FileNotFoundError:
+        return revids
+    with f:
+        end = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            revids.update(json.loads(line.decode()).keys())
+            end += len(line)
+        f.truncate(end)
+    return revids
+
+
+def get_cached_revids(path):
+    try:
+        with open(path) as f:
+            return set(line.strip() for line in f)
+    except FileNotFoundError:
+        return set()
+
+
+class RequestError(Exception):
+
+    """A request failed and can be retried."""
+
+
+class ConnectionPool:
+
+    """Keep-alive HTTP connections to a single host.
+
+    Connections are blocking `http.client` connections, used from the
+    default executor of the event loop.
+    """
+
+    def __init__(self, base_url, size, timeout):
+        url = urllib.parse.urlsplit(base_url)
+        if url.scheme == "https":
+            self._factory = lambda: http.client.HTTPSConnection(
+                    url.hostname, url.port, timeout=timeout)
+        else:
+            self._factory = lambda: http.client.HTTPConnection(
+                    url.hostname, url.port, timeout=timeout)
+        self.prefix = url.path.rstrip("/")
+        self._idle = asyncio.Queue()
+        for _ in range(size):
+            self._idle.put_nowait(None)
+
+    async def get(self, path):
+        """Send a GET request and return the decoded JSON response."""
+        conn = await self._idle.get()
+        if conn is None:
+            conn = self._factory()
+        loop = asyncio.get_running_loop()
+        try:
+            status, body = await loop.run_in_executor(
+                    None, self._request, conn, path)
+        except (OSError, http.client.HTTPException) as error:
+            conn.close()
+            self._idle.put_nowait(None)
+            raise RequestError(str(error))
+        self._idle.put_nowait(conn)
+        if status in RETRY_STATUSES:
+            raise RequestError("HTTP status {}".format(status))
+        if status != 200:
+            raise RuntimeError("HTTP status {} for {}".format(status, path))
+        return json.loads(body.decode())
+
+    @staticmethod
+    def _request(conn, path):
+        conn.request("GET", path)
+        res = conn.getresponse()
+        return res.status, res.read()
+
+    def close(self):
+        while not self._idle.empty():
+            conn = self._idle.get_nowait()
+            if conn is not None:
+                conn.close()
+
+
+class RateLimiter:
+
+    """Spaces out the start of requests to at most `rate` per second."""
+
+    def __init__(self, rate):
+        self._interval = 1 / rate if rate else 0
+        self._next = 0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self._lock:
+            now = time.monotonic()
+            if self._next > now:
+                await asyncio.sleep(self._next - now)
+            self._next = max(now, self._next) + self._interval
+
+
+async def fetch_chunk(pool, limiter, lang, chunk, model, retries, backoff):
+    path = PATH_TEMPLATE.format(prefix=pool.prefix, lang=lang,
+            revids="|".join(chunk), models=urllib.parse.quote(model))
+    for attempt in range(retries + 1):
+        await limiter.wait()
+        try:
+            res = await pool.get(path)
+            return res[lang]["scores"]
+        except RequestError as error:
+            if attempt == retries:
+                raise RuntimeError("giving up on {}: {}".format(
+                        chunk[0], error))
+            delay = backoff * 2 ** attempt * (1 + random.random())
+            print("retrying in {:.1f}s ({})".format(delay, error),
+                    file=sys.stderr)
+            await asyncio.sleep(delay)
+
+
+async def collect(args, revids, out, cache):
+    if args.model is None:
         model = "|".join(MODELS)
+    else:
+        model = args.model
+    pool = ConnectionPool(args.base_url, args.concurrency, args.timeout)
+    limiter = RateLimiter(args.rate)
+    chunks = [revids[i:i+args.chunk_size]
+            for i in range(0, len(revids), args.chunk_size)]
+    pending = iter(chunks)
+
+    async def worker():
+        for chunk in pending:
+            scores = await fetch_chunk(pool, limiter, args.lang, chunk,
+                    model, args.retries, args.backoff)
+            out.write(json.dumps(scores) + "\n")
+            out.flush()
+            if cache is not None:
+                cache.write("".join(r + "\n" for r in chunk))
+                cache.flush()
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    finally:
+        pool.close()
+
+
+def main(args):
     revids = set()
-    with open(testfile) as f:
+    with open(args.testfile) as f:
         for line in f:
             revid, _ = line.strip().split("#", 1)
             revids.add(revid)
-    if ignore_from is not None:
-        ignored = get_revids(ignore_from)
-        revids = list(filter(lambda x: x not in ignored, revids))
-    else:
-        revids = list(revids)
-    for i in range(0, len(revids), chunk_size):
-        chunk = revids[i:i+chunk_size]
-        rids = "|".join(r for r in chunk)
-        url = URL_TEMPLATE.format(lang=lang, revids=rids, models=model)
-        with urllib.request.urlopen(url) as f:
-            res = json.loads(f.read().decode())
-        scores = res[lang]["scores"]
-        print(json.dumps(scores))
+    cache_path = args.cache
+    if cache_path is None and args.output is not None:
+        cache_path = args.output + ".revids"
+    ignored = set()
+    if args.ignore_from is not None:
+        ignored |= get_revids(args.ignore_from)
+    if cache_path is not None:
+        ignored |= get_cached_revids(cache_path)
+    if args.output is not None:
+        ignored |= get_collected_revids(args.output)
+    revids = sorted(r for r in revids if r not in ignored)
+    out = sys.stdout
+    cache = None
+    try:
+        if args.output is not None:
+            out = open(args.output, "a")
+        if cache_path is not None:
+            cache = open(cache_path, "a")
+        asyncio.run(collect(args, revids, out, cache))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if cache is not None:
+            cache.close()
 
 
 def _parse_args():
@@ -60,11 +236,21 @@ def _parse_args():
     parser.add_argument("--chunk-size", type=int, default=50)
     parser.add_argument("--model", choices=MODELS)
     parser.add_argument("--ignore-from")
+    parser.add_argument("--output", "-o",
+            help="Output file, to which scores are appended.")
+    parser.add_argument("--cache",
+            help="File of collected revision IDs (default: OUTPUT.revids).")
+    parser.add_argument("--base-url", default=BASE_URL)
+    parser.add_argument("--concurrency", type=int, default=4,
+            help="Maximal number of requests in flight.")
+    parser.add_argument("--rate", type=float, default=10,
+            help="Maximal number of requests per second (0: no limit).")
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--backoff", type=float, default=1,
+            help="Initial delay before a retry, in seconds.")
+    parser.add_argument("--timeout", type=float, default=60)
     return parser.parse_args()
 
 
 if __name__ == "__main__":
-    args = _parse_args()
-    main(
-            args.lang, args.testfile, args.chunk_size, args.model,
-            args.ignore_from)
+    main(_parse_args())
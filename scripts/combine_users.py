@@ -2,14 +2,22 @@
 """Combine user information from multiple Condor outputs.
 
 This script is useful in order to build a single, unified `users.txt` file from
-the output of multiple Condor jobs."""
-import argparse
+the output of multiple Condor jobs.
 
+By default, all users are held in memory and written in the order in which they
+first appear. With `--merge`, each file is instead sorted by user key into runs
+of at most `--run-size` lines that are spilled to disk, and the runs are merged
+in a single streaming pass; users are then written in the order of their keys,
+and the memory usage does not depend on the number of users. The files can be
+sorted in parallel with `--processes`."""
+import argparse
+import itertools
+import multiprocessing as mp
+import os
+import sys
+import tempfile
 
-def parse_line(line):
-    idx, name, first_edit, last_edit, n_edits, n_arts = line.strip().split("#")
-    return (idx, name,
-            int(first_edit), int(last_edit), int(n_edits), int(n_arts))
+from interank.consumers import merge_user_lines
 
 
 def main(files):
@@ -32,12 +40,63 @@ def main(files):
         print("{}#{}".format(idx, "#".join(str(x) for x in elems)))
 
 
+def user_key(line):
+    return line[:line.index("#")]
+
+
+def sort_runs(path, tmp_dir, run_size):
+    """Sort a file by user key into runs of at most `run_size` lines.
+
+    Returns the paths of the runs, which are written to `tmp_dir`.
+    """
+    runs = list()
+    with open(path) as f:
+        while True:
+            lines = list(itertools.islice(f, run_size))
+            if not lines:
+                break
+            lines.sort(key=user_key)
+            fd, run = tempfile.mkstemp(dir=tmp_dir, suffix=".run")
+            with os.fdopen(fd, "w") as out:
+                out.writelines(lines)
+            runs.append(run)
+    return runs
+
+
+def merge_main(files, run_size, processes, tmp_dir):
+    with tempfile.TemporaryDirectory(dir=tmp_dir) as tmp:
+        tasks = [(path, tmp, run_size) for path in files]
+        if processes > 1:
+            with mp.Pool(processes) as pool:
+                runs = pool.starmap(sort_runs, tasks)
+        else:
+            runs = [sort_runs(*task) for task in tasks]
+        # The runs of later files come last, so that the last name wins as
+        # in the in-memory mode.
+        handles = [open(run) for run in itertools.chain(*runs)]
+        try:
+            sys.stdout.writelines(merge_user_lines(handles))
+        finally:
+            for handle in handles:
+                handle.close()
+
+
 def _parse_args():
     parser = argparse.ArgumentParser()
     parser.add_argument("files", nargs="+")
+    parser.add_argument("--merge", action="store_true",
+            help="Sort and merge the files, in constant memory.")
+    parser.add_argument("--run-size", type=int, default=1000000,
+            help="Maximal number of lines sorted in memory.")
+    parser.add_argument("--processes", type=int, default=1,
+            help="Number of processes sorting the files.")
+    parser.add_argument("--tmp-dir", help="Directory for the sorted runs.")
     return parser.parse_args()
 
 
 if __name__ == "__main__":
     args = _parse_args()
-    main(args.files)
+    if args.merge:
+        merge_main(args.files, args.run_size, args.processes, args.tmp_dir)
+    else:
+        main(args.files)
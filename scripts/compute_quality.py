@@ -9,286 +9,121 @@ basic
 Edit ID#Timestamp#Article ID#User ID#Quality#Edit delta#Length of article before edit#Length of
 article after edit#The number of upcoming edits considered
 
-The deltas are computed in characters, unlike the original article (which uses words as a unit).
-The last number signifies how many future edits the algorithm managed to user when computing the
-quality (therefore has to between 0-10), might be useful for excluding edge cases.
+By default the deltas are computed in characters, unlike the original article (which uses words as
+a unit). With `--unit=words`, each revision is turned once into an array of interned word ids and
+all distances and lengths are computed in words instead. The first line of the output is the path
+of the XML file (`//path`), followed by `#words` in word mode. The last number signifies how many
+future edits the algorithm managed to user when computing the quality (therefore has to between
+0-10), might be useful for excluding edge cases.
+
+With `--save-state`, the last edit of each article whose quality is final (i.e., that was judged
+by 10 subsequent edits) is recorded. Processing a newer dump with `--previous-state` then skips
+the edits that were already scored, and only computes the qualities of the new edits and of the
+edits that had fewer judges. If `--previous-output` is also given, the final lines of the previous
+output are copied, so that the output covers all the edits of the newer dump. The state records
+the threshold, unit and approximate mode of the run, which must be the same when resuming.
+
+With `--shards=DIR`, the rows are written to compressed columnar shards in `DIR` instead of the
+standard output (see `interank.shards`), which can be filtered by article and time range without
+parsing the whole output, e.g., with `read_shards.py`. The XML file, unit and threshold are recorded
+in the footer of each shard. `--previous-output` is then the directory of the previous shards. `DIR`
+must not contain shards already, unless `--overwrite` is given.
+
+With `--approx-cutoff=N`, the distances between texts that differ on more than N characters (or
+words) are only computed exactly if they are at most `--approx-k`, and bounded from above otherwise
+(see `interank.quality.approximate_distance`). A 10th column is then added to each row: 1 if the
+quality used an approximate distance, 0 otherwise. `validate_approx.py` reports the error of this
+mode on a sample of articles.
+
+The computation itself lives in `interank.quality`; see `process_dump.py` to compute the qualities
+along with the other statistics in a single pass over the dump.
 """
 
-import multiprocessing as mp
-import queue
-import itertools
-import time
-import sys
 import argparse
-import edlib
-import xml.etree.ElementTree as ET
-import datetime
-import calendar
-import csv
-import os
-
-NEW_EDIT_TIME = datetime.timedelta(hours=3)
-
-# constants for the wiki dump xml
-NAMESPACE = "{http://www.mediawiki.org/xml/export-0.10/}"
-PAGE_TAG = NAMESPACE + "page"
-NS_TAG = NAMESPACE + "ns"
-TITLE_TAG = NAMESPACE + "title"
-REDIRECT_TAG = NAMESPACE + "redirect"
-TEXT_TAG = NAMESPACE + "text"
-ID_TAG = NAMESPACE + "id"
-IP_TAG = NAMESPACE + "ip"
-CONTRIBUTOR_TAG = NAMESPACE + "contributor"
-REVISION_TAG = NAMESPACE + "revision"
-TIMESTAMP_TAG = NAMESPACE + "timestamp"
-USERNAME_TAG = NAMESPACE + "username"
-WIKI_TAG = NAMESPACE + "mediawiki"
-
-arg_parser = argparse.ArgumentParser()
-arg_parser.add_argument("xml_file", metavar="XML file", help="The XML file to be processed.")
-arg_parser.add_argument("-p", "--processes", required=True, type=int, action="store", help="Number of parallel processes.")
-arg_parser.add_argument("-t", "--threshold", required=False, type=int,
-                        action="store", help="The threshold date to separate training/test sets.")
-args = arg_parser.parse_args()
-
+import os.path
+import sys
 
-def distance(s1, s2):
-    """Compute the Levenshtein edit distance between two strings."""
-    if len(s1) == 0 or len(s2) == 0:
-        return max(len(s1), len(s2))
+from interank.consumers import process_dump
+from interank.dump import open_dump
+from interank.quality import (QualityScorer, QualityState, final_lines, final_rows,
+                               output_header)
+from interank.shards import APPROX_QUALITY_SCHEMA, QUALITY_SCHEMA, ShardReader, ShardWriter
+
+
+def main(args):
+    previous = None
+    if args.previous_state is not None:
+        with open(args.previous_state) as f:
+            previous = QualityState.load(f)
+    approx = None
+    if args.approx_cutoff is not None:
+        approx = (args.approx_cutoff, args.approx_k)
+    if previous is not None:
+        # Before anything is written, e.g., previous rows with other columns.
+        previous.check(args.threshold, args.unit, approx)
+    if args.shards is not None:
+        if (args.previous_output is not None
+                and os.path.abspath(args.previous_output) == os.path.abspath(args.shards)):
+            raise ValueError("--previous-output must differ from --shards")
+        schema = QUALITY_SCHEMA if approx is None else APPROX_QUALITY_SCHEMA
+        out = ShardWriter(args.shards, schema=schema, shard_rows=args.shard_rows,
+                          meta={"xml_file": args.xml_file, "unit": args.unit,
+                                "threshold": args.threshold, "approx": approx},
+                          overwrite=args.overwrite)
     else:
-        return edlib.align(s1, s2)["editDistance"]
-
-
-def process_edit(q, editid, userid, articleid, timestamp, text_prev, text_final,
-                 text_upcoming, timestamps_upcoming, split_threshold):
-    """Produces the entry for a single edit, for multithreaded use."""
-    quality = 0
-    delta_edit = distance(text_prev, text_final)
-
-    restrict_computation = (split_threshold is not None) and \
-                           (timestamp < split_threshold)
-    future_edits = 0
-
-    if delta_edit > 0 and len(text_upcoming) > 0:
-        for i in range(len(text_upcoming)):
-            if (not restrict_computation) or \
-               calendar.timegm(timestamps_upcoming[i].timetuple()) < split_threshold:
-                quality += (distance(text_prev, text_upcoming[i]) \
-                            - distance(text_final, text_upcoming[i]))\
-                           / delta_edit
-                future_edits += 1
-
-        if future_edits > 0:
-            quality /= future_edits
-
-    q.put((editid, timestamp, articleid, userid, quality, delta_edit,
-           len(text_prev), len(text_final), future_edits))
-
-print("//{}".format(args.xml_file))
-
-# number of processes to use
-NUMBER_PROCESSES = args.processes
-
-# whether should 'cleanly' separate the computations into test/training sets
-THRESHOLD_TIMESTAMP = args.threshold
-
-# time start in seconds
-time_start = time.time()
-
-## open XML file
-parse_iterator = ET.iterparse(args.xml_file, events=('end', 'start'))
-parse_iterator = iter(parse_iterator)
-
-# keep track of the root element
-event, root = next(parse_iterator)
-
-rev_count = 0
-results = []
-with mp.Pool(NUMBER_PROCESSES) as pool:
-    manager = mp.Manager()
-    q = manager.Queue()
-    writer = csv.writer(sys.stdout, delimiter='#')
-
-    edits11 = [""]
-    ids11 = ["-"]
-    users11 = [-1]
-    timestamps11 = ["-"]
-
-    # iterate through all nodes in the xml
-    for event, elem in parse_iterator:
-        if elem.tag == REVISION_TAG and event == "end":
-            # article_elem = elem.getparent()
-
-            # print("end edit: %d" % int(elem.find(ID_TAG).text))
-
-            ns = article_elem.find(NS_TAG)
-            redirect = elem.find(REDIRECT_TAG)
-
-            if ns is not None and ns.text == "0" and redirect == None:
-                edit_id = int(elem.find(ID_TAG).text)
-                article_id = int(article_elem.find(ID_TAG).text)
-                edit_text = elem.find(TEXT_TAG).text
-                timestamp = datetime.datetime.strptime(elem.find(TIMESTAMP_TAG).text, "%Y-%m-%dT%H:%M:%SZ")
-                contributor_elem = elem.find(CONTRIBUTOR_TAG)
-
-                user_id = None
-                if contributor_elem is not None:
-                    id_elem = contributor_elem.find(ID_TAG)
-                    if id_elem is not None:  # registered user with id
-                        if id_elem.text == "0":
-                            if contributor_elem.find(USERNAME_TAG).text is not None:
-                                user_id = "r" + id_elem.text + "|" + contributor_elem.find(USERNAME_TAG).text
-                            else:
-                                user_id = None
-                        else:
-                            user_id = "r" + id_elem.text
-
-                    ip_elem = contributor_elem.find(IP_TAG)
-                    if ip_elem is not None:  # unregistered user with ip
-                        user_id = "u" + ip_elem.text
-
-                if edit_text is None:  # likely a result of vandalism
-                    edit_text = ""
-
-                # arrived at a new article node
-                if user_id is None:
-                    if users11[-1] is not None or timestamp - timestamps11[-1] > NEW_EDIT_TIME:
-                        ids11.append(edit_id)
-                        edits11.append(edit_text)
-                        users11.append(user_id)
-                        timestamps11.append(timestamp)
-                    else:
-                        edits11[-1] = edit_text
-                        ids11[-1] = edit_id
-                        users11[-1] = user_id
-                        timestamps11[-1] = timestamp
-                elif user_id != users11[-1] or timestamp - timestamps11[-1] > NEW_EDIT_TIME:
-                    ids11.append(edit_id)
-                    edits11.append(edit_text)
-                    users11.append(user_id)
-                    timestamps11.append(timestamp)
-                elif user_id == users11[-1] and timestamp - timestamps11[-1] <= NEW_EDIT_TIME:
-                    edits11[-1] = edit_text
-                    ids11[-1] = edit_id
-                    users11[-1] = user_id
-                    timestamps11[-1] = timestamp
-
-                # accumulated enough for a quality computation
-                if len(edits11) >= 12:
-                    if users11[1] is not None:
-                        results.append(
-                            pool.apply_async(process_edit, args=(q, ids11[1],
-                                                                 users11[1],
-                                                                 article_id,
-                                                                 calendar.timegm(timestamps11[1].timetuple()),
-                                                                 edits11[0],
-                                                                 edits11[1],
-                                                                 edits11[2:],
-                                                                 timestamps11[2:],
-                                                                 THRESHOLD_TIMESTAMP)))
-
-                    edits11.pop(0)
-                    users11.pop(0)
-                    ids11.pop(0)
-                    timestamps11.pop(0)
-
-            article_elem.remove(elem)
-            rev_count += 1
-
-            if rev_count % 1000 == 0:
-                rev_count = 0
-                sys.stdout.flush()
-
-                left = len(results)
-                ended = 0
-                while left > 16 * NUMBER_PROCESSES:
-                    results = list(itertools.filterfalse(lambda x: x.ready(), results))
-                    left2 = len(results)
-                    ended += left - left2
-                    left = left2
-
-                while ended > 0:
-                    try:
-                        res = q.get(block=False)
-                        ended -= 1
-                        writer.writerow(res)
-                    except queue.Empty:
-                        pass
-
-        elif elem.tag == PAGE_TAG and event == "start":
-            article_elem = elem
-
-            edits11 = [""]
-            ids11 = ["-"]
-            users11 = [-1]
-            timestamps11 = ["-"]
-
-            # print("start art: %d" % int(article_elem.find(ID_TAG).text))
-
-        elif elem.tag == PAGE_TAG and event == "end":
-            # print("end art: %d" % int(article_elem.find(ID_TAG).text))
-
-            article_id = int(article_elem.find(ID_TAG).text)
-            # consume the remaining revisions
-            while len(edits11) >= 2:
-                if users11[1] is not None:
-                    results.append(
-                        pool.apply_async(process_edit, args=(q, ids11[1],
-                                                             users11[1],
-                                                             article_id,
-                                                             calendar.timegm(timestamps11[1].timetuple()),
-                                                             edits11[0],
-                                                             edits11[1],
-                                                             edits11[2:],
-                                                             timestamps11[2:],
-                                                             THRESHOLD_TIMESTAMP)))
-
-                edits11.pop(0)
-                users11.pop(0)
-                ids11.pop(0)
-                timestamps11.pop(0)
-
-            elem.clear()
-            root.remove(elem)
-
-
-    # end of the mediawiki dump
-    while len(edits11) >= 2:
-        if users11[1] is not None:
-            results.append(
-                pool.apply_async(process_edit, args=(q, ids11[1],
-                                                     users11[1],
-                                                     article_id,
-                                                     calendar.timegm(timestamps11[1].timetuple()),
-                                                     edits11[0],
-                                                     edits11[1],
-                                                     edits11[2:],
-                                                     timestamps11[2:],
-                                                     THRESHOLD_TIMESTAMP)))
-
-        edits11.pop(0)
-        users11.pop(0)
-        ids11.pop(0)
-        timestamps11.pop(0)
-
-    # wait for the completion of remaining results
-    left = len(results)
-    ended = 0
-    while left > 0:
-        results = list(itertools.filterfalse(lambda x: x.ready(), results))
-        left2 = len(results)
-        ended += left - left2
-        left = left2
-
-    while ended > 0:
-        try:
-            res = q.get(block=False)
-            ended -= 1
-            writer.writerow(res)
-        except queue.Empty:
-            pass
-
-
-# end time, in seconds
-time_end = time.time()
+        out = sys.stdout
+        print(output_header(args.xml_file, args.unit))
+    if args.previous_output is not None:
+        if previous is None:
+            raise ValueError("--previous-output requires --previous-state")
+        if args.shards is not None:
+            # The previous output is then a directory of shards as well.
+            for row in final_rows(ShardReader(args.previous_output).rows(), previous):
+                out.writerow(row)
+        else:
+            with open(args.previous_output, encoding="utf-8", newline="") as f:
+                out.writelines(final_lines(f, previous))
+    scorer = QualityScorer(out, args.processes, threshold=args.threshold, unit=args.unit,
+                           previous=previous, keep_state=args.save_state is not None,
+                           approx=approx)
+    process_dump(open_dump(args.xml_file, args.bz2_processes), [scorer])
+    if args.shards is not None:
+        out.close()
+    if scorer.n_changed > 0:
+        print("Articles whose history changed: {}".format(scorer.n_changed), file=sys.stderr)
+    if args.save_state is not None:
+        with open(args.save_state, "w") as f:
+            scorer.state.save(f)
+
+
+def _parse_args():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("xml_file", metavar="XML file", help="The XML file to be processed.")
+    arg_parser.add_argument("-p", "--processes", required=True, type=int, action="store",
+                            help="Number of parallel processes.")
+    arg_parser.add_argument("-t", "--threshold", required=False, type=int, action="store",
+                            help="The threshold date to separate training/test sets.")
+    arg_parser.add_argument("-u", "--unit", choices=["chars", "words"], default="chars",
+                            help="Unit in which edit distances are computed.")
+    arg_parser.add_argument("--bz2-processes", type=int, default=None,
+                            help="Number of processes decompressing a .bz2 XML file.")
+    arg_parser.add_argument("--previous-state",
+                            help="State saved by a run on an older dump.")
+    arg_parser.add_argument("--previous-output",
+                            help="Output of the run that saved the previous state.")
+    arg_parser.add_argument("--save-state", help="Where to save the state of this run.")
+    arg_parser.add_argument("--approx-cutoff", type=int,
+                            help="Size above which distances can be approximate.")
+    arg_parser.add_argument("--approx-k", type=int, default=1000,
+                            help="Distances up to this are exact, even above the cutoff.")
+    arg_parser.add_argument("--shards", metavar="DIR",
+                            help="Write columnar shards to DIR instead of the standard output.")
+    arg_parser.add_argument("--shard-rows", type=int, default=1 << 20,
+                            help="Maximal number of rows per shard.")
+    arg_parser.add_argument("--overwrite", action="store_true",
+                            help="Remove the shards that DIR already contains.")
+    return arg_parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(_parse_args())
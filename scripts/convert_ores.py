@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Convert ORES predictions to arrays aligned with the raw test set.
+
+The output of `collect_ores.py` (one JSON object per line, keyed by revision
+ID) is read in a streaming way, and the probabilities that the edits are
+damaging, in good faith and reverted are written to `ores.damaging.npy`,
+`ores.goodfaith.npy` and `ores.reverted.npy` (as float32) in the dataset
+directory. The i-th entry of each array corresponds to the i-th edit of
+`raw-test.txt`, and is NaN if ORES did not return a score. `ores.mask.npy`
+tells which edits have a score for all models. Example:
+
+    ./convert_ores.py path/to/ores.txt path/to/dataset
+
+The arrays can then be memory-mapped with `WikiData.get_ores_scores()`.
+"""
+import argparse
+import json
+import os.path
+
+import numpy as np
+
+
+MODELS = ["damaging", "goodfaith", "reverted"]
+
+
+def read_edit_ids(path):
+    """Edit IDs of a raw data file, in order."""
+    eids = list()
+    with open(path) as f:
+        for line in f:
+            eids.append(int(line.split("#", 1)[0]))
+    return np.array(eids, dtype=np.int64)
+
+
+def main(args):
+    eids = read_edit_ids(os.path.join(args.dataset_dir, args.raw))
+    order = np.argsort(eids, kind="mergesort")
+    sorted_eids = eids[order]
+    scores = {model: np.full(len(eids), np.nan, dtype=np.float32)
+            for model in MODELS}
+    n_ignored = 0
+    for path in args.ores_files:
+        with open(path) as f:
+            for line in f:
+                data = json.loads(line)
+                revids = np.fromiter(data.keys(), dtype=np.int64,
+                        count=len(data))
+                pos = np.searchsorted(sorted_eids, revids)
+                pos[pos == len(sorted_eids)] = 0
+                found = sorted_eids[pos] == revids
+                n_ignored += np.count_nonzero(~found)
+                rows = order[pos]
+                for obj, row, ok in zip(data.values(), rows, found):
+                    if not ok:
+                        # The edit is actually not in the test set.
+                        continue
+                    for model in MODELS:
+                        try:
+                            prob = obj[model]["score"]["probability"]["true"]
+                        except (KeyError, TypeError):
+                            continue
+                        scores[model][row] = prob
+    mask = np.ones(len(eids), dtype=bool)
+    for model in MODELS:
+        np.save(os.path.join(args.dataset_dir, "ores.{}.npy".format(model)),
+                scores[model])
+        mask &= ~np.isnan(scores[model])
+    np.save(os.path.join(args.dataset_dir, "ores.mask.npy"), mask)
+    print("Edits with scores: {} / {}".format(np.count_nonzero(mask), len(mask)))
+    print("Scores of edits not in the test set: {}".format(n_ignored))
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("ores_files", nargs="+", metavar="ores_file")
+    parser.add_argument("dataset_dir")
+    parser.add_argument("--raw", default="raw-test.txt",
+            help="Raw data file, relative to the dataset directory.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(_parse_args())
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Build and query an index of the pages of a Wikipedia dump.
+
+The index records the offset of every page (and, for bz2 files, of every bz2
+block), so that a range of pages can be read without going through the whole
+file. It is built once per dump file:
+
+    ./index_dump.py build path/to/dump.xml.bz2
+
+This writes `path/to/dump.xml.bz2.index.npz`. Given the index, the pages of a
+dump can be split among several workers (see `process_dump.py --shard`), and
+a single page can be extracted as a valid dump, which is useful for debugging:
+
+    ./index_dump.py extract path/to/dump.xml.bz2 --page 1234 > page.xml
+"""
+import argparse
+import shutil
+import sys
+
+from interank.dumpindex import DumpIndex
+
+
+def default_index_path(xml_path):
+    return xml_path + ".index.npz"
+
+
+def build(args):
+    index = DumpIndex.build(args.xml_file, processes=args.bz2_processes)
+    index.save(args.index or default_index_path(args.xml_file))
+    print("Pages indexed: {}".format(len(index)), file=sys.stderr)
+
+
+def extract(args):
+    index = DumpIndex.load(args.index or default_index_path(args.xml_file))
+    try:
+        pos = index.find(args.page)
+    except KeyError:
+        sys.exit("page {} is not in the index of {}".format(args.page, args.xml_file))
+    with index.open_range(args.xml_file, pos, pos + 1,
+            processes=args.bz2_processes) as f:
+        shutil.copyfileobj(f, sys.stdout.buffer)
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers()
+    # Subparser for building the index.
+    sp_build = subparsers.add_parser("build")
+    sp_build.add_argument("xml_file")
+    sp_build.add_argument("--index", help="Path of the index file.")
+    sp_build.add_argument("--bz2-processes", type=int)
+    sp_build.set_defaults(func=build)
+    # Subparser for extracting a page.
+    sp_extract = subparsers.add_parser("extract")
+    sp_extract.add_argument("xml_file")
+    sp_extract.add_argument("--page", type=int, required=True)
+    sp_extract.add_argument("--index", help="Path of the index file.")
+    sp_extract.add_argument("--bz2-processes", type=int)
+    sp_extract.set_defaults(func=extract)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    args.func(args)
@@ -1,117 +1,166 @@
-"""Utility script to build a small random batch of articles from a full dump."""
+"""Utility script to build a small random batch of articles from a full dump.
+
+With `--count`, exactly that many articles are drawn uniformly at random (reservoir sampling). With
+`--prob`, each article is kept independently with the given probability; if `--count` is also
+given, the sampling stops once that many articles have been kept, unless `--full` is set. Pages
+are copied as raw bytes, so that at most one page is held in memory: the pages kept by the
+reservoir are spooled to a temporary file, and the output (a valid dump, with the header of the
+input) is written incrementally.
+
+Given an index of the dump (see `index_dump.py`), `--processes` samples from as many ranges of
+pages in parallel. The samples of the ranges are then combined so that the result is still a
+uniform sample of the whole dump."""
 
-import xml.etree.ElementTree as ET
 import argparse
-import random
-
-arg_parser = argparse.ArgumentParser()
-arg_parser.add_argument("xml_file", metavar="XML file", help="The XML file to be processed.")
-arg_parser.add_argument("-o", "--out", required=True, help="Output XML file.")
-arg_parser.add_argument("-f", "--full", action="store_true", help="Do a full sweep across the dump.")
-arg_parser.add_argument("-c", "--count", type=int, required=False, help="Number of articles to save")
-arg_parser.add_argument("-p", "--prob", type=float, required=False, help="Probability of keeping an article.")
-args = arg_parser.parse_args()
-
-NAMESPACE = "{http://www.mediawiki.org/xml/export-0.10/}"
-PAGE_TAG = NAMESPACE + "page"
-NS_TAG = NAMESPACE + "ns"
-TITLE_TAG = NAMESPACE + "title"
-REDIRECT_TAG = NAMESPACE + "redirect"
-TEXT_TAG = NAMESPACE + "text"
-
-if args.count is None and args.prob is None:
-    print("Inconsistent parameters.")
-    exit()
-elif args.full is not None and (args.count is not None or args.prob is None):
-    print("Inconsistent parameters.")
-    exit()
+import multiprocessing as mp
+import os
+import shutil
+import tempfile
+
+import numpy as np
 
+from interank.dump import is_disambiguation, open_dump
+from interank.dumpindex import DumpIndex, RawPages
 
 # include the disambiguation pages in the count?
 FLAG_INCLUDE_DISAMB = True
-
-# xml file to output
-OUTPUT_FILE = args.out
-ARTICLES_TO_SAVE = args.count
-PROB = args.prob
-FULL_SWEEP = args.full
-
-if ARTICLES_TO_SAVE is None:
-    ARTICLES_TO_SAVE = 0
-
-def is_disambiguation_page(elem, lang=None):
-    """Given an xml element, decide if disambiguition page."""
-
-    # TODO can distiguish these tags better
-    disambiguation_tags = {"simple": ["{{disambig}}"],
-                           "bar": ["{{Begriffsklärung}}"],
-                           "tr": ["{{anlam ayrımı}}"],
-                           "en": ["{{Disambiguation", "{{disambiguation", "disambiguation}}"]}
-
-    tags = []
-    if lang is None:
-        tags = [item for sublist in disambiguation_tags.values() for item in sublist]
-    else:
-        tags = disambiguation_tags[lang]
-
-    for text_elem in elem.iter(tag=TEXT_TAG):
-        if text_elem.text is not None:
-            for tag in tags:
-                if tag in text_elem.text:
-                    return True
-
-    return False
-
-
-parse_iterator = ET.iterparse(args.xml_file, events=('start', 'end', 'start-ns', 'end-ns'))
-parse_iterator = iter(parse_iterator)
-
-article_count = ARTICLES_TO_SAVE
-count = 0
-
-event, root = next(parse_iterator)
-while event != "start":
-    event, root = next(parse_iterator)
-
-for event, elem in parse_iterator:
-    if event == 'end':
-        if elem.tag == PAGE_TAG:
-            # check to see if an article
-            ns = elem.find(NS_TAG)
-            title = elem.find(TITLE_TAG)
-
-            # check if page is an article
-            if ns is not None and ns.text == "0":
-                # check for redirects
-                if elem.find(REDIRECT_TAG) is None:
-                    # check for disambiguition pages
-                    if FLAG_INCLUDE_DISAMB or not is_disambiguation_page(elem):
-                        if random.random() > PROB:
-                            elem.clear()
-                            root.remove(elem)
-                        else:
-                            article_count = article_count - 1
-                            count += 1
-                    else:
-                        elem.clear()
-                        root.remove(elem)
-                else:
-                    elem.clear()
-                    root.remove(elem)
-            else:
-                elem.clear()
-                root.remove(elem)
-
-        if article_count <= 0 and not FULL_SWEEP:
+# Languages whose disambiguation tags are recognized. Unlike
+# `article_count.py`, the French tags are not.
+DISAMB_LANGS = ("simple", "bar", "tr", "en")
+
+FOOTER = b"</mediawiki>\n"
+
+
+def is_article(ns, redirect, data):
+    """Decide whether a raw page is an article that can be sampled."""
+    if ns != 0 or redirect:
+        return False
+    return FLAG_INCLUDE_DISAMB or not is_disambiguation([data.decode("utf-8")],
+            lang=DISAMB_LANGS)
+
+
+def sample_reservoir(pages, count, rng, spool):
+    """Draw a uniform sample of `count` articles.
+
+    The kept pages are written to `spool`. Returns the number of articles seen and the list of
+    `(position, offset, length)` of the sampled pages in the spool file.
+    """
+    slots = list()
+    n_seen = 0
+    for ns, redirect, data in pages:
+        if not is_article(ns, redirect, data):
+            continue
+        if n_seen < count:
+            slot = len(slots)
+            slots.append(None)
+        else:
+            slot = rng.integers(n_seen + 1)
+        if slot < count:
+            slots[slot] = (n_seen, spool.tell(), len(data))
+            spool.write(data)
+        n_seen += 1
+    return n_seen, slots
+
+
+def sample_bernoulli(pages, prob, rng, out, limit=None):
+    """Write each article to `out` with probability `prob`; returns the number kept."""
+    n_kept = 0
+    for ns, redirect, data in pages:
+        if limit is not None and n_kept >= limit:
             break
-
-# clear the last element
-for article in root.iter(PAGE_TAG):
-    pass
-root.remove(article)
-
-xmlfile = open(OUTPUT_FILE, "wb")
-xmlfile.write(ET.tostring(root))
-xmlfile.close()
-
-print("Articles saved: %d" % count)
+        if is_article(ns, redirect, data) and rng.random() < prob:
+            out.write(b"  " + data + b"\n")
+            n_kept += 1
+    return n_kept
+
+
+def sample_shard(args, index, start, stop, seed, spool_path):
+    """Sample from a range of pages, spooling the kept pages to `spool_path`."""
+    rng = np.random.default_rng(seed)
+    with index.open_range(args.xml_file, start, stop) as f, open(spool_path, "wb") as spool:
+        pages = RawPages(f)
+        if args.count is not None and args.prob is None:
+            return sample_reservoir(pages, args.count, rng, spool)
+        return sample_bernoulli(pages, args.prob, rng, spool), None
+
+
+def copy_pages(spool_path, slots, out):
+    """Copy the pages at the given slots of a spool file, in dump order."""
+    with open(spool_path, "rb") as spool:
+        for _, offset, length in sorted(slots):
+            spool.seek(offset)
+            out.write(b"  " + spool.read(length) + b"\n")
+
+
+def main(args):
+    seeds = np.random.SeedSequence(args.seed).spawn(args.processes + 1)
+    rng = np.random.default_rng(seeds[-1])
+    reservoir = args.count is not None and args.prob is None
+    with tempfile.TemporaryDirectory(dir=args.tmp_dir) as tmp, open(args.out, "wb") as out:
+        if args.processes > 1:
+            index = DumpIndex.load(args.index or args.xml_file + ".index.npz")
+            shards = index.shards(args.processes)
+            spools = [os.path.join(tmp, "shard{}".format(k)) for k in range(len(shards))]
+            tasks = [(args, index, start, stop, seeds[k], spools[k])
+                     for k, (start, stop) in enumerate(shards)]
+            with mp.Pool(args.processes) as pool:
+                results = pool.starmap(sample_shard, tasks)
+            with index.open_range(args.xml_file, 0, 0) as f:
+                out.write(RawPages(f).header)
+        else:
+            spools = [os.path.join(tmp, "spool")]
+            with open_dump(args.xml_file, args.bz2_processes) as f:
+                pages = RawPages(f)
+                out.write(pages.header)
+                if reservoir:
+                    with open(spools[0], "wb") as spool:
+                        results = [sample_reservoir(pages, args.count, rng, spool)]
+                else:
+                    limit = None if args.full else args.count
+                    results = [(sample_bernoulli(pages, args.prob, rng, out, limit), None)]
+        if reservoir:
+            # Split the sample between the shards according to the number of articles they
+            # contain, then subsample the reservoir of each shard.
+            n_seen = [n for n, _ in results]
+            n_kept = min(args.count, sum(n_seen))
+            splits = rng.multivariate_hypergeometric(n_seen, n_kept)
+            for (_, slots), spool, k in zip(results, spools, splits):
+                chosen = rng.choice(len(slots), size=k, replace=False)
+                copy_pages(spool, [slots[i] for i in chosen], out)
+        else:
+            n_kept = sum(n for n, _ in results)
+            if args.processes > 1:
+                for spool in spools:
+                    with open(spool, "rb") as f:
+                        shutil.copyfileobj(f, out)
+        out.write(FOOTER)
+    print("Articles saved: %d" % n_kept)
+
+
+def _parse_args():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("xml_file", metavar="XML file", help="The XML file to be processed.")
+    arg_parser.add_argument("-o", "--out", required=True, help="Output XML file.")
+    arg_parser.add_argument("-f", "--full", action="store_true",
+                            help="Do a full sweep across the dump.")
+    arg_parser.add_argument("-c", "--count", type=int, required=False,
+                            help="Number of articles to save")
+    arg_parser.add_argument("-p", "--prob", type=float, required=False,
+                            help="Probability of keeping an article.")
+    arg_parser.add_argument("-s", "--seed", type=int, help="Seed of the random number generator.")
+    arg_parser.add_argument("--processes", type=int, default=1,
+                            help="Number of ranges of pages sampled in parallel (needs an index).")
+    arg_parser.add_argument("--index", help="Path of the index of the dump.")
+    arg_parser.add_argument("--tmp-dir", help="Directory for the temporary files.")
+    arg_parser.add_argument("--bz2-processes", type=int, default=None,
+                            help="Number of processes decompressing a .bz2 XML file.")
+    args = arg_parser.parse_args()
+    if args.count is None and args.prob is None:
+        arg_parser.error("one of --count and --prob is required")
+    if args.processes > 1 and args.count is not None and args.prob is not None:
+        arg_parser.error("--count with --prob cannot be used with --processes")
+    return args
+
+
+if __name__ == "__main__":
+    main(_parse_args())
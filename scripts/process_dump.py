@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Compute several outputs in a single pass over a Wikipedia dump.
+
+Reading a dump is the most expensive part of computing the user statistics,
+the article statistics, the list of bots and the qualities of the edits. This
+script reads the dump once and produces any subset of these outputs, in the
+same formats as `article_count.py users`, `article_count.py articles`,
+`detect_bots.py` and `compute_quality.py`, respectively. Example:
+
+    ./process_dump.py --users users.txt --articles articles.txt \
+        --bots bots.txt --qualities qualities.txt --processes=48 \
+        path/to/dump.xml.bz2
+
+Given an index of the dump (see `index_dump.py`), `--shard K/N` processes
+only the K-th of N ranges of pages of about the same size, so that N workers
+can process a single large dump independently. The outputs of the shards
+are combined in the same way as those of multiple dump files.
+"""
+import argparse
+import contextlib
+
+from interank.consumers import (
+        ArticleStats, BotDetector, UserStats, process_dump)
+from interank.dump import open_dump
+from interank.dumpindex import DumpIndex
+from interank.quality import QualityScorer, output_header
+
+
+def main(args):
+    with contextlib.ExitStack() as stack:
+        def output(path):
+            return stack.enter_context(open(path, "w", encoding="utf-8"))
+        consumers = list()
+        if args.users is not None:
+            consumers.append(UserStats(output(args.users),
+                    max_users=args.max_users, tmp_dir=args.tmp_dir))
+        if args.articles is not None:
+            consumers.append(ArticleStats(output(args.articles)))
+        if args.bots is not None:
+            consumers.append(BotDetector(output(args.bots)))
+        if args.qualities is not None:
+            out = output(args.qualities)
+            print(output_header(args.xml_file, args.unit), file=out)
+            approx = None
+            if args.approx_cutoff is not None:
+                approx = (args.approx_cutoff, args.approx_k)
+            consumers.append(QualityScorer(out, args.processes,
+                    threshold=args.threshold, unit=args.unit, approx=approx))
+        if not consumers:
+            raise ValueError("no output requested")
+        dump = stack.enter_context(open_input(args))
+        process_dump(dump, consumers)
+
+
+def open_input(args):
+    if args.shard is None:
+        return open_dump(args.xml_file, args.bz2_processes)
+    k, n = map(int, args.shard.split("/"))
+    if not 1 <= k <= n:
+        raise ValueError("invalid shard: {}".format(args.shard))
+    index = DumpIndex.load(args.index or args.xml_file + ".index.npz")
+    start, stop = index.shards(n)[k - 1]
+    return index.open_range(args.xml_file, start, stop,
+            processes=args.bz2_processes)
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("xml_file")
+    parser.add_argument("--users", help="Output file for user statistics.")
+    parser.add_argument("--max-users", type=int,
+            help="Maximal number of users held in memory (see UserStats).")
+    parser.add_argument("--tmp-dir", help="Directory for the sorted runs.")
+    parser.add_argument("--articles",
+            help="Output file for article statistics.")
+    parser.add_argument("--bots", help="Output file for the list of bots.")
+    parser.add_argument("--qualities",
+            help="Output file for the qualities of the edits.")
+    parser.add_argument("--processes", type=int, default=1,
+            help="Number of processes computing qualities.")
+    parser.add_argument("--threshold", type=int,
+            help="The threshold date to separate training/test sets.")
+    parser.add_argument("--unit", choices=["chars", "words"], default="chars",
+            help="Unit in which edit distances are computed.")
+    parser.add_argument("--approx-cutoff", type=int,
+            help="Size above which distances can be approximate "
+            "(see compute_quality.py).")
+    parser.add_argument("--approx-k", type=int, default=1000,
+            help="Distances up to this are exact, even above the cutoff.")
+    parser.add_argument("--bz2-processes", type=int,
+            help="Number of processes decompressing a .bz2 XML file.")
+    parser.add_argument("--shard", metavar="K/N",
+            help="Process only the K-th of N ranges of pages.")
+    parser.add_argument("--index", help="Path of the index of the dump.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(_parse_args())
@@ -1,4 +1,19 @@
 import argparse
+import json
+import os
+import os.path
+
+import numpy as np
+
+from interank.idindex import IdIndex
+
+
+# Columns of the binary datasets, with their types.
+COLUMNS = (("uid", np.int32), ("aid", np.int32),
+        ("q", np.float32), ("ts", np.int64))
+
+# Number of edits processed (and copied) at a time.
+BUFFER_SIZE = 1 << 20
 
 
 def process_users(args):
@@ -17,21 +32,23 @@ def process_articles(args):
             print("{}#{}".format(i, line), end="")
 
 
-def process_qualities(args):
-    wiki2uid = dict()
-    with open(args.users) as f:
-        for line in f:
-            uid, wiki_id, _ = line.strip().split("#", 2)
-            wiki2uid[wiki_id] = int(uid)
-    wiki2aid = dict()
-    with open(args.articles) as f:
+def load_ids(path):
+    wiki2id = dict()
+    with open(path) as f:
         for line in f:
-            aid, wiki_id, _ = line.strip().split("#", 2)
-            wiki2aid[wiki_id] = int(aid)
+            idx, wiki_id, _ = line.strip().split("#", 2)
+            wiki2id[wiki_id] = int(idx)
+    return wiki2id
+
+
+def process_qualities(args):
+    wiki2uid = load_ids(args.users)
+    wiki2aid = load_ids(args.articles)
     with open(args.path) as f:
         for line in f:
+            # An optional 10th column flags approximate qualities.
             _, ts, wiki_aid, wiki_uid, q, _, _, _, n_judges = (line
-                    .strip().split("#"))
+                    .strip().split("#")[:9])
             if ((wiki_uid not in wiki2uid)
                     or (int(n_judges) < args.ignore_less_than)):
                 continue
@@ -41,6 +58,128 @@ def process_qualities(args):
             print("{}#{}#{}#{}".format(uid, aid, q, ts))
 
 
+class ColumnWriter:
+
+    """Writes the columns of a dataset to `.npy` files, in a streaming way.
+
+    The columns are first appended to raw files, and converted to `.npy`
+    files (which need the number of rows in their header) by `close`. As
+    for the text datasets (which are sorted with `sort --key=2`), the rows
+    are sorted by timestamp, keeping the input order for equal timestamps;
+    this only costs a copy when the input is already sorted.
+    """
+
+    def __init__(self, output_dir, name):
+        self._paths = [os.path.join(output_dir, "{}.{}.npy".format(name, col))
+                for col, _ in COLUMNS]
+        self._files = [open(path + ".tmp", "wb") for path in self._paths]
+        self.size = 0
+
+    def extend(self, columns):
+        for (_, dtype), f, values in zip(COLUMNS, self._files, columns):
+            np.asarray(values, dtype=dtype).tofile(f)
+        self.size += len(columns[0])
+
+    def _order(self):
+        """Permutation that sorts the rows by timestamp (`None` if sorted)."""
+        col = [name for name, _ in COLUMNS].index("ts")
+        ts = np.memmap(self._files[col].name, dtype=COLUMNS[col][1], mode="r",
+                shape=(self.size,))
+        for i in range(0, self.size, BUFFER_SIZE):
+            chunk = ts[max(i - 1, 0):i+BUFFER_SIZE]
+            if np.any(chunk[1:] < chunk[:-1]):
+                return np.argsort(ts, kind="stable")
+        return None
+
+    def close(self):
+        for f in self._files:
+            f.close()
+        order = self._order() if self.size > 0 else None
+        for (_, dtype), f, path in zip(COLUMNS, self._files, self._paths):
+            if self.size == 0:
+                np.save(path, np.zeros(0, dtype=dtype))
+                os.remove(f.name)
+                continue
+            raw = np.memmap(f.name, dtype=dtype, mode="r", shape=(self.size,))
+            out = np.lib.format.open_memmap(
+                    path, mode="w+", dtype=dtype, shape=(self.size,))
+            for i in range(0, self.size, BUFFER_SIZE):
+                if order is None:
+                    out[i:i+BUFFER_SIZE] = raw[i:i+BUFFER_SIZE]
+                else:
+                    out[i:i+BUFFER_SIZE] = raw[order[i:i+BUFFER_SIZE]]
+            out.flush()
+            del raw, out
+            os.remove(f.name)
+
+
+def count_lines(path):
+    with open(path, "rb") as f:
+        return sum(1 for _ in f)
+
+
+def _read_chunks(f, size):
+    chunk = list()
+    for line in f:
+        if line.startswith("//"):
+            continue
+        # An optional 10th column flags approximate qualities.
+        chunk.append(line.strip().split("#")[:9])
+        if len(chunk) == size:
+            yield chunk
+            chunk = list()
+    if chunk:
+        yield chunk
+
+
+def build_dataset(args):
+    user_index = IdIndex.for_file(args.users)
+    article_index = IdIndex.for_file(args.articles)
+    os.makedirs(args.output_dir, exist_ok=True)
+    if args.threshold is None:
+        names = ["combined"]
+    else:
+        names = ["train", "test"]
+    writers = {name: ColumnWriter(args.output_dir, name) for name in names}
+    with open(args.path) as f:
+        # IDs are looked up in the indexes a chunk of edits at a time.
+        for chunk in _read_chunks(f, BUFFER_SIZE):
+            _, ts, wiki_aid, wiki_uid, q, _, _, _, n_judges = zip(*chunk)
+            uid = user_index.lookup(wiki_uid)
+            aid = article_index.lookup(wiki_aid)
+            if np.any(aid < 0):
+                # Like `process_qualities`, every article must be known.
+                raise KeyError(wiki_aid[int(np.argmax(aid < 0))])
+            q = (np.array(q, dtype=np.float64) + 1) / 2
+            ts = np.array(ts, dtype=np.int64)
+            keep = ((uid >= 0)
+                    & (np.array(n_judges, dtype=int) >= args.ignore_less_than))
+            if args.threshold is None:
+                masks = {"combined": keep}
+            else:
+                masks = {"train": keep & (ts < args.threshold),
+                        "test": keep & (ts >= args.threshold)}
+            for name, mask in masks.items():
+                writers[name].extend(
+                        (uid[mask], aid[mask], q[mask], ts[mask]))
+    for writer in writers.values():
+        writer.close()
+    # Keep what previous builds (e.g., of the other sets) recorded.
+    path = os.path.join(args.output_dir, "metadata.json")
+    meta = dict()
+    if os.path.exists(path):
+        with open(path) as f:
+            meta = json.load(f)
+    meta["n_users"] = count_lines(args.users)
+    meta["n_articles"] = count_lines(args.articles)
+    if args.threshold is not None:
+        meta["threshold"] = args.threshold
+    for name, writer in writers.items():
+        meta["n_{}".format(name)] = writer.size
+    with open(path, "w") as f:
+        json.dump(meta, f, indent=4)
+
+
 def _parse_args():
     parser = argparse.ArgumentParser()
     subparsers = parser.add_subparsers()
@@ -60,6 +199,15 @@ def _parse_args():
     sp_quals.add_argument("--articles", required=True)
     sp_quals.add_argument("--ignore-less-than", type=int, default=2)
     sp_quals.set_defaults(func=process_qualities)
+    # Subparser for binary datasets.
+    sp_build = subparsers.add_parser("build")
+    sp_build.add_argument("path")
+    sp_build.add_argument("--users", required=True)
+    sp_build.add_argument("--articles", required=True)
+    sp_build.add_argument("--output-dir", required=True)
+    sp_build.add_argument("--ignore-less-than", type=int, default=2)
+    sp_build.add_argument("--threshold", type=int)
+    sp_build.set_defaults(func=build_dataset)
     return parser.parse_args()
 
 
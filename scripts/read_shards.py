@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""Print the rows of columnar shards written by `compute_quality.py`.
+
+Rows are printed in the same format as the text output of
+`compute_quality.py` (without the header line), optionally restricted to a range of article IDs and of
+timestamps (both inclusive). Only the parts of the shards that intersect
+the ranges are decompressed. Example:
+
+    ./read_shards.py path/to/shards --article-id 100 200 \
+        --timestamp 1300000000 1400000000 > qualities.txt
+
+With `--verify`, the checksums of all the shards are checked instead, and
+the corrupted shards are listed.
+"""
+import argparse
+import sys
+
+from interank.shards import ShardReader
+
+
+def main(args):
+    reader = ShardReader(args.path)
+    if args.verify:
+        corrupt = reader.verify()
+        for path in corrupt:
+            print(path)
+        print("Corrupted shards: {} / {}".format(
+                len(corrupt), len(reader.paths)), file=sys.stderr)
+        sys.exit(1 if corrupt else 0)
+    filters = dict()
+    if args.article_id is not None:
+        filters["article_id"] = args.article_id
+    if args.timestamp is not None:
+        filters["timestamp"] = args.timestamp
+    schema = reader.schema
+    if not schema:
+        return
+    quality, n_judges = schema.index("quality"), schema.index("n_judges")
+    for row in reader.rows(**filters):
+        row = list(row)
+        if row[n_judges] == 0:
+            # Without judges, `process_edit` leaves the quality as the
+            # integer 0.
+            row[quality] = 0
+        sys.stdout.write("#".join(map(str, row)) + "\n")
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", help="Directory of shards, or a shard.")
+    parser.add_argument("--article-id", type=int, nargs=2,
+            metavar=("LOW", "HIGH"))
+    parser.add_argument("--timestamp", type=int, nargs=2,
+            metavar=("LOW", "HIGH"))
+    parser.add_argument("--verify", action="store_true")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(_parse_args())
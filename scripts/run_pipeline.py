@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""Build the raw and processed datasets from a set of dump files.
+
+This script runs, on the local machine, the steps that are otherwise run by
+hand or on a Condor cluster (see `README.md`): a single pass over each dump
+file with `process_dump.py`, followed by `combine_users.py`, the
+concatenation and sorting of the other outputs and `process_raw.py`. Steps
+are run in parallel as soon as their inputs are ready, within the given
+CPU and memory budgets, and steps whose outputs are up to date are skipped.
+Example:
+
+    ./run_pipeline.py --cpus=48 --memory=200 --quality-processes=4 \
+        --threshold=1462222957 path/to/folder path/to/output
+
+The outputs are written to `raw/` and `processed/` in the output directory,
+and the outputs for each dump file to `parts/`. As in the manual procedure,
+`combined.txt` holds the qualities computed without threshold. If a
+threshold is given, the qualities are computed a second time with the
+threshold (so that edits after it are not used to judge the edits before
+it), and these qualities are split into `train.txt` and `test.txt` at the
+threshold.
+"""
+import argparse
+import glob
+import json
+import os.path
+import sys
+
+from interank.pipeline import Job, run
+
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def script(name, *args):
+    return [sys.executable, os.path.join(SCRIPTS_DIR, name)] + list(args)
+
+
+def strip_headers(inputs, outputs):
+    """Concatenate quality files, without the lines naming the dump files."""
+    with open(outputs[0], "w", encoding="utf-8") as out:
+        for path in inputs:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.startswith("//"):
+                        out.write(line)
+
+
+def concatenate(inputs, outputs):
+    with open(outputs[0], "wb") as out:
+        for path in inputs:
+            with open(path, "rb") as f:
+                while True:
+                    chunk = f.read(1 << 20)
+                    if not chunk:
+                        break
+                    out.write(chunk)
+
+
+def split_at_threshold(threshold):
+    def split(inputs, outputs):
+        with open(inputs[0], encoding="utf-8") as f, \
+                open(outputs[0], "w", encoding="utf-8") as train, \
+                open(outputs[1], "w", encoding="utf-8") as test:
+            for line in f:
+                ts = int(line.split("#", 2)[1])
+                (train if ts < threshold else test).write(line)
+    return split
+
+
+def write_metadata(inputs, outputs):
+    counts = list()
+    for path in inputs:
+        with open(path, "rb") as f:
+            counts.append(sum(1 for _ in f))
+    with open(outputs[0], "w") as f:
+        json.dump({"n_users": counts[0], "n_articles": counts[1]}, f,
+                indent=4)
+
+
+def dump_jobs(args, xml_files):
+    """Single pass over each dump file, and one more with the threshold."""
+    parts = os.path.join(args.output_dir, "parts")
+    cpus = 1 + args.quality_processes
+    extra = ["--unit", args.unit]
+    if args.bz2_processes is not None:
+        extra += ["--bz2-processes", str(args.bz2_processes)]
+        if args.bz2_processes > 1:
+            cpus += args.bz2_processes
+    jobs = list()
+    for xml_file in xml_files:
+        name = os.path.basename(xml_file)
+        outputs = [os.path.join(parts, "{}.{}.txt".format(name, what))
+                for what in ("users", "articles", "bots", "qualities")]
+
+        def command(tmp, xml_file=xml_file):
+            return script("process_dump.py", xml_file,
+                    "--users", tmp[0], "--articles", tmp[1],
+                    "--bots", tmp[2], "--qualities", tmp[3],
+                    "--processes", str(args.quality_processes), *extra)
+
+        jobs.append(Job("dump " + name, [xml_file], outputs, command=command,
+                cpus=cpus, memory=args.job_memory))
+        if args.threshold is None:
+            continue
+
+        def threshold_command(tmp, xml_file=xml_file):
+            return script("process_dump.py", xml_file, "--qualities", tmp[0],
+                    "--processes", str(args.quality_processes),
+                    "--threshold", str(args.threshold), *extra)
+
+        jobs.append(Job("dump {} (threshold)".format(name), [xml_file],
+                [os.path.join(parts, "{}.thresholded.txt".format(name))],
+                command=threshold_command, cpus=cpus, memory=args.job_memory))
+    return jobs
+
+
+def combine_jobs(args, parts):
+    """Combine the outputs of the dump files into the raw dataset."""
+    raw = os.path.join(args.output_dir, "raw")
+    users, articles, bots, qualities, thresholded = (
+            [p for p in parts if p.endswith(".{}.txt".format(what))]
+            for what in ("users", "articles", "bots", "qualities",
+                    "thresholded"))
+    path = lambda name: os.path.join(raw, name)
+    jobs = [
+        Job("combine users", users, [path("users.txt")], stdout=True,
+                command=lambda tmp: script("combine_users.py", *users),
+                memory=args.job_memory),
+        Job("sort articles", articles, [path("articles.txt")], stdout=True,
+                command=lambda tmp: ["sort"] + articles,
+                memory=args.job_memory),
+        Job("concatenate bots", bots, [path("bots.txt")],
+                function=concatenate),
+        Job("concatenate qualities", qualities, [path("unsorted.txt")],
+                function=strip_headers),
+        Job("sort qualities", [path("unsorted.txt")], [path("combined.txt")],
+                command=lambda tmp: ["sort", "--field-separator=#",
+                        "--key=2", "--output", tmp[0], path("unsorted.txt")],
+                memory=args.job_memory),
+    ]
+    if args.threshold is not None:
+        jobs += [
+            Job("concatenate thresholded qualities", thresholded,
+                    [path("unsorted-thresholded.txt")],
+                    function=strip_headers),
+            Job("sort thresholded qualities",
+                    [path("unsorted-thresholded.txt")],
+                    [path("thresholded.txt")],
+                    command=lambda tmp: ["sort", "--field-separator=#",
+                            "--key=2", "--output", tmp[0],
+                            path("unsorted-thresholded.txt")],
+                    memory=args.job_memory),
+            Job("split qualities", [path("thresholded.txt")],
+                    [path("train.txt"), path("test.txt")],
+                    function=split_at_threshold(args.threshold)),
+        ]
+    return jobs
+
+
+def process_jobs(args):
+    """Turn the raw dataset into the processed dataset."""
+    raw = lambda name: os.path.join(args.output_dir, "raw", name)
+    processed = lambda name: os.path.join(args.output_dir, "processed", name)
+    users, articles = processed("users.txt"), processed("articles.txt")
+    jobs = [
+        Job("process users", [raw("users.txt")], [users], stdout=True,
+                command=lambda tmp: script("process_raw.py", "users",
+                        raw("users.txt"))),
+        Job("process articles", [raw("articles.txt")], [articles],
+                stdout=True, command=lambda tmp: script("process_raw.py",
+                        "articles", raw("articles.txt"))),
+        Job("metadata", [users, articles], [processed("metadata.json")],
+                function=write_metadata),
+    ]
+    names = ["combined.txt"]
+    if args.threshold is not None:
+        names += ["train.txt", "test.txt"]
+    for name in names:
+        jobs.append(Job("process " + name, [raw(name), users, articles],
+                [processed(name)], stdout=True,
+                command=lambda tmp, name=name: script("process_raw.py",
+                        "qualities", "--users", users, "--articles", articles,
+                        "--ignore-less-than", str(args.ignore_less_than),
+                        raw(name)),
+                memory=args.job_memory))
+    return jobs
+
+
+def main(args):
+    xml_files = sorted(os.path.abspath(p)
+            for p in glob.glob(os.path.join(args.input_dir, "*xml*"))
+            if not p.endswith(".npz"))
+    if not xml_files:
+        raise ValueError("no dump files in {}".format(args.input_dir))
+    jobs = dump_jobs(args, xml_files)
+    parts = [path for job in jobs for path in job.outputs]
+    jobs += combine_jobs(args, parts)
+    jobs += process_jobs(args)
+    run(jobs, cpus=args.cpus, memory=args.memory, retries=args.retries)
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input_dir")
+    parser.add_argument("output_dir")
+    parser.add_argument("--cpus", type=int,
+            help="Number of CPUs available (default: all).")
+    parser.add_argument("--memory", type=float,
+            help="Memory available, in GB (default: unlimited).")
+    parser.add_argument("--job-memory", type=float, default=4,
+            help="Memory used by the largest jobs, in GB.")
+    parser.add_argument("--retries", type=int, default=1,
+            help="Number of times a failed job is retried.")
+    parser.add_argument("--quality-processes", type=int, default=2,
+            help="Number of processes computing qualities for each file.")
+    parser.add_argument("--bz2-processes", type=int,
+            help="Number of processes decompressing each .bz2 file.")
+    parser.add_argument("--threshold", type=int,
+            help="The threshold date to separate training/test sets.")
+    parser.add_argument("--unit", choices=["chars", "words"], default="chars",
+            help="Unit in which edit distances are computed.")
+    parser.add_argument("--ignore-less-than", type=int, default=2,
+            help="Minimal number of judges of the edits that are kept.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(_parse_args())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Score a stream of edits with exported model parameters.
+
+Each input line is an edit given as `user_key#article_id` (e.g.,
+`r123#4567`, or `u1.2.3.4#4567` for anonymous users), where the article ID
+is the wiki page ID; further `#`-separated fields are ignored. For each
+edit, the line `user_key#article_id#probability` is written to the output.
+Malformed lines are skipped (and counted), so that a single bad line does not
+stop a long-running scorer.
+Example:
+
+    ./score_edits.py params.npz path/to/dataset < edits.txt
+
+The parameters are exported with `TensorFlowModel.export`, and the wiki IDs
+are mapped to the IDs of the model with the indexes of the `users.txt` and
+`articles.txt` files of the dataset (see `interank.idindex`), which are built
+on first use. Edits are scored in batches of up to `--batch-size`
+edits, but the input is not waited for: whatever is available (e.g., on a
+pipe) is scored and written immediately. When the parameter file changes,
+it is reloaded before the next batch.
+"""
+import argparse
+import os.path
+import sys
+import time
+
+import numpy as np
+
+from interank.idindex import IdIndex
+from interank.scoring import FALLBACKS, Scorer
+
+
+# Number of bytes read at once from the input.
+CHUNK_SIZE = 1 << 16
+
+
+def read_batches(f, batch_size):
+    """Yield lists of lines, as soon as complete lines are available."""
+    tail = b""
+    while True:
+        # `read1` returns what is available rather than waiting for a full
+        # chunk (it only blocks when nothing is available).
+        chunk = f.read1(CHUNK_SIZE)
+        if not chunk:
+            break
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        for i in range(0, len(lines), batch_size):
+            yield lines[i:i+batch_size]
+    if tail:
+        yield [tail]
+
+
+def score_batch(scorer, user_index, article_index, lines):
+    """Score a batch of lines.
+
+    Returns the output, the number of edits scored, the number of unknown
+    users or articles and the number of malformed lines, which are skipped.
+    """
+    keys = list()
+    n_malformed = 0
+    for line in lines:
+        try:
+            line = line.decode().rstrip("\r")
+        except UnicodeDecodeError:
+            n_malformed += 1
+            continue
+        if not line:
+            continue
+        fields = line.split("#", 2)
+        if len(fields) < 2 or not fields[0] or not fields[1]:
+            n_malformed += 1
+            continue
+        keys.append(fields[:2])
+    if not keys:
+        return "", 0, 0, n_malformed
+    user_keys, article_ids = zip(*keys)
+    uids = user_index.lookup(user_keys)
+    aids = article_index.lookup(article_ids)
+    probs = scorer.score(uids, aids)
+    n_unknown = np.count_nonzero(uids < 0) + np.count_nonzero(aids < 0)
+    res = "".join("{}#{}#{:.6f}\n".format(u, a, p)
+            for u, a, p in zip(user_keys, article_ids, probs))
+    return res, len(keys), n_unknown, n_malformed
+
+
+def main(args):
+    scorer = Scorer(args.params, user_fallback=args.unknown_user,
+            article_fallback=args.unknown_article)
+    user_index = IdIndex.for_file(
+            os.path.join(args.dataset_dir, "users.txt"))
+    article_index = IdIndex.for_file(
+            os.path.join(args.dataset_dir, "articles.txt"))
+    if (user_index.max_id >= scorer.n_users
+            or article_index.max_id >= scorer.n_articles):
+        sys.exit("parameters do not match the dataset: {} users and {} "
+                "articles".format(scorer.n_users, scorer.n_articles))
+    out = sys.stdout
+    if args.output is not None:
+        out = open(args.output, "w")
+    n_edits = 0
+    n_unknown = 0
+    n_malformed = 0
+    last_check = time.monotonic()
+    try:
+        for path in args.inputs or ["-"]:
+            if path == "-":
+                f = sys.stdin.buffer
+            else:
+                f = open(path, "rb")
+            try:
+                for lines in read_batches(f, args.batch_size):
+                    now = time.monotonic()
+                    if now - last_check >= args.reload_interval:
+                        last_check = now
+                        if scorer.maybe_reload():
+                            print("Reloaded {}".format(args.params),
+                                    file=sys.stderr)
+                    res, n, unknown, malformed = score_batch(
+                            scorer, user_index, article_index, lines)
+                    out.write(res)
+                    out.flush()
+                    n_edits += n
+                    n_unknown += unknown
+                    n_malformed += malformed
+            finally:
+                if f is not sys.stdin.buffer:
+                    f.close()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print("Edits scored: {}, unknown users or articles: {}, malformed lines "
+            "skipped: {}".format(n_edits, n_unknown, n_malformed),
+            file=sys.stderr)
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("params", help="Exported parameters (.npz).")
+    parser.add_argument("dataset_dir")
+    parser.add_argument("inputs", nargs="*", metavar="input",
+            help="Files of edits (default: standard input).")
+    parser.add_argument("--output", "-o")
+    parser.add_argument("--batch-size", type=int, default=4096)
+    parser.add_argument("--unknown-user", choices=FALLBACKS, default="mean",
+            help="Parameters of unknown users.")
+    parser.add_argument("--unknown-article", choices=FALLBACKS,
+            default="mean", help="Parameters of unknown articles.")
+    parser.add_argument("--reload-interval", type=float, default=5,
+            help="Minimal time between checks of the parameters, in seconds.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(_parse_args())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Report the error of the approximate quality mode against the exact mode.
+
+The qualities of a random sample of articles are computed in a single pass
+over the dump, both exactly and in approximate mode (see
+`compute_quality.py --approx-cutoff`). The script reports how many edits
+used an approximate distance, and the error of their edit distance and
+quality. Example:
+
+    ./validate_approx.py --prob 0.01 --approx-cutoff 100000 --processes 8 \
+        path/to/dump.xml.bz2
+"""
+import argparse
+
+import numpy as np
+
+from interank.consumers import Consumer, process_dump
+from interank.dump import open_dump
+from interank.quality import QualityScorer
+
+
+class RowCollector:
+
+    """Row writer that keeps the rows in memory, by edit ID."""
+
+    def __init__(self):
+        self.rows = dict()
+
+    def writerow(self, row):
+        self.rows[row[0]] = row
+
+    def flush(self):
+        pass
+
+
+class SampledPages(Consumer):
+
+    """Forwards a random sample of the pages to other consumers."""
+
+    namespaces = {0}
+    text = True
+
+    def __init__(self, consumers, prob, seed=None):
+        self._consumers = consumers
+        self._prob = prob
+        self._rng = np.random.default_rng(seed)
+        self._active = False
+        self.n_pages = 0
+
+    def start_page(self, page):
+        self._active = self._rng.random() < self._prob
+        if self._active:
+            self.n_pages += 1
+            for consumer in self._consumers:
+                consumer.start_page(page)
+
+    def add_revision(self, rev):
+        if self._active:
+            for consumer in self._consumers:
+                consumer.add_revision(rev)
+
+    def end_page(self, page):
+        if self._active:
+            for consumer in self._consumers:
+                consumer.end_page(page)
+
+    def close(self):
+        for consumer in self._consumers:
+            consumer.close()
+
+
+def _summary(name, errors):
+    errors = np.abs(errors)
+    if len(errors) == 0:
+        return "{}: -".format(name)
+    return "{}: mean {:.4g}, median {:.4g}, 99th pct {:.4g}, max {:.4g}".format(
+            name, errors.mean(), np.median(errors),
+            np.percentile(errors, 99), errors.max())
+
+
+def main(args):
+    exact = RowCollector()
+    approx = RowCollector()
+    scorers = [
+        QualityScorer(exact, args.processes, unit=args.unit),
+        QualityScorer(approx, args.processes, unit=args.unit,
+                approx=(args.approx_cutoff, args.approx_k)),
+    ]
+    sample = SampledPages(scorers, args.prob, args.seed)
+    process_dump(open_dump(args.xml_file, args.bz2_processes), [sample])
+    flagged = [eid for eid, row in approx.rows.items() if row[9]]
+    print("Articles: {}".format(sample.n_pages))
+    print("Edits: {}".format(len(approx.rows)))
+    print("Edits with an approximate distance: {}".format(len(flagged)))
+    if not flagged:
+        return
+    e = np.array([exact.rows[eid] for eid in flagged], dtype=object)
+    a = np.array([approx.rows[eid] for eid in flagged], dtype=object)
+    delta_exact = e[:, 5].astype(float)
+    delta_approx = a[:, 5].astype(float)
+    rel = (delta_approx - delta_exact) / np.maximum(delta_exact, 1)
+    print(_summary("Relative error of the edit delta", rel))
+    print(_summary("Absolute error of the quality",
+            a[:, 4].astype(float) - e[:, 4].astype(float)))
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("xml_file")
+    parser.add_argument("--prob", type=float, default=0.01,
+            help="Probability that an article is in the sample.")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--approx-cutoff", type=int, default=100000)
+    parser.add_argument("--approx-k", type=int, default=1000)
+    parser.add_argument("-u", "--unit", choices=["chars", "words"],
+            default="chars")
+    parser.add_argument("-p", "--processes", type=int, default=1)
+    parser.add_argument("--bz2-processes", type=int)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(_parse_args())
@@ -16,66 +16,46 @@ Basic usage:
 
 # check an edit in the English wikipedia
 ./wiki_query.py -e 532467 -l en
+
+Lookups are sent in batches of at most 50 IDs, and the responses are cached locally (see
+`interank.wikiapi`), so that checking the same IDs again is instant. Instead of the raw responses
+of the API, the script prints the objects that they contain, keyed by the requested IDs (or names).
 """
 
-import urllib.request, json
 import argparse
+import json
 
-def read_json(query_url):
-    with urllib.request.urlopen(query_url) as url:
-        data = json.loads(url.read().decode())
-        return data
+from interank.wikiapi import DEFAULT_CACHE, WikiAPI
 
 
-def get_edit_info(edit_ids, lang="simple"):
+def get_edit_info(edit_ids, lang="simple", api=None):
     """Uses Wikipedia API to query json data from the internal id of an edit."""
-    if isinstance(edit_ids, int):
-        query_url = r"https://{0}.wikipedia.org/w/api.php?action=query&format=json&prop=revisions&revids={1}"\
-                    .format(lang, edit_ids)
-    else:
-        query_url = r"https://{0}.wikipedia.org/w/api.php?action=query&format=json&prop=revisions&revids={1}"\
-                    .format(lang, "|".join(str(x) for x in edit_ids))
-
-    return read_json(query_url)
+    return _client(api, lang).get_edits(_as_list(edit_ids))
 
 
-def get_article_info(article_ids, lang="simple"):
+def get_article_info(article_ids, lang="simple", api=None):
     """Uses Wikipedia API to query json data from the internal id of an article page."""
-    if isinstance(article_ids, int):
-        query_url = r"https://{0}.wikipedia.org/w/api.php?action=query&format=json&prop=info&pageids={1}&inprop=url" \
-                    .format(lang, article_ids)
-    else:
-        query_url = r"https://{0}.wikipedia.org/w/api.php?action=query&format=json&prop=info&pageids={1}&inprop=url" \
-                    .format(lang, "|".join(str(x) for x in article_ids))
+    return _client(api, lang).get_articles(_as_list(article_ids))
 
-    return read_json(query_url)
 
-
-def get_user_info(user_ids, lang="simple"):
+def get_user_info(user_ids, lang="simple", api=None):
     """Uses Wikipedia API to query json data from the internal id of a user."""
-    if isinstance(user_ids, int):
-        query_url = r"https://{0}.wikipedia.org/w/api.php?action=query&format=json&list=users&ususers={1}" \
-                    r"&usprop=groups|editcount|gender|registration"\
-                    .format(lang, user_ids)
-    else:
-        query_url = r"https://{0}.wikipedia.org/w/api.php?action=query&format=json&list=users&ususerids={1}" \
-                    r"&usprop=groups|editcount|gender|registration"\
-                    .format(lang, "|".join(str(x) for x in user_ids))
-
-    return read_json(query_url)
+    return _client(api, lang).get_users(_as_list(user_ids))
 
 
-def get_user_info_from_name(names, lang="simple"):
+def get_user_info_from_name(names, lang="simple", api=None):
     """Uses Wikipedia API to query json data from the name of a user."""
     if isinstance(names, str):
-        query_url = r"https://{0}.wikipedia.org/w/api.php?action=query&format=json&list=users&ususers={1}" \
-                    r"&usprop=groups|editcount|gender|registration".format(lang, names)
-    else:
-        names = "|".join(names)
-        query_url = r"https://{0}.wikipedia.org/w/api.php?action=query&format=json&list=users&ususers={1}" \
-                    r"&usprop=groups|editcount|gender|registration".format(lang, names)
+        names = [names]
+    return _client(api, lang).get_users_by_name(names)
 
-    return read_json(query_url)
+
+def _as_list(ids):
+    return [ids] if isinstance(ids, int) else list(ids)
+
+
+def _client(api, lang):
+    return api if api is not None else WikiAPI(lang)
 
 
 argparser = argparse.ArgumentParser()
@@ -84,23 +64,29 @@ argparser.add_argument("-a", "--article", action="append", default=[], type=int,
 argparser.add_argument("-u", "--user", action="append", default=[], type=int, help="User ids to view.")
 argparser.add_argument("-n", "--name", action="append", default=[], type=str, help="User names to view.")
 argparser.add_argument("-l", "--lang", action="store", default="simple", required=False)
+argparser.add_argument("--cache", default=DEFAULT_CACHE, help="Path of the cache of responses.")
+argparser.add_argument("--no-cache", action="store_true", help="Do not use the cache.")
+argparser.add_argument("--ttl", type=float, default=7 * 24, help="Lifetime of cached responses, in hours.")
 
 # Note: user r"http://en.wikipedia.org/?curid=REV_ID" to view any edit
 if __name__ == "__main__":
     args = argparser.parse_args()
+    api = WikiAPI(args.lang, cache=None if args.no_cache else args.cache, ttl=3600 * args.ttl)
 
     if len(args.edit) > 0:
         print("Edits:\n")
-        print(json.dumps(get_edit_info(args.edit, lang=args.lang), indent=4, sort_keys=True))
+        print(json.dumps(get_edit_info(args.edit, api=api), indent=4, sort_keys=True))
 
     if len(args.article) > 0:
         print("Articles:\n")
-        print(json.dumps(get_article_info(args.article, lang=args.lang), indent=4, sort_keys=True))
+        print(json.dumps(get_article_info(args.article, api=api), indent=4, sort_keys=True))
 
     if len(args.user) > 0:
         print("Users (from id):\n")
-        print(json.dumps(get_user_info(args.user, lang=args.lang), indent=4, sort_keys=True))
+        print(json.dumps(get_user_info(args.user, api=api), indent=4, sort_keys=True))
 
     if len(args.name) > 0:
         print("Users (from name):\n")
-        print(json.dumps(get_user_info_from_name(args.name, lang=args.lang), indent=4, sort_keys=True))
+        print(json.dumps(get_user_info_from_name(args.name, api=api), indent=4, sort_keys=True))
+
+    api.close()
@@ -0,0 +1,58 @@
+"""Make the library and the scripts importable, and write test dumps."""
+import os.path
+import sys
+import time
+from xml.sax.saxutils import escape
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for directory in ("lib", "scripts"):
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+DUMP_HEADER = """<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/" version="0.10">
+  <siteinfo>
+    <sitename>Test</sitename>
+  </siteinfo>
+"""
+
+REVISION = """    <revision>
+      <id>{id}</id>
+      <timestamp>{timestamp}</timestamp>
+      <contributor>
+        {contributor}
+      </contributor>
+      <text xml:space="preserve">{text}</text>
+    </revision>
+"""
+
+
+def _contributor(user):
+    if user.startswith("u"):
+        return "<ip>{}</ip>".format(user[1:])
+    return "<username>User{0}</username>\n        <id>{0}</id>".format(user)
+
+
+def write_xml(path, pages):
+    """Write a small XML dump.
+
+    `pages` is a list of tuples `(page ID, title, namespace, revisions)`,
+    where each revision is a tuple `(revision ID, UNIX timestamp, user,
+    text)`; `user` is a user ID, or `u<ip>` for anonymous users.
+    """
+    parts = [DUMP_HEADER]
+    for page_id, title, ns, revisions in pages:
+        parts.append("  <page>\n    <title>{}</title>\n    <ns>{}</ns>\n"
+                "    <id>{}</id>\n".format(escape(title), ns, page_id))
+        for rev_id, ts, user, text in revisions:
+            parts.append(REVISION.format(id=rev_id,
+                    timestamp=time.strftime("%Y-%m-%dT%H:%M:%SZ",
+                            time.gmtime(ts)),
+                    contributor=_contributor(str(user)), text=escape(text)))
+        parts.append("  </page>\n")
+    parts.append("</mediawiki>\n")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(parts))
@@ -0,0 +1,73 @@
+import bz2
+import io
+import random
+
+import pytest
+
+from interank.bz2reader import (BLOCK_MAGIC, ParallelBZ2Reader, _find_magic,
+        open_dump)
+
+
+def make_data(n_bytes, seed=0):
+    rng = random.Random(seed)
+    words = [bytes(rng.choice(b"abcdefgh") for _ in range(rng.randrange(
+            1, 10))) for _ in range(5000)]
+    parts, size = list(), 0
+    while size < n_bytes:
+        word = rng.choice(words)
+        parts.append(word)
+        size += len(word) + 1
+    return b" ".join(parts)
+
+
+@pytest.fixture(scope="module")
+def multistream(tmp_path_factory):
+    """A file of two bz2 streams of several 100 kB blocks each."""
+    data = make_data(1500000)
+    path = str(tmp_path_factory.mktemp("bz2") / "data.bz2")
+    half = len(data) // 2
+    with open(path, "wb") as f:
+        f.write(bz2.compress(data[:half], 1))
+        f.write(bz2.compress(data[half:], 1))
+    return path, data
+
+
+def test_find_magic():
+    for shift in range(8):
+        # The magic starts at bit 16 + shift, after a byte and 8 + shift
+        # bits.
+        value = (0b101 << 48 | BLOCK_MAGIC) << (16 - shift)
+        buf = b"\x00" + value.to_bytes(9, "big")
+        assert _find_magic(buf, BLOCK_MAGIC, 0, 10) == [16 + shift]
+
+
+@pytest.mark.parametrize("processes", [None, 2])
+def test_read(multistream, processes):
+    path, data = multistream
+    with open_dump(path, processes) as f:
+        assert f.read() == data
+    reader = ParallelBZ2Reader(path, processes, window=3, record_blocks=True)
+    with io.BufferedReader(reader) as f:
+        assert f.read() == data
+    assert len(reader.blocks) > 10
+    # A block can be read on its own from its bit offset.
+    bit, offset = reader.blocks[5]
+    with io.BufferedReader(ParallelBZ2Reader(path, processes,
+            start=bit)) as f:
+        assert f.read(1000) == data[offset:offset + 1000]
+
+
+def test_close_early(multistream):
+    path, data = multistream
+    with open_dump(path, 2) as f:
+        assert f.read(1000) == data[:1000]
+
+
+def test_truncated(multistream, tmp_path):
+    path, _ = multistream
+    truncated = str(tmp_path / "truncated.bz2")
+    with open(path, "rb") as f, open(truncated, "wb") as out:
+        out.write(f.read(300000))
+    with pytest.raises(OSError):
+        with open_dump(truncated, 2) as f:
+            f.read()
@@ -0,0 +1,180 @@
+import argparse
+import collections
+import http.server
+import json
+import threading
+import time
+import urllib.parse
+
+import pytest
+
+import collect_ores
+
+
+class StandInOres:
+
+    """Local stand-in for the ORES service, with injected failures.
+
+    `failures` maps the first revision ID of a chunk to the list of failures
+    of its successive requests: `503` for an HTTP error and `"timeout"` for a
+    response that takes longer than the timeout of the client.
+    """
+
+    def __init__(self, failures=None, delay=1.0):
+        self.failures = collections.defaultdict(list, failures or dict())
+        self.delay = delay
+        self.requested = collections.Counter()
+        self.served = list()
+        self._lock = threading.Lock()
+        stand_in = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                stand_in.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(
+                ("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                daemon=True)
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self._server.server_port)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def handle(self, request):
+        url = urllib.parse.urlsplit(request.path)
+        lang = url.path.rsplit("/", 1)[1]
+        query = urllib.parse.parse_qs(url.query)
+        revids = query["revids"][0].split("|")
+        models = query["models"][0].split("|")
+        with self._lock:
+            self.requested[revids[0]] += 1
+            failures = self.failures[revids[0]]
+            failure = failures.pop(0) if failures else None
+        if failure == "timeout":
+            time.sleep(self.delay)
+        elif failure is not None:
+            self._send(request, failure, b"unavailable")
+            return
+        scores = {revid: {model: {"score": {"prediction": False,
+                "probability": {"true": int(revid) / 1000,
+                        "false": 1 - int(revid) / 1000}}}
+                for model in models} for revid in revids}
+        with self._lock:
+            self.served.extend(revids)
+        self._send(request, 200, json.dumps({lang: {"scores": scores}}).encode())
+
+    @staticmethod
+    def _send(request, status, body):
+        try:
+            request.send_response(status)
+            request.send_header("Content-Type", "application/json")
+            request.send_header("Content-Length", str(len(body)))
+            request.end_headers()
+            request.wfile.write(body)
+        except OSError:
+            # The client gave up (timeout).
+            pass
+
+
+def make_args(tmp_path, base_url, **kwargs):
+    args = dict(lang="trwiki", testfile=str(tmp_path / "raw-test.txt"),
+            chunk_size=5, model=None, ignore_from=None,
+            output=str(tmp_path / "ores.txt"), cache=None, base_url=base_url,
+            concurrency=3, rate=0, retries=3, backoff=0.01, timeout=0.5)
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+
+def write_test_set(path, revids):
+    with open(path, "w") as f:
+        for revid in revids:
+            f.write("{}#1200000000#1#u1.2.3.4#0.5#1#1#2#10\n".format(revid))
+
+
+def read_output(path):
+    scores = dict()
+    with open(path) as f:
+        for line in f:
+            for revid, score in json.loads(line).items():
+                assert revid not in scores
+                scores[revid] = score
+    return scores
+
+
+def test_retries_and_output(tmp_path):
+    revids = [str(r) for r in range(100, 130)]
+    write_test_set(tmp_path / "raw-test.txt", revids)
+    failures = {"100": [503, 503], "105": ["timeout"], "110": [503, "timeout"]}
+    with StandInOres(failures) as server:
+        collect_ores.main(make_args(tmp_path, server.url))
+    assert server.requested["100"] == 3
+    assert server.requested["105"] == 2
+    assert server.requested["110"] == 3
+    assert server.requested["115"] == 1
+    scores = read_output(tmp_path / "ores.txt")
+    assert sorted(scores) == revids
+    assert set(scores["123"]) == set(collect_ores.MODELS)
+    assert scores["123"]["damaging"]["score"]["probability"]["true"] == 0.123
+    with open(tmp_path / "ores.txt.revids") as f:
+        assert sorted(f.read().split()) == revids
+
+
+def test_resume(tmp_path):
+    revids = [str(r) for r in range(100, 130)]
+    write_test_set(tmp_path / "raw-test.txt", revids)
+    # The chunk starting at 110 keeps failing, so that the first run stops.
+    with StandInOres({"110": [503] * 10}) as server:
+        with pytest.raises(RuntimeError):
+            collect_ores.main(make_args(tmp_path, server.url, retries=2,
+                    concurrency=1))
+    with open(tmp_path / "ores.txt.revids") as f:
+        cached = set(f.read().split())
+    assert cached == set(read_output(tmp_path / "ores.txt"))
+    assert cached and "110" not in cached
+    # New revisions are added to the test set in the meantime.
+    revids += [str(r) for r in range(130, 140)]
+    write_test_set(tmp_path / "raw-test.txt", revids)
+    with StandInOres() as server:
+        collect_ores.main(make_args(tmp_path, server.url))
+    assert sorted(server.served) == sorted(set(revids) - cached)
+    assert sorted(read_output(tmp_path / "ores.txt")) == revids
+    with open(tmp_path / "ores.txt.revids") as f:
+        assert sorted(f.read().split()) == revids
+
+
+def test_resume_after_crash(tmp_path):
+    revids = [str(r) for r in range(100, 130)]
+    write_test_set(tmp_path / "raw-test.txt", revids)
+    with StandInOres() as server:
+        collect_ores.main(make_args(tmp_path, server.url))
+    with open(tmp_path / "ores.txt") as f:
+        lines = f.readlines()
+    # The process stopped after writing the third chunk to the output but
+    # before writing it to the cache file, and in the middle of the fourth.
+    with open(tmp_path / "ores.txt", "w") as f:
+        f.writelines(lines[:3])
+        f.write(lines[3][:20])
+    collected = set(json.loads(lines[0])) | set(json.loads(lines[1]))
+    with open(tmp_path / "ores.txt.revids", "w") as f:
+        f.write("".join(r + "\n" for r in sorted(collected)))
+    with StandInOres() as server:
+        collect_ores.main(make_args(tmp_path, server.url))
+    assert sorted(server.served) == sorted(
+            set(revids) - collected - set(json.loads(lines[2])))
+    assert sorted(read_output(tmp_path / "ores.txt")) == revids
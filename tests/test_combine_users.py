@@ -0,0 +1,32 @@
+import random
+
+import combine_users
+
+
+def write_files(tmp_path, n_files=3, seed=0):
+    rng = random.Random(seed)
+    paths = list()
+    for i in range(n_files):
+        path = str(tmp_path / "users{}.txt".format(i))
+        with open(path, "w") as f:
+            for user in rng.sample(range(100), 40):
+                first = rng.randrange(10 ** 6)
+                f.write("r{}#Name{}-{}#{}#{}#{}#{}\n".format(user, user, i,
+                        first, first + rng.randrange(10 ** 5),
+                        rng.randrange(1, 10), rng.randrange(1, 5)))
+        paths.append(path)
+    return paths
+
+
+def test_merge_matches_in_memory(tmp_path, capsys):
+    paths = write_files(tmp_path)
+    combine_users.main(paths)
+    expected = capsys.readouterr().out.splitlines()
+    for processes in (1, 2):
+        combine_users.merge_main(paths, run_size=7, processes=processes,
+                tmp_dir=str(tmp_path))
+        lines = capsys.readouterr().out.splitlines()
+        assert lines == sorted(expected, key=combine_users.user_key)
+    # The temporary runs are removed.
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+            "users0.txt", "users1.txt", "users2.txt"]
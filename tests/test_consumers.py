@@ -0,0 +1,82 @@
+import io
+import random
+
+from conftest import write_xml
+from interank.consumers import UserStats, merge_user_lines, process_dump
+
+
+def make_pages(n_pages=30, seed=0):
+    rng = random.Random(seed)
+    pages = list()
+    rev_id = 1
+    for page_id in range(1, n_pages + 1):
+        revisions = list()
+        ts = 1200000000 + rng.randrange(10 ** 6)
+        for _ in range(rng.randrange(1, 15)):
+            user = rng.choice([str(rng.randrange(1, 40)),
+                    "u10.0.0.{}".format(rng.randrange(20))])
+            revisions.append((rev_id, ts, user, "text"))
+            rev_id += 1
+            ts += rng.randrange(1, 10 ** 5)
+        ns = 0 if page_id % 5 else 1
+        pages.append((page_id, "Page {}".format(page_id), ns, revisions))
+    return pages
+
+
+def expected_stats(pages):
+    stats = dict()
+    for _, _, ns, revisions in pages:
+        if ns != 0:
+            continue
+        for user in {user for _, _, user, _ in revisions}:
+            ts = [t for _, t, u, _ in revisions if u == user]
+            key = "u" + user[1:] if user.startswith("u") else "r" + user
+            first, last, edits, articles = stats.get(
+                    key, (ts[0], ts[0], 0, 0))
+            stats[key] = (min(first, min(ts)), max(last, max(ts)),
+                    edits + len(ts), articles + 1)
+    return stats
+
+
+def parse(lines):
+    res = dict()
+    for line in lines:
+        key, _, first, last, edits, articles = line.strip().split("#")
+        assert key not in res
+        res[key] = tuple(map(int, (first, last, edits, articles)))
+    return res
+
+
+def run_user_stats(tmp_path, pages, **kwargs):
+    xml_file = str(tmp_path / "dump.xml")
+    write_xml(xml_file, pages)
+    out = io.StringIO()
+    with open(xml_file, "rb") as f:
+        process_dump(f, [UserStats(out, **kwargs)])
+    return out.getvalue().splitlines(keepends=True)
+
+
+def test_user_stats(tmp_path):
+    pages = make_pages()
+    lines = run_user_stats(tmp_path, pages)
+    assert parse(lines) == expected_stats(pages)
+
+
+def test_user_stats_spilled(tmp_path):
+    pages = make_pages()
+    lines = run_user_stats(tmp_path, pages, max_users=5,
+            tmp_dir=str(tmp_path))
+    # Users are sorted by key, and the runs are removed.
+    keys = [line.split("#", 1)[0] for line in lines]
+    assert keys == sorted(keys)
+    assert parse(lines) == expected_stats(pages)
+    assert not list(tmp_path.glob("*.run"))
+
+
+def test_merge_user_lines():
+    runs = [["r1#Old#10#20#2#1\n", "r2#B#5#5#1#1\n"],
+            ["r1#New#15#30#3#2\n", "u1.2.3.4#-#1#1#1#1\n"],
+            ["r0|X#X#7#7#1#1\n"]]
+    runs = [sorted(run) for run in runs]
+    assert list(merge_user_lines(runs)) == ["r0|X#X#7#7#1#1\n",
+            "r1#New#10#30#5#3\n", "r2#B#5#5#1#1\n", "u1.2.3.4#-#1#1#1#1\n"]
@@ -0,0 +1,44 @@
+import argparse
+import json
+
+import numpy as np
+
+import convert_ores
+from interank.wikidata import WikiData
+
+
+def score(prob):
+    return {"score": {"prediction": prob > 0.5,
+            "probability": {"true": prob, "false": 1 - prob}}}
+
+
+def test_convert(tmp_path):
+    with open(tmp_path / "metadata.json", "w") as f:
+        json.dump({"n_users": 1, "n_articles": 1}, f)
+    # The raw test set is not sorted by edit ID.
+    eids = [30, 10, 20, 40]
+    with open(tmp_path / "raw-test.txt", "w") as f:
+        for eid in eids:
+            f.write("{}#1200000000#1#r1#0.5#1#1#2#10\n".format(eid))
+    chunks = [
+        {"10": {m: score(0.1) for m in convert_ores.MODELS},
+                "99": {m: score(0.9) for m in convert_ores.MODELS}},
+        {"30": {"damaging": score(0.3), "goodfaith": score(0.7),
+                "reverted": {"error": {"type": "TextDeleted"}}}},
+        {"40": {m: score(0.4) for m in convert_ores.MODELS}},
+    ]
+    paths = list()
+    for i, part in enumerate([chunks[:2], chunks[2:]]):
+        path = str(tmp_path / "ores{}.txt".format(i))
+        with open(path, "w") as f:
+            f.writelines(json.dumps(chunk) + "\n" for chunk in part)
+        paths.append(path)
+    convert_ores.main(argparse.Namespace(ores_files=paths,
+            dataset_dir=str(tmp_path), raw="raw-test.txt"))
+    damaging, goodfaith, reverted, mask = WikiData(
+            str(tmp_path)).get_ores_scores()
+    np.testing.assert_allclose(damaging, [0.3, 0.1, np.nan, 0.4])
+    np.testing.assert_allclose(goodfaith, [0.7, 0.1, np.nan, 0.4])
+    np.testing.assert_allclose(reverted, [np.nan, 0.1, np.nan, 0.4])
+    assert mask.tolist() == [False, True, False, True]
+    assert damaging.dtype == np.float32
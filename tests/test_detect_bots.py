@@ -0,0 +1,51 @@
+import argparse
+
+import detect_bots
+from conftest import write_xml
+from interank.dumpindex import DumpIndex
+
+
+TEXTS = {
+    "User:PlainBot": "This is a bot. {{bot}}",
+    "User:OwnedBot": "{{Bot|Alice|site=fr}} Runs daily.",
+    "User:NestedBot": "{{bot|{{user|Bob}}|tasks}} Text.",
+    "User:Human": "Not a {{user}} bot.",
+}
+
+
+def make_pages():
+    pages = list()
+    rev_id = 1
+    for i in range(40):
+        title = sorted(TEXTS)[i % 4] + ("" if i < 4 else str(i))
+        text = TEXTS[sorted(TEXTS)[i % 4]]
+        ns = 2 if i % 3 else 0
+        revisions = [(rev_id, 1200000000, 1, "old text"),
+                (rev_id + 1, 1200100000, 1, text)]
+        rev_id += 2
+        pages.append((i + 1, title, ns, revisions))
+    return pages
+
+
+def read_bots(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def test_sequential_and_parallel(tmp_path):
+    xml_file = str(tmp_path / "dump.xml")
+    write_xml(xml_file, make_pages())
+    args = argparse.Namespace(xml_file=xml_file, bots=str(tmp_path / "a"),
+            bz2_processes=None, processes=1, index=None)
+    detect_bots.main(args)
+    sequential = read_bots(args.bots)
+    # Only user pages (every page whose index is not a multiple of 3).
+    assert sequential[:4] == ["NestedBot#{{user|Bob}}|tasks",
+            "OwnedBot#Alice|site=fr", "NestedBot5#{{user|Bob}}|tasks",
+            "PlainBot7#-"]
+    assert len(sequential) == 20
+    assert not any(line.startswith("Human") for line in sequential)
+    DumpIndex.build(xml_file).save(xml_file + ".index.npz")
+    args.bots, args.processes = str(tmp_path / "b"), 3
+    detect_bots.main(args)
+    assert read_bots(args.bots) == sequential
@@ -0,0 +1,164 @@
+import io
+
+from interank.consumers import Consumer, process_dump
+from interank.dump import is_disambiguation, iter_pages, parse_timestamp
+
+
+DUMP = """<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/" version="0.10">
+  <siteinfo>
+    <sitename>Test</sitename>
+  </siteinfo>
+  <page>
+    <title>Article</title>
+    <ns>0</ns>
+    <id>1</id>
+    <revision>
+      <id>10</id>
+      <timestamp>2010-01-02T03:04:05Z</timestamp>
+      <contributor>
+        <username>Alice</username>
+        <id>7</id>
+      </contributor>
+      <text xml:space="preserve">Some &lt;b&gt;text</text>
+    </revision>
+    <revision>
+      <id>11</id>
+      <timestamp>2010-01-03T00:00:00Z</timestamp>
+      <contributor>
+        <ip>1.2.3.4</ip>
+      </contributor>
+      <text xml:space="preserve" />
+    </revision>
+    <revision>
+      <id>12</id>
+      <timestamp>2010-01-04T00:00:00Z</timestamp>
+      <contributor deleted="deleted" />
+      <text deleted="deleted" />
+    </revision>
+  </page>
+  <page>
+    <title>Talk:Article</title>
+    <ns>1</ns>
+    <id>2</id>
+    <revision>
+      <id>20</id>
+      <timestamp>2010-01-05T00:00:00Z</timestamp>
+      <contributor>
+        <username>Imported</username>
+        <id>0</id>
+      </contributor>
+      <text xml:space="preserve">Talk</text>
+    </revision>
+  </page>
+  <page>
+    <title>Redirect</title>
+    <ns>0</ns>
+    <id>3</id>
+    <redirect title="Article" />
+    <revision>
+      <id>30</id>
+      <timestamp>2010-01-06T00:00:00Z</timestamp>
+      <contributor>
+        <username>Alice</username>
+        <id>7</id>
+      </contributor>
+      <text xml:space="preserve">#REDIRECT [[Article]]</text>
+    </revision>
+  </page>
+  <page>
+    <title>Mercury</title>
+    <ns>0</ns>
+    <id>4</id>
+    <revision>
+      <id>40</id>
+      <timestamp>2010-01-07T00:00:00Z</timestamp>
+      <contributor>
+        <username>Bob</username>
+        <id>8</id>
+      </contributor>
+      <text xml:space="preserve">Mercury may refer to: {{disambig}}</text>
+    </revision>
+  </page>
+</mediawiki>
+"""
+
+
+def read(**kwargs):
+    f = io.BytesIO(DUMP.encode())
+    return [(page.id, page.ns, page.title, page.redirect, [(rev.id,
+            rev.timestamp, rev.contributor, rev.username, rev.text)
+            for rev in revisions]) for page, revisions in iter_pages(f,
+            **kwargs)]
+
+
+def test_iter_pages():
+    pages = read()
+    assert [page[:4] for page in pages] == [(1, 0, "Article", False),
+            (2, 1, "Talk:Article", False), (3, 0, "Redirect", True),
+            (4, 0, "Mercury", False)]
+    assert pages[0][4] == [
+            (10, parse_timestamp("2010-01-02T03:04:05Z"), "r7", "Alice",
+                    "Some <b>text"),
+            (11, 1262476800, "u1.2.3.4", "-", None),
+            (12, 1262563200, None, None, None)]
+    assert pages[1][4][0][2:4] == ("r0|Imported", "Imported")
+
+
+def test_filters():
+    assert [page[0] for page in read(namespaces={1})] == [2]
+    assert all(rev[4] is None for page in read(text=False)
+            for rev in page[4])
+    # Texts of a set of namespaces only.
+    texts = {page[0]: page[4][0][4] for page in read(text={1})}
+    assert texts == {1: None, 2: "Talk", 3: None, 4: None}
+
+
+def test_is_disambiguation():
+    assert is_disambiguation([None, "x {{disambig}}"])
+    assert is_disambiguation(["{{Homonymie}}"])
+    assert not is_disambiguation(["{{Homonymie}}"], lang=["simple", "en"])
+    assert not is_disambiguation(["text"], lang="tr")
+
+
+class Recorder(Consumer):
+
+    def __init__(self, namespaces, text):
+        self.namespaces = namespaces
+        self.text = text
+        self.events = list()
+        self.closed = False
+
+    def start_page(self, page):
+        self.events.append(("start", page.id))
+
+    def add_revision(self, rev):
+        self.events.append(("rev", rev.id, rev.text is not None))
+
+    def end_page(self, page):
+        self.events.append(("end", page.id))
+
+    def close(self):
+        self.closed = True
+
+
+def test_process_dump():
+    articles = Recorder({0}, text=False)
+    talk = Recorder({1}, text=True)
+    everything = Recorder(None, text=False)
+    process_dump(io.BytesIO(DUMP.encode()), [articles, talk, everything])
+    # Texts are only kept for the consumer that needs them.
+    assert articles.events[:3] == [("start", 1), ("rev", 10, False),
+            ("rev", 11, False)]
+    assert talk.events == [("start", 2), ("rev", 20, True), ("end", 2)]
+    assert [e[1] for e in everything.events if e[0] == "start"] == [
+            1, 2, 3, 4]
+    assert articles.closed and talk.closed and everything.closed
+
+
+def test_process_dump_without_redirects_and_disambiguation():
+    articles = Recorder({0}, text=False)
+    process_dump(io.BytesIO(DUMP.encode()), [articles],
+            include_redirects=False, include_disambiguation=False)
+    # Detecting disambiguation pages needs the texts of the articles.
+    assert articles.events == [("start", 1), ("rev", 10, True),
+            ("rev", 11, False), ("rev", 12, False), ("end", 1)]
@@ -0,0 +1,100 @@
+import argparse
+import bz2
+import io
+import random
+import threading
+
+import pytest
+
+import index_dump
+from interank.dump import iter_pages
+from interank.dumpindex import DumpIndex
+
+
+HEADER = """<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/" version="0.10">
+  <siteinfo>
+    <sitename>Test</sitename>
+  </siteinfo>
+"""
+
+PAGE = """  <page>
+    <title>Page {page_id}</title>
+    <ns>0</ns>
+    <id>{page_id}</id>
+    <revision>
+      <id>{rev_id}</id>
+      <timestamp>2010-01-01T00:00:00Z</timestamp>
+      <contributor>
+        <username>User</username>
+        <id>1</id>
+      </contributor>
+      <text xml:space="preserve">{text}</text>
+    </revision>
+  </page>
+"""
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "consectetur", "elit"]
+
+
+def write_dump(path, n_pages, seed=0):
+    """Write a bz2 dump made of many small blocks."""
+    rng = random.Random(seed)
+    parts = [HEADER]
+    for page_id in range(1, n_pages + 1):
+        text = " ".join(rng.choice(WORDS) + str(rng.randrange(1000))
+                for _ in range(rng.randrange(500, 2000)))
+        parts.append(PAGE.format(page_id=page_id, rev_id=1000 + page_id,
+                text=text))
+    parts.append("</mediawiki>\n")
+    with open(path, "wb") as f:
+        # Level 1 means blocks of 100 kB.
+        f.write(bz2.compress("".join(parts).encode(), 1))
+
+
+def read_range(index, path, start, stop, processes):
+    with index.open_range(path, start, stop, processes=processes) as f:
+        return f.read()
+
+
+def test_sharded_bz2_range_with_processes(tmp_path):
+    path = str(tmp_path / "dump.xml.bz2")
+    write_dump(path, n_pages=200)
+    index = DumpIndex.build(path)
+    assert len(index.block_bits) > 10
+    shards = index.shards(4)
+    expected = [read_range(index, path, start, stop, None)
+            for start, stop in shards]
+    results = dict()
+
+    def run():
+        # Reading a range stops before the end of the file, so that the
+        # reader is closed while blocks are still being decompressed.
+        for _ in range(3):
+            for i, (start, stop) in enumerate(shards):
+                results[i] = read_range(index, path, start, stop, 2)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=120)
+    assert not thread.is_alive(), "reading a range of the dump hangs"
+    assert [results[i] for i in range(len(shards))] == expected
+    page_ids = list()
+    for start, stop in shards:
+        with index.open_range(path, start, stop, processes=2) as f:
+            page_ids.extend(page.id for page, _ in iter_pages(f))
+    assert page_ids == list(range(1, 201))
+
+
+def test_extract(tmp_path, capsysbinary):
+    path = str(tmp_path / "dump.xml.bz2")
+    write_dump(path, n_pages=20)
+    args = argparse.Namespace(xml_file=path, index=None, bz2_processes=None,
+            page=7)
+    index_dump.build(args)
+    index_dump.extract(args)
+    pages = list(iter_pages(io.BytesIO(capsysbinary.readouterr().out)))
+    assert [page.id for page, _ in pages] == [7]
+    args.page = 21
+    with pytest.raises(SystemExit) as info:
+        index_dump.extract(args)
+    assert "page 21 is not in the index" in str(info.value)
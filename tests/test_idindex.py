@@ -0,0 +1,75 @@
+import os
+
+import numpy as np
+import pytest
+
+from interank.idindex import IdIndex
+
+
+def write_users(path, keys):
+    with open(str(path), "w") as f:
+        for idx, key in enumerate(keys):
+            f.write("{}#{}#name#0#0#1#1\n".format(idx, key))
+    return str(path)
+
+
+def test_lookup(tmp_path):
+    path = write_users(tmp_path / "users.txt", ["r1", "u1.2.3.4", "r2"])
+    index = IdIndex.build(path)
+    assert len(index) == 3
+    assert index.max_id == 2
+    res = index.lookup(["r2", "r3", "u1.2.3.4", "r1"])
+    assert res.tolist() == [2, -1, 1, 0]
+    assert index.get("r1") == 0
+    assert index.get("r3") is None
+    assert index.get("r3", -1) == -1
+
+
+def test_duplicates(tmp_path):
+    path = write_users(tmp_path / "users.txt", ["r1", "r2", "r1", "r3"])
+    index = IdIndex.build(path)
+    assert len(index) == 3
+    assert index.lookup(["r1", "r2", "r3"]).tolist() == [2, 1, 3]
+
+
+def test_empty(tmp_path):
+    path = write_users(tmp_path / "users.txt", [])
+    index = IdIndex.build(path)
+    assert len(index) == 0
+    assert index.max_id == -1
+    assert index.lookup(["r1"]).tolist() == [-1]
+
+
+def test_save_load(tmp_path):
+    path = write_users(tmp_path / "users.txt", ["r{}".format(i)
+            for i in range(100)])
+    IdIndex.build(path).save(path)
+    # No temporary file is left behind.
+    assert sorted(os.listdir(str(tmp_path))) == [
+            "users.index.npy", "users.txt"]
+    index = IdIndex.load(path)
+    assert index.lookup(["r42", "r100"]).tolist() == [42, -1]
+
+
+def test_for_file(tmp_path):
+    path = write_users(tmp_path / "users.txt", ["r1", "r2"])
+    index_path = IdIndex.index_path(path)
+    assert index_path == str(tmp_path / "users.index.npy")
+    assert IdIndex.for_file(path).get("r2") == 1
+    assert os.path.exists(index_path)
+    # An up-to-date index is loaded rather than rebuilt.
+    records = np.load(index_path)
+    records["id"] = 7
+    np.save(index_path, records)
+    assert IdIndex.for_file(path).get("r2") == 7
+    # An outdated index is rebuilt.
+    write_users(tmp_path / "users.txt", ["r2", "r1"])
+    stat = os.stat(index_path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert IdIndex.for_file(path).get("r2") == 0
+    assert IdIndex.load(path).get("r2") == 0
+
+
+def test_missing_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        IdIndex.for_file(str(tmp_path / "users.txt"))
@@ -0,0 +1,38 @@
+import json
+import subprocess
+import sys
+
+from conftest import ROOT
+
+
+# Time budget of the imports, in seconds (importing NumPy dominates).
+IMPORT_BUDGET = 2.0
+
+SCRIPT = """
+import json
+import sys
+import time
+sys.path.insert(0, {lib!r})
+start = time.perf_counter()
+import interank
+from interank.wikidata import WikiData
+elapsed = time.perf_counter() - start
+from interank.models import get_model
+Model = get_model("dot", backend="numpy")
+model = Model(n_users=10, n_articles=5, n_dims=2)
+print(json.dumps({{"elapsed": elapsed,
+        "tensorflow": "tensorflow" in sys.modules}}))
+"""
+
+
+def run_isolated(script):
+    """Run a script in a fresh interpreter, and return its JSON output."""
+    res = subprocess.run([sys.executable, "-c", script],
+            capture_output=True, text=True, check=True)
+    return json.loads(res.stdout)
+
+
+def test_import_does_not_load_tensorflow():
+    res = run_isolated(SCRIPT.format(lib=ROOT + "/lib"))
+    assert not res["tensorflow"]
+    assert res["elapsed"] < IMPORT_BUDGET
@@ -0,0 +1,76 @@
+import argparse
+import collections
+import io
+
+import numpy as np
+import pytest
+
+import make_batch
+from conftest import write_xml
+from interank.dump import iter_pages
+from interank.dumpindex import DumpIndex
+
+
+def make_pages(n_pages=60):
+    pages = list()
+    for i in range(1, n_pages + 1):
+        # Every fifth page is a talk page.
+        ns = 1 if i % 5 == 0 else 0
+        pages.append((i, "Page {}".format(i), ns,
+                [(i, 1200000000, 1, "text of page {}".format(i))]))
+    return pages
+
+
+def make_args(tmp_path, **kwargs):
+    args = dict(xml_file=str(tmp_path / "dump.xml"),
+            out=str(tmp_path / "out.xml"), full=False, count=None,
+            prob=None, seed=1, processes=1, index=None, tmp_dir=None,
+            bz2_processes=None)
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+
+def sampled_ids(path):
+    with open(path, "rb") as f:
+        return [page.id for page, _ in iter_pages(f)]
+
+
+@pytest.mark.parametrize("processes", [1, 3])
+def test_reservoir(tmp_path, processes):
+    write_xml(str(tmp_path / "dump.xml"), make_pages())
+    DumpIndex.build(str(tmp_path / "dump.xml")).save(
+            str(tmp_path / "dump.xml.index.npz"))
+    args = make_args(tmp_path, count=10, processes=processes)
+    make_batch.main(args)
+    ids = sampled_ids(args.out)
+    assert len(ids) == len(set(ids)) == 10
+    # Only articles, in dump order.
+    assert all(i % 5 for i in ids) and ids == sorted(ids)
+    make_batch.main(args)
+    assert sampled_ids(args.out) == ids
+    args.seed = 2
+    make_batch.main(args)
+    assert sampled_ids(args.out) != ids
+
+
+def test_bernoulli(tmp_path):
+    write_xml(str(tmp_path / "dump.xml"), make_pages())
+    args = make_args(tmp_path, prob=0.5)
+    make_batch.main(args)
+    ids = sampled_ids(args.out)
+    assert 0 < len(ids) < 48 and all(i % 5 for i in ids)
+    args.count = 3
+    make_batch.main(args)
+    assert len(sampled_ids(args.out)) == 3
+
+
+def test_reservoir_is_uniform():
+    pages = [(0, False, str(i).encode()) for i in range(10)]
+    counts = collections.Counter()
+    rng = np.random.default_rng(0)
+    for _ in range(2000):
+        _, slots = make_batch.sample_reservoir(pages, 3, rng, io.BytesIO())
+        counts.update(position for position, _, _ in slots)
+    # Each page is kept with probability 0.3, i.e., about 600 times.
+    assert sorted(counts) == list(range(10))
+    assert all(500 < n < 700 for n in counts.values())
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from interank import metrics
+
+
+LABELS = np.array([1, 0, 1, 1, 0, 0, 0])
+SCORES = np.array([0.9, 0.8, 0.7, 0.7, 0.3, 0.2, 0.1])
+
+
+def test_precision_recall_curve():
+    precision, recall, thresholds = metrics.precision_recall_curve(
+            LABELS, SCORES)
+    # The curve stops at threshold 0.7, which reaches full recall.
+    np.testing.assert_allclose(precision, [0.75, 0.5, 1, 1])
+    np.testing.assert_allclose(recall, [1, 1 / 3, 1 / 3, 0])
+    np.testing.assert_allclose(thresholds, [0.7, 0.8, 0.9])
+
+
+def test_average_precision():
+    sklearn_metrics = pytest.importorskip("sklearn.metrics")
+    rng = np.random.RandomState(0)
+    y_true = rng.rand(1000) < 0.3
+    y_score = np.round(rng.rand(1000) + 0.3 * y_true, 2)
+    weights = rng.rand(1000)
+    assert metrics.average_precision(y_true, y_score) == pytest.approx(
+            sklearn_metrics.average_precision_score(y_true, y_score))
+    assert metrics.average_precision(y_true, y_score, weights) == (
+            pytest.approx(sklearn_metrics.average_precision_score(
+                    y_true, y_score, sample_weight=weights)))
+
+
+@pytest.mark.parametrize("metric", metrics.METRICS)
+def test_bootstrap(metric):
+    rng = np.random.RandomState(0)
+    y_true = (rng.rand(500) < 0.3).astype(np.float32)
+    y_pred = np.clip(0.3 + 0.4 * (y_true - 0.3) + 0.2 * rng.randn(500),
+            0.01, 0.99).astype(np.float32)
+    # Memory-mapped datasets are 32-bit, they give the same replicates.
+    replicates = metrics.bootstrap_replicates(metric, y_true, [y_pred],
+            n_replicates=20, processes=2, seed=1)
+    expected = metrics.bootstrap_replicates(metric,
+            y_true.astype(np.float64), [y_pred.astype(np.float64)],
+            n_replicates=20, processes=2, seed=1)
+    np.testing.assert_allclose(replicates, expected)
+    estimate, low, high = metrics.bootstrap_ci(metric, y_true, y_pred,
+            n_replicates=200, seed=1)
+    assert low < estimate < high
+    diff, low, high = metrics.paired_bootstrap_ci(metric, y_true, y_pred,
+            y_pred, n_replicates=20, seed=1)
+    assert diff == low == high == 0
@@ -0,0 +1,88 @@
+"""Tests of the TensorFlow models, which need TensorFlow 1.x."""
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow")
+if not hasattr(tf, "placeholder"):
+    pytest.skip("the models need TensorFlow 1.x", allow_module_level=True)
+
+from interank.models import BasicModel, DotModel
+from interank.scoring import Scorer
+from interank.vocabulary import frequency_vocabulary
+
+
+N_USERS = 50
+N_ARTICLES = 20
+
+
+def make_data(n_edits, seed):
+    rng = np.random.RandomState(seed)
+    return (rng.randint(N_USERS, size=n_edits),
+            rng.randint(N_ARTICLES, size=n_edits),
+            rng.rand(n_edits))
+
+
+def fit(session, model, data, n_steps=50):
+    train_op = tf.train.AdamOptimizer(0.1).minimize(-model.log_likelihood)
+    session.run(tf.global_variables_initializer())
+    feed = {model.user_id: data[0], model.article_id: data[1],
+            model.quality: data[2]}
+    for _ in range(n_steps):
+        session.run(train_op, feed_dict=feed)
+
+
+@pytest.mark.parametrize("model_class", [BasicModel, DotModel])
+def test_staged_data_match_fed_data(model_class):
+    train, test = make_data(500, 0), make_data(100, 1)
+    with tf.Graph().as_default(), tf.Session() as session:
+        kwargs = {"n_dims": 3} if model_class is DotModel else dict()
+        model = model_class(n_users=N_USERS, n_articles=N_ARTICLES, **kwargs)
+        fit(session, model, train)
+        model.stage(session, train=train, test=test)
+        fed = session.run(model.probability, feed_dict={
+                model.user_id: test[0], model.article_id: test[1]})
+        staged = session.run(model.probability,
+                feed_dict=model.staged_feed("test"))
+        np.testing.assert_allclose(staged, fed, rtol=1e-6)
+        idx = np.array([5, 0, 42])
+        batch = session.run(model.probability,
+                feed_dict=model.staged_feed("test", idx))
+        np.testing.assert_allclose(batch, fed[idx], rtol=1e-6)
+        loss = session.run(model.avg_log_loss,
+                feed_dict=model.staged_feed("train"))
+        assert np.isfinite(loss)
+
+
+def test_vocabulary(tmp_path):
+    train = make_data(500, 0)
+    counts = np.bincount(train[0], minlength=N_USERS)
+    vocabulary = frequency_vocabulary(counts, min_edits=np.median(counts),
+            n_buckets=4)
+    with tf.Graph().as_default() as graph, tf.Session() as session:
+        model = DotModel(n_users=N_USERS, n_articles=N_ARTICLES, n_dims=3,
+                vocabulary=vocabulary)
+        assert model.skill.shape[0] == vocabulary.n_rows
+        # The mapping of the users is not embedded in the graph.
+        for op in graph.get_operations():
+            if op.type == "Const":
+                assert op.get_attr("value").ByteSize() < 4 * N_USERS
+        with pytest.raises(tf.errors.FailedPreconditionError):
+            fit(session, model, train, n_steps=1)
+        train_op = tf.train.AdamOptimizer(0.1).minimize(-model.log_likelihood)
+        session.run(tf.global_variables_initializer())
+        model.load_vocabulary(session)
+        feed = {model.user_id: train[0], model.article_id: train[1],
+                model.quality: train[2]}
+        for _ in range(20):
+            session.run(train_op, feed_dict=feed)
+        probs = session.run(model.probability, feed_dict=feed)
+        path = str(tmp_path / "params.npz")
+        model.export(session, path)
+    # Users that share a row get the same predictions.
+    shared = np.flatnonzero(vocabulary.rows == vocabulary.n_dedicated)
+    if len(shared) > 1:
+        aid = np.zeros(len(shared), dtype=int)
+        np.testing.assert_allclose(Scorer(path).score(shared, aid),
+                Scorer(path).score(shared[:1].repeat(len(shared)), aid))
+    np.testing.assert_allclose(Scorer(path).score(train[0], train[1]), probs,
+            rtol=1e-5)
@@ -0,0 +1,73 @@
+import io
+import os
+import threading
+
+import pytest
+
+from interank import pipeline
+
+
+def write(text):
+    def function(inputs, outputs):
+        with open(outputs[0], "w") as f:
+            f.write(text)
+    return function
+
+
+def test_small_jobs_run_while_a_large_one_waits(tmp_path):
+    started = threading.Event()
+
+    def wait_for_small(inputs, outputs):
+        # Only returns if `small` starts while this job is running.
+        assert started.wait(timeout=30)
+        write("a")(inputs, outputs)
+
+    def small(inputs, outputs):
+        started.set()
+        write("c")(inputs, outputs)
+
+    jobs = [pipeline.Job("a", [], [str(tmp_path / "a")],
+                    function=wait_for_small),
+            pipeline.Job("large", [], [str(tmp_path / "b")],
+                    function=write("b"), cpus=2),
+            pipeline.Job("small", [], [str(tmp_path / "c")], function=small)]
+    pipeline.run(jobs, cpus=2, log=io.StringIO())
+    for name in "abc":
+        assert (tmp_path / name).read_text() == name
+
+
+def test_dependencies_and_up_to_date_jobs(tmp_path):
+    def concat(inputs, outputs):
+        with open(outputs[0], "w") as out:
+            for path in inputs:
+                with open(path) as f:
+                    out.write(f.read())
+
+    a, b, ab = (str(tmp_path / name) for name in ("a", "b", "ab"))
+    jobs = [pipeline.Job("ab", [a, b], [ab], function=concat),
+            pipeline.Job("a", [], [a], function=write("x")),
+            pipeline.Job("b", [], [b], function=write("y"))]
+    pipeline.run(jobs, cpus=2, log=io.StringIO())
+    assert open(ab).read() == "xy"
+    log = io.StringIO()
+    pipeline.run(jobs, cpus=2, log=log)
+    assert log.getvalue().count("up to date") == 3
+
+
+def test_failures(tmp_path):
+    attempts = list()
+
+    def fail(inputs, outputs):
+        attempts.append(1)
+        with open(outputs[0], "w") as f:
+            f.write("partial")
+        raise OSError("failure")
+
+    a, b = str(tmp_path / "a"), str(tmp_path / "b")
+    jobs = [pipeline.Job("a", [], [a], function=fail),
+            pipeline.Job("b", [a], [b], function=write("b"))]
+    with pytest.raises(RuntimeError, match="a, b"):
+        pipeline.run(jobs, retries=1, log=io.StringIO())
+    assert len(attempts) == 2
+    # Partial outputs are removed.
+    assert os.listdir(str(tmp_path)) == list()
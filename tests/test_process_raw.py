@@ -0,0 +1,61 @@
+import argparse
+
+import numpy as np
+import pytest
+
+import process_raw
+
+
+QUALITIES = """//dump.xml
+10#1200000300#100#r1#0.5#3#10#13#10
+11#1200000100#200#r2#-1.0#2#13#11#10
+12#1200000200#100#u1.2.3.4#1.0#1#11#12#10
+13#1200000400#200#r1#0.0#1#12#13#1
+14#1200000000#100#r2#-0.5#4#13#17#5#1
+"""
+
+
+def write_inputs(tmp_path, qualities=QUALITIES):
+    with open(tmp_path / "users.txt", "w") as f:
+        f.write("0#r1#1#User1\n1#r2#1#User2\n")
+    with open(tmp_path / "articles.txt", "w") as f:
+        f.write("0#100#Page 100\n1#200#Page 200\n")
+    with open(tmp_path / "raw.txt", "w") as f:
+        f.write(qualities)
+
+
+def make_args(tmp_path, **kwargs):
+    args = dict(path=str(tmp_path / "raw.txt"),
+            users=str(tmp_path / "users.txt"),
+            articles=str(tmp_path / "articles.txt"),
+            output_dir=str(tmp_path / "out"), ignore_less_than=2,
+            threshold=None)
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+
+def load(tmp_path, name):
+    return [np.load(str(tmp_path / "out" / "{}.{}.npy".format(name, col)))
+            for col, _ in process_raw.COLUMNS]
+
+
+def test_build_dataset(tmp_path):
+    write_inputs(tmp_path)
+    process_raw.build_dataset(make_args(tmp_path, threshold=1200000250))
+    uid, aid, q, ts = load(tmp_path, "train")
+    # Sorted by timestamp, without the anonymous user and the edit with a
+    # single judge.
+    assert ts.tolist() == [1200000000, 1200000100]
+    assert uid.tolist() == [1, 1]
+    assert aid.tolist() == [0, 1]
+    np.testing.assert_allclose(q, [0.25, 0.0])
+    uid, aid, q, ts = load(tmp_path, "test")
+    assert (uid.tolist(), aid.tolist(), ts.tolist()) == (
+            [0], [0], [1200000300])
+    assert uid.dtype == np.int32 and q.dtype == np.float32
+
+
+def test_unknown_article(tmp_path):
+    write_inputs(tmp_path, QUALITIES + "15#1200000500#300#r1#0.5#1#1#2#10\n")
+    with pytest.raises(KeyError):
+        process_raw.build_dataset(make_args(tmp_path))
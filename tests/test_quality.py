@@ -0,0 +1,213 @@
+import argparse
+import array
+import random
+
+import pytest
+
+import compute_quality
+from conftest import write_xml
+from interank.quality import (QualityState, WindowDistances, _edit_distance,
+        bit_parallel_distance, common_prefix_length, common_suffix_length,
+        distance, process_edit)
+from interank.shards import QUALITY_SCHEMA, ShardReader, ShardWriter
+
+
+def make_pages(n_pages=3, n_revisions=25, seed=0):
+    rng = random.Random(seed)
+    pages = list()
+    rev_id = 1
+    for page_id in range(1, n_pages + 1):
+        words = ["w{}".format(rng.randrange(50)) for _ in range(40)]
+        revisions = list()
+        for i in range(n_revisions):
+            j = rng.randrange(len(words))
+            if rng.random() < 0.5:
+                words.insert(j, "w{}".format(rng.randrange(50)))
+            else:
+                del words[j]
+            revisions.append((rev_id, 1200000000 + 86400 * i,
+                    1 + rng.randrange(5), " ".join(words)))
+            rev_id += 1
+        pages.append((page_id, "Page {}".format(page_id), 0, revisions))
+    return pages
+
+
+def make_args(xml_file, **kwargs):
+    args = dict(xml_file=xml_file, processes=1, threshold=None, unit="chars",
+            bz2_processes=None, previous_state=None, previous_output=None,
+            save_state=None, approx_cutoff=None, approx_k=1000, shards=None,
+            shard_rows=1 << 20, overwrite=False)
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+
+def test_clamped_approximate_quality():
+    # Chunked bounds do not satisfy the triangle inequality: unclamped, the
+    # judge would contribute (102 - 100) / 1.
+    prev = "P\n" + "ab" * 50
+    final = "Q\n" + "ab" * 50
+    upcoming = "Q\n" + "ba" * 50
+    row = process_edit(1, "r1", 1, 0, prev, final, [upcoming], [1], None,
+            approx=(5, 0))
+    assert row[4] == 1.0
+    assert row[5] == 1
+    assert row[9] == 1
+
+
+def test_state_round_trip(tmp_path):
+    state = QualityState(1300000000, "words", (100, 10))
+    state.articles[3] = (42, b"\x01\x02")
+    with open(tmp_path / "state", "w") as f:
+        state.save(f)
+    with open(tmp_path / "state") as f:
+        loaded = QualityState.load(f)
+    assert (loaded.threshold, loaded.unit, loaded.approx) == (
+            1300000000, "words", (100, 10))
+    assert loaded.articles == state.articles
+    # States saved before the approximate mode.
+    with open(tmp_path / "old", "w") as f:
+        f.write("//-#chars\n3#42#0102\n")
+    with open(tmp_path / "old") as f:
+        loaded = QualityState.load(f)
+    assert (loaded.threshold, loaded.unit, loaded.approx) == (
+            None, "chars", None)
+
+
+def test_resume(tmp_path, capsys):
+    xml_file = str(tmp_path / "dump.xml")
+    write_xml(xml_file, make_pages())
+    state = str(tmp_path / "state")
+    compute_quality.main(make_args(xml_file, save_state=state))
+    full = capsys.readouterr().out
+    assert len(full.splitlines()) > 50
+    with open(tmp_path / "out.txt", "w") as f:
+        f.write(full)
+    compute_quality.main(make_args(xml_file, previous_state=state,
+            previous_output=str(tmp_path / "out.txt")))
+    resumed = capsys.readouterr().out
+    assert sorted(resumed.splitlines()) == sorted(full.splitlines())
+
+
+@pytest.mark.parametrize("shards", [False, True])
+def test_resume_in_another_mode(tmp_path, capsys, shards):
+    xml_file = str(tmp_path / "dump.xml")
+    write_xml(xml_file, make_pages())
+    state = str(tmp_path / "state")
+    previous = str(tmp_path / "previous")
+    if shards:
+        compute_quality.main(make_args(xml_file, save_state=state,
+                shards=previous))
+    else:
+        compute_quality.main(make_args(xml_file, save_state=state))
+        with open(previous, "w") as f:
+            f.write(capsys.readouterr().out)
+    output = str(tmp_path / "output")
+    with pytest.raises(ValueError):
+        compute_quality.main(make_args(xml_file, previous_state=state,
+                previous_output=previous, approx_cutoff=100,
+                shards=output if shards else None, overwrite=True))
+    # Nothing was written.
+    assert capsys.readouterr().out == ""
+    if shards:
+        assert len(ShardReader(previous).paths) == 1
+
+
+def test_shard_writer_rejects_rows_of_other_length(tmp_path):
+    writer = ShardWriter(str(tmp_path / "shards"), schema=QUALITY_SCHEMA)
+    with pytest.raises(ValueError):
+        writer.writerow((1, 1200000000, 3, "r1", 0.5, 1, 10, 11, 10, 0))
+    writer.writerow((1, 1200000000, 3, "r1", 0.5, 1, 10, 11, 10))
+    writer.close()
+    assert writer.n_rows == 1
+
+
+def levenshtein(s1, s2):
+    row = list(range(len(s2) + 1))
+    for i, c1 in enumerate(s1, 1):
+        prev, row[0] = row[0], i
+        for j, c2 in enumerate(s2, 1):
+            prev, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1,
+                    prev + (c1 != c2))
+    return row[-1]
+
+
+@pytest.mark.parametrize("vocabulary", [20, 300, 2000])
+def test_word_distances(vocabulary):
+    rng = random.Random(vocabulary)
+    for _ in range(20):
+        s1 = array.array("l", [rng.randrange(vocabulary)
+                for _ in range(rng.randrange(400))])
+        s2 = array.array("l", s1)
+        for _ in range(rng.randrange(30)):
+            i = rng.randrange(len(s2) + 1)
+            s2[i:i + rng.randrange(3)] = array.array("l",
+                    [rng.randrange(3 * vocabulary)
+                    for _ in range(rng.randrange(3))])
+        expected = levenshtein(s1, s2)
+        assert distance(s1, s2) == expected
+        assert bit_parallel_distance(s1, s2) == expected
+        assert _edit_distance(s1, s2, expected) == expected
+        if expected > 0:
+            assert _edit_distance(s1, s2, expected - 1) == -1
+
+
+def test_affixes():
+    assert common_prefix_length("abcdef", "abcxef") == 3
+    assert common_prefix_length("abc", "abcdef") == 3
+    assert common_prefix_length("", "abc") == 0
+    assert common_suffix_length("abcdef", "abxdef", 10) == 3
+    # The suffix does not overlap the prefix.
+    assert common_suffix_length("aaaa", "aa", 1) == 1
+
+
+def test_char_distances():
+    rng = random.Random(0)
+    for _ in range(50):
+        s1 = "".join(rng.choice("abc\n") for _ in range(rng.randrange(200)))
+        s2 = list(s1)
+        for _ in range(rng.randrange(10)):
+            i = rng.randrange(len(s2) + 1)
+            s2[i:i + rng.randrange(3)] = rng.choice(["", "x", "ab"])
+        s2 = "".join(s2)
+        assert distance(s1, s2) == levenshtein(s1, s2)
+
+
+def test_window_distances():
+    texts = ["a b c", "a b c d", "a b c", "a x c d"]
+    dist = WindowDistances(texts)
+    # A revert restores an identical text.
+    assert dist(0, 2) == 0
+    assert dist(1, 2) == dist(0, 1) == 2
+    assert dist(1, 3) == 1
+    # Both pairs have the same texts, the distance is computed once.
+    assert len(dist._cache) == 2
+
+
+def test_newer_dump(tmp_path, capsys):
+    # The newer dump has the same histories, with more revisions, and a new
+    # article.
+    newer = make_pages(n_revisions=40)
+    pages = [(page_id, title, ns, revisions[:25])
+            for page_id, title, ns, revisions in newer]
+    newer.append((9, "New", 0, [(1000, 1300000000, 1, "new article")]))
+    old_xml, new_xml = str(tmp_path / "old.xml"), str(tmp_path / "new.xml")
+    write_xml(old_xml, pages)
+    write_xml(new_xml, newer)
+    state = str(tmp_path / "state")
+    compute_quality.main(make_args(old_xml, save_state=state))
+    with open(tmp_path / "old.txt", "w") as f:
+        f.write(capsys.readouterr().out)
+    compute_quality.main(make_args(new_xml))
+    expected = capsys.readouterr().out.splitlines()[1:]
+    compute_quality.main(make_args(new_xml, previous_state=state,
+            previous_output=str(tmp_path / "old.txt")))
+    captured = capsys.readouterr()
+    assert sorted(captured.out.splitlines()[1:]) == sorted(expected)
+    assert captured.err == ""
+    # A revision of the window of the last final edit of the first article
+    # was deleted.
+    del newer[0][3][20]
+    write_xml(new_xml, newer)
+    compute_quality.main(make_args(new_xml, previous_state=state,
+            previous_output=str(tmp_path / "old.txt")))
+    assert "Articles whose history changed: 1" in capsys.readouterr().err
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from interank.replay import OnlineModel, replay
+
+
+DAY = 86400
+
+
+def make_data(n_edits=2000, seed=0):
+    rng = np.random.RandomState(seed)
+    user_id = rng.randint(10, size=n_edits)
+    article_id = rng.randint(5, size=n_edits)
+    # Users 0-4 make good edits, users 5-9 bad ones.
+    quality = (user_id < 5).astype(float)
+    ts = rng.randint(0, 10 * DAY, size=n_edits)
+    return user_id, article_id, quality, ts
+
+
+def test_predictions_precede_updates():
+    data = make_data()
+    model = OnlineModel(n_users=10, n_articles=5)
+    probs, _ = replay(data, model, window=100)
+    order = np.argsort(data[3], kind="mergesort")
+    # The first window is predicted with the initial parameters only.
+    np.testing.assert_allclose(probs[order[:100]], 0.5)
+    assert not np.allclose(probs[order[100:200]], 0.5)
+
+
+def test_model_learns_users():
+    data = make_data()
+    model = OnlineModel(n_users=10, n_articles=5, n_dims=2)
+    probs, periods = replay(data, model, window=50)
+    assert (model.skill[:5] > model.skill[5:].max()).all()
+    order = np.argsort(data[3], kind="mergesort")
+    late = order[len(order) // 2:]
+    good = data[2][late] == 1
+    assert probs[late][good].min() > probs[late][~good].max()
+    assert len(periods) == 1
+    assert periods[0]["n_edits"] == 2000
+    assert periods[0]["avg_precision"] > 0.9
+
+
+def test_periods():
+    user_id, article_id, quality, ts = make_data()
+    # Nothing happens on the fourth day.
+    ts = np.where((ts >= 3 * DAY) & (ts < 4 * DAY), ts + DAY, ts)
+    data = (user_id, article_id, quality, ts)
+    model = OnlineModel(n_users=10, n_articles=5)
+    probs, periods = replay(data, model, window=100, period=DAY)
+    assert len(periods) == 9
+    assert sum(p["n_edits"] for p in periods) == len(ts)
+    for period in periods:
+        assert period["end"] - period["start"] < DAY
+        mask = (ts >= period["start"]) & (ts <= period["end"])
+        assert period["n_edits"] == mask.sum()
+        assert period["bad_fraction"] == pytest.approx(
+                (quality[mask] < 0.5).mean())
+
+
+def test_single_class_period():
+    user_id, article_id, quality, ts = make_data(n_edits=100)
+    quality = np.ones_like(quality)
+    model = OnlineModel(n_users=10, n_articles=5)
+    _, periods = replay((user_id, article_id, quality, ts), model)
+    assert np.isnan(periods[0]["avg_precision"])
+    assert periods[0]["bad_fraction"] == 0
+
+
+def test_empty():
+    model = OnlineModel(n_users=1, n_articles=1)
+    probs, periods = replay(([], [], [], []), model)
+    assert len(probs) == 0
+    assert periods == []
@@ -0,0 +1,124 @@
+import argparse
+import os
+
+import numpy as np
+import pytest
+
+import score_edits
+from interank.idindex import IdIndex
+from interank.scoring import Scorer
+
+
+SKILL = np.array([1.0, -1.0, 3.0])
+DIFFICULTY = np.array([0.5, -0.5])
+
+
+def sigmoid(x):
+    return 1 / (1 + np.exp(-x))
+
+
+def write_params(path, **params):
+    params.setdefault("skill", SKILL)
+    params.setdefault("difficulty", DIFFICULTY)
+    np.savez(str(path), **params)
+    return str(path)
+
+
+def test_score(tmp_path):
+    scorer = Scorer(write_params(tmp_path / "params.npz", global_bias=0.2))
+    probs = scorer.score([0, 1, 2], [1, 0, 1])
+    np.testing.assert_allclose(probs, sigmoid(np.array([1.5, -1.5, 3.5]) + 0.2))
+
+
+def test_dot_product(tmp_path):
+    vec_user = np.array([[1.0, 0.0], [0.0, 1.0], [1.0, 1.0]])
+    vec_article = np.array([[2.0, 0.0], [0.0, 3.0]])
+    scorer = Scorer(write_params(tmp_path / "params.npz",
+            vec_user=vec_user, vec_article=vec_article))
+    probs = scorer.score([0, 1, 2], [0, 1, 1])
+    np.testing.assert_allclose(probs, sigmoid(np.array([2.5, 2.5, 6.5])))
+
+
+def test_whitehill(tmp_path):
+    scorer = Scorer(write_params(tmp_path / "params.npz",
+            logit=np.array("whitehill")))
+    probs = scorer.score([0, 2], [0, 1])
+    np.testing.assert_allclose(probs,
+            sigmoid(np.array([np.exp(0.5), 3 * np.exp(-0.5)])))
+
+
+def test_user_rows(tmp_path):
+    scorer = Scorer(write_params(tmp_path / "params.npz",
+            user_row=np.array([2, 2, 0, 1])))
+    assert scorer.n_users == 4
+    probs = scorer.score([0, 1, 2, 3], [0, 0, 0, 0])
+    np.testing.assert_allclose(probs, sigmoid(np.array([2.5, 2.5, 0.5, -1.5])))
+
+
+def test_fallbacks(tmp_path):
+    path = write_params(tmp_path / "params.npz")
+    probs = Scorer(path).score([-1, 0], [0, -1])
+    np.testing.assert_allclose(probs, sigmoid(np.array([0.5, 1.0])))
+    probs = Scorer(path, user_fallback="prior",
+            article_fallback="prior").score([-1, 0], [0, -1])
+    np.testing.assert_allclose(probs, sigmoid(np.array([-0.5, 1.0])))
+    probs = Scorer(path, user_fallback="nan").score([-1, 0], [0, -1])
+    assert np.isnan(probs[0])
+    assert probs[1] == pytest.approx(sigmoid(1.0))
+    with pytest.raises(ValueError):
+        Scorer(path, article_fallback="zero")
+
+
+def test_maybe_reload(tmp_path):
+    path = write_params(tmp_path / "params.npz")
+    scorer = Scorer(path)
+    assert not scorer.maybe_reload()
+    write_params(tmp_path / "params.npz", skill=SKILL + 1)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert scorer.maybe_reload()
+    assert scorer.score([0], [0])[0] == pytest.approx(sigmoid(1.5))
+
+
+def write_dataset(path):
+    path.mkdir()
+    with open(str(path / "users.txt"), "w") as f:
+        f.write("0#r10#Alice#0#10#5#2\n")
+        f.write("1#u1.2.3.4##0#10#1#1\n")
+        f.write("2#r30#Bob#0#10#7#2\n")
+    with open(str(path / "articles.txt"), "w") as f:
+        f.write("0#100#Foo#6#2\n")
+        f.write("1#200#Bar#7#2\n")
+    return str(path)
+
+
+def test_score_batch(tmp_path):
+    dataset = write_dataset(tmp_path / "dataset")
+    scorer = Scorer(write_params(tmp_path / "params.npz"),
+            user_fallback="prior")
+    users = IdIndex.for_file(os.path.join(dataset, "users.txt"))
+    articles = IdIndex.for_file(os.path.join(dataset, "articles.txt"))
+    lines = [b"r10#200#extra#fields", b"", b"garbage", b"#100",
+            b"\xff#100", b"r99#100\r"]
+    res, n, n_unknown, n_malformed = score_edits.score_batch(
+            scorer, users, articles, lines)
+    assert res == "r10#200#{:.6f}\nr99#100#{:.6f}\n".format(
+            sigmoid(1.5), sigmoid(-0.5))
+    assert (n, n_unknown, n_malformed) == (2, 1, 3)
+    assert score_edits.score_batch(
+            scorer, users, articles, [b"garbage"]) == ("", 0, 0, 1)
+
+
+def test_main(tmp_path):
+    dataset = write_dataset(tmp_path / "dataset")
+    params = write_params(tmp_path / "params.npz")
+    inputs = tmp_path / "edits.txt"
+    inputs.write_bytes(b"u1.2.3.4#100\nr30#200\nr30#999\nr30")
+    output = str(tmp_path / "probs.txt")
+    score_edits.main(argparse.Namespace(params=params, dataset_dir=dataset,
+            inputs=[str(inputs)], output=output, batch_size=1,
+            unknown_user="mean", unknown_article="nan", reload_interval=5))
+    with open(output) as f:
+        lines = f.read().splitlines()
+    assert lines == ["u1.2.3.4#100#{:.6f}".format(sigmoid(-1.5)),
+            "r30#200#{:.6f}".format(sigmoid(3.5)), "r30#999#nan"]
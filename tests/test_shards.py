@@ -0,0 +1,78 @@
+import argparse
+
+import numpy as np
+import pytest
+
+import compute_quality
+import read_shards
+from conftest import write_xml
+from interank.shards import QUALITY_SCHEMA, ShardReader, ShardWriter
+from test_quality import make_args, make_pages
+
+
+def make_rows(n_rows, seed=0):
+    rng = np.random.RandomState(seed)
+    return [(i, 1200000000 + int(rng.randint(10 ** 6)),
+            int(rng.randint(100)), "r{}".format(rng.randint(20)),
+            float(rng.rand()), int(rng.randint(10)), 10, 12,
+            int(rng.randint(11))) for i in range(n_rows)]
+
+
+def write_shards(directory, rows):
+    writer = ShardWriter(directory, shard_rows=400, group_rows=50,
+            meta={"unit": "chars"})
+    for row in rows:
+        writer.writerow(row)
+    writer.close()
+    return writer
+
+
+def test_round_trip(tmp_path):
+    rows = make_rows(1000)
+    directory = str(tmp_path / "shards")
+    writer = write_shards(directory, rows)
+    assert writer.n_shards == 3
+    reader = ShardReader(directory)
+    assert reader.n_rows == 1000
+    assert reader.meta == {"unit": "chars"}
+    assert sorted(reader.rows()) == sorted(rows)
+    expected = [row for row in rows
+            if 10 <= row[2] <= 20 and row[1] >= 1200500000]
+    data = reader.read(["edit_id", "quality"], article_id=(10, 20),
+            timestamp=(1200500000, None))
+    assert sorted(data["edit_id"].tolist()) == sorted(r[0] for r in expected)
+    reader.close()
+    with pytest.raises(ValueError):
+        ShardWriter(directory)
+
+
+def test_verify(tmp_path):
+    directory = str(tmp_path / "shards")
+    write_shards(directory, make_rows(1000))
+    reader = ShardReader(directory)
+    assert reader.verify() == list()
+    # Flip a byte of the compressed columns of the first shard, and
+    # truncate the second one.
+    first, second = reader.paths[:2]
+    with open(first, "r+b") as f:
+        f.seek(100)
+        byte = f.read(1)
+        f.seek(100)
+        f.write(bytes([byte[0] ^ 0xff]))
+    with open(second, "r+b") as f:
+        f.truncate(1000)
+    assert ShardReader(directory).verify() == [first, second]
+
+
+def test_read_shards_matches_text_output(tmp_path, capsys):
+    xml_file = str(tmp_path / "dump.xml")
+    write_xml(xml_file, make_pages())
+    compute_quality.main(make_args(xml_file))
+    text = capsys.readouterr().out.splitlines()[1:]
+    shards = str(tmp_path / "shards")
+    compute_quality.main(make_args(xml_file, shards=shards))
+    read_shards.main(argparse.Namespace(path=shards, verify=False,
+            article_id=None, timestamp=None))
+    assert sorted(capsys.readouterr().out.splitlines()) == sorted(text)
+    # Some edits have no judges, whose quality is printed as 0.
+    assert any(line.endswith("#0") for line in text)
@@ -0,0 +1,132 @@
+import http.server
+import json
+import threading
+import urllib.parse
+
+import pytest
+
+from interank.wikiapi import APIError, WikiAPI
+
+
+USERS = {"Foo bar": 12, "Baz": 34}
+
+
+class StandInAPI:
+
+    """Local stand-in for the Wikipedia API.
+
+    `errors` is a list of error codes returned by the first requests, and
+    the users of `dropped` are left out of the responses.
+    """
+
+    def __init__(self, errors=(), dropped=()):
+        self.errors = list(errors)
+        self.dropped = set(dropped)
+        self.requests = list()
+        stand_in = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+
+            def do_POST(self):
+                length = int(self.headers["Content-Length"])
+                params = urllib.parse.parse_qs(
+                        self.rfile.read(length).decode())
+                body = json.dumps(stand_in.respond(params)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(
+                ("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                daemon=True)
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self._server.server_port)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def respond(self, params):
+        self.requests.append(params)
+        if self.errors:
+            return {"error": {"code": self.errors.pop(0), "info": "-"}}
+        users = list()
+        normalized = list()
+        if "ususers" in params:
+            for name in params["ususers"][0].split("|"):
+                norm = name.replace("_", " ")
+                norm = norm[:1].upper() + norm[1:]
+                if norm != name:
+                    normalized.append({"from": name, "to": norm})
+                if norm in USERS:
+                    users.append({"name": norm, "userid": USERS[norm],
+                            "editcount": 1})
+                else:
+                    users.append({"name": norm, "missing": ""})
+        else:
+            names = {uid: name for name, uid in USERS.items()}
+            for uid in params["ususerids"][0].split("|"):
+                if int(uid) in names:
+                    users.append({"name": names[int(uid)],
+                            "userid": int(uid), "editcount": 1})
+        users = [u for u in users if u.get("userid") not in self.dropped]
+        query = {"users": users}
+        if normalized:
+            query["normalized"] = normalized
+        return {"batchcomplete": "", "query": query}
+
+
+def test_normalized_names():
+    with StandInAPI() as server:
+        api = WikiAPI(cache=None, url=server.url)
+        users = api.get_users_by_name(["foo_bar", "Baz", "nobody"])
+    assert users["foo_bar"]["userid"] == 12
+    assert users["Baz"]["userid"] == 34
+    assert "missing" in users["nobody"]
+
+
+def test_cache_and_partial_responses(tmp_path):
+    cache = str(tmp_path / "cache.sqlite3")
+    with StandInAPI(dropped={34}) as server:
+        api = WikiAPI(cache=cache, url=server.url)
+        # The response does not mention user 34, which is left out.
+        assert sorted(api.get_users([12, 34])) == [12]
+        api.close()
+    with StandInAPI() as server:
+        api = WikiAPI(cache=cache, url=server.url)
+        assert sorted(api.get_users([12, 34])) == [12, 34]
+        api.close()
+    # User 12 came from the cache.
+    assert server.requests[0]["ususerids"] == ["34"]
+
+
+def test_batches():
+    with StandInAPI() as server:
+        api = WikiAPI(cache=None, url=server.url)
+        api.get_users(list(range(120)))
+    assert sorted(len(r["ususerids"][0].split("|"))
+            for r in server.requests) == [20, 50, 50]
+
+
+def test_errors():
+    with StandInAPI(errors=["maxlag", "maxlag"]) as server:
+        api = WikiAPI(cache=None, url=server.url, backoff=0.01)
+        assert sorted(api.get_users([12])) == [12]
+    assert len(server.requests) == 3
+    with StandInAPI(errors=["badparams"]) as server:
+        api = WikiAPI(cache=None, url=server.url, backoff=0.01)
+        with pytest.raises(APIError) as info:
+            api.get_users([12])
+    assert info.value.code == "badparams"